@@ -0,0 +1,299 @@
+"""Benchmark suite for all simulation stages.
+
+Every machine in instances.py is run at each stage of the conversion pipeline
+    native TM -> binary TM -> 2-tag system -> UTM(2,18) -> Magic: The Gathering
+over scaled input sizes. Each run reports wall time, steps, steps per second and peak memory. The results can be
+saved as a JSON baseline, and later runs compared against it to find regressions:
+
+    python -m mtg_turing_machine.benchmark --save baseline.json
+    python -m mtg_turing_machine.benchmark --compare baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import mtg_turing_machine.classes.instances as instances
+
+from mtg_turing_machine.classes.mtg_turing_machine import MagicTheGatheringTuringMachine
+from mtg_turing_machine.classes.two_tag_system import TwoTagSystem
+from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine
+
+BASELINE_VERSION = 1
+
+# the stages of the conversion pipeline, in order
+STAGES = ["tm", "binary_tm", "two_tag", "utm", "mtg"]
+
+DEFAULT_SCALES = (1, 4, 16)
+DEFAULT_DEADLINE = 5.0  # seconds per run
+DEFAULT_MAX_STEPS = 10 ** 8
+DEFAULT_TOLERANCE = 0.25  # relative change in steps per second or peak memory that counts as a regression
+
+
+class BenchmarkCase:
+    """A machine from instances.py together with a family of inputs.
+
+    Attributes:
+        name:       The name of the case
+        stage:      The stage the machine belongs to, it is converted to all later stages
+        load:       Function that returns the machine
+        make_input: Function that returns the input (tape string or initial word) for a scale, or None if the
+                        machine always runs on its built-in input
+        """
+
+    def __init__(self, name, stage, load, make_input=None):
+        self.name = name
+        self.stage = stage
+        self.load = load
+        self.make_input = make_input
+
+    def create(self, scale):
+        """Return the machine with the input for a scale"""
+        machine = self.load()
+        if self.make_input is not None:
+            if self.stage == "two_tag":
+                machine.set_initial_word(self.make_input(scale), machine.halting_symbol)
+            else:
+                machine.set_tape_string(self.make_input(scale))
+        return machine
+
+
+BENCHMARK_CASES = [
+    BenchmarkCase("add_unary", "tm", instances.load_tm_add_unary, lambda n: "1" * n + "x" + "1" * n),
+    BenchmarkCase("add_unary_two_symbol", "tm", instances.load_tm_add_unary_two_symbol,
+                  lambda n: "1" * n + "0" + "1" * n),
+    BenchmarkCase("write_one", "tm", instances.load_tm_write_one),
+    BenchmarkCase("write_one_two", "tm", instances.load_tm_write_one_two),
+    BenchmarkCase("add_one", "tm", instances.load_tm_add_one, lambda n: "1" * n),
+    BenchmarkCase("make_palindrome", "tm", instances.load_tm_make_palindrome, lambda n: "10" * n),
+    BenchmarkCase("dec_to_bin", "tm", instances.load_tm_dec_to_bin, lambda n: "9" * n),
+    BenchmarkCase("cut_in_half", "two_tag", instances.load_two_tag_cut_in_half, lambda n: "XX::" * n + "#"),
+    BenchmarkCase("collatz", "two_tag", instances.load_two_tag_collatz, lambda n: "a" * (n + 2)),
+    BenchmarkCase("converted_from_simple_tm", "two_tag", instances.load_two_tag_manually_converted_from_simple_tm),
+    BenchmarkCase("dummy_utm", "utm", instances.load_dummy_utm),
+]
+
+
+def _to_binary_tm(turing_machine):
+    turing_machine.convert_to_two_symbol()
+    return turing_machine
+
+
+def _to_two_tag(turing_machine):
+    return TwoTagSystem(turing_machine.definition)
+
+
+def _to_utm(two_tag):
+    utm = UniversalTuringMachine()
+    utm.set_tape_string_from_two_tag(two_tag)
+    return utm
+
+
+# conversion of a machine from the previous stage to the keyed stage
+_CONVERSIONS = {
+    "binary_tm": _to_binary_tm,
+    "two_tag": _to_two_tag,
+    "utm": _to_utm,
+    "mtg": MagicTheGatheringTuringMachine,
+}
+
+
+def _get_size(machine):
+    """Return the length of the tape or word a machine starts with"""
+    if isinstance(machine, TwoTagSystem):
+        return len(machine.current_word)
+    if isinstance(machine, UniversalTuringMachine):
+        return len(machine.get_tape())
+    if isinstance(machine, MagicTheGatheringTuringMachine):
+        return len(machine.get_tape_sorted())
+    return len(machine.definition.tape)
+
+
+def _run(machine, max_steps, deadline):
+    """Run a machine of any stage silently within a budget. Returns a RunResult"""
+    if isinstance(machine, MagicTheGatheringTuringMachine):
+        return machine.run(max_cycles=max_steps, deadline=deadline)
+    return machine.run_silent(max_steps=max_steps, deadline=deadline)
+
+
+def build_machine(case, scale, stage):
+    """Return the machine of a case at a stage, converted from the case's own stage. The conversions print a lot,
+    which is suppressed.
+    Raises AssertionError if the machine cannot be converted (e.g. 2-tag systems only support machines that never
+    keep the head in place)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        machine = case.create(scale)
+        for next_stage in STAGES[STAGES.index(case.stage) + 1:STAGES.index(stage) + 1]:
+            machine = _CONVERSIONS[next_stage](machine)
+    return machine
+
+
+def run_benchmark(case, scale, stage, max_steps=DEFAULT_MAX_STEPS, deadline=DEFAULT_DEADLINE, measure_memory=True):
+    """Benchmark a case at a stage and scale.
+    The run is timed without memory tracing. If measure_memory is set, it is repeated on a fresh machine with
+    tracemalloc to find the peak memory of the simulation (without the setup). Tracing is much slower, so the
+    traced run has the same deadline and may cover fewer steps, which are reported as memory_steps.
+    Returns a dict with the case, stage, scale, input size, setup and wall time, steps, steps per second, whether
+    the machine has halted, why the run has ended, the peak memory in bytes and the number of steps it has been
+    measured over (or None for both). If the machine cannot
+    be converted to the stage, the dict only contains the case, stage, scale and the reason it was skipped."""
+    entry = {"case": case.name, "stage": stage, "scale": scale}
+    start_time = time.perf_counter()
+    try:
+        machine = build_machine(case, scale, stage)
+    except AssertionError as error:
+        entry["skipped"] = str(error) or "conversion not supported"
+        return entry
+    setup_time = time.perf_counter() - start_time
+    size = _get_size(machine)
+
+    start_time = time.perf_counter()
+    result = _run(machine, max_steps, deadline)
+    wall_time = time.perf_counter() - start_time
+
+    peak_memory = None
+    memory_steps = None
+    if measure_memory:
+        machine = build_machine(case, scale, stage)
+        tracemalloc.start()
+        try:
+            memory_steps = _run(machine, result.steps, deadline).steps
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    entry.update(size=size, setup_time=setup_time, wall_time=wall_time, steps=result.steps,
+                 steps_per_second=result.steps / wall_time if wall_time > 0 else 0.0,
+                 halted=result.halted, reason=result.reason, peak_memory=peak_memory, memory_steps=memory_steps)
+    return entry
+
+
+def run_suite(cases=None, stages=None, scales=DEFAULT_SCALES, max_steps=DEFAULT_MAX_STEPS, deadline=DEFAULT_DEADLINE,
+              measure_memory=True, progress=None):
+    """Benchmark every case at every stage from its own onwards, and every scale (see run_benchmark()).
+    Cases with built-in inputs only run at the first scale. A scale only runs at a stage if it has halted at the
+    previous stage, since the converted machine would not halt within the budget either.
+    Arguments:
+        cases:          The names of the cases to run, all of BENCHMARK_CASES if not set
+        stages:         The stages to run, all if not set
+        scales:         The input scales
+        max_steps:      The step budget of each run
+        deadline:       The time budget of each run in seconds
+        measure_memory: Measure the peak memory of each run in a second, traced run
+        progress:       Callback that receives each result as soon as it is available
+    Returns a list of result dicts"""
+    results = []
+    for case in BENCHMARK_CASES:
+        if cases is not None and case.name not in cases:
+            continue
+        case_scales = scales if case.make_input is not None else scales[:1]
+        for stage in STAGES[STAGES.index(case.stage):]:
+            if stages is not None and stage not in stages:
+                continue
+            halted_scales = []
+            for scale in case_scales:
+                entry = run_benchmark(case, scale, stage, max_steps, deadline, measure_memory)
+                results.append(entry)
+                if progress is not None:
+                    progress(entry)
+                if "skipped" in entry or not entry["halted"]:
+                    break  # larger inputs would not get any further
+                halted_scales.append(scale)
+            case_scales = halted_scales
+    return results
+
+
+def save_baseline(results, path):
+    """Save benchmark results as a JSON baseline, together with the Python version and platform"""
+    baseline = {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w") as fid:
+        json.dump(baseline, fid, indent=1)
+
+
+def load_baseline(path):
+    """Load the results of a JSON baseline (see save_baseline())"""
+    with open(path) as fid:
+        baseline = json.load(fid)
+    if baseline.get("version") != BASELINE_VERSION:
+        raise ValueError("unsupported baseline version {}".format(baseline.get("version")))
+    return baseline["results"]
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare benchmark results with a baseline.
+    A run regresses if it has become slower or needs more memory by more than the tolerance, or if it takes a
+    different number of steps although both runs have halted (which means the simulation has changed).
+    Arguments:
+        results:    The new results (see run_suite())
+        baseline:   The baseline results (see load_baseline())
+        tolerance:  The relative change that is accepted
+    Returns a list of strings describing the regressions"""
+    baseline_entries = {(entry["case"], entry["stage"], entry["scale"]): entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        key = (entry["case"], entry["stage"], entry["scale"])
+        old_entry = baseline_entries.get(key)
+        if old_entry is None or "skipped" in entry or "skipped" in old_entry:
+            continue
+        name = "{} {} x{}".format(*key)
+        if entry["halted"] and old_entry["halted"] and entry["steps"] != old_entry["steps"]:
+            regressions.append("{}: steps changed from {} to {}".format(name, old_entry["steps"], entry["steps"]))
+        if entry["steps_per_second"] < old_entry["steps_per_second"] * (1 - tolerance):
+            regressions.append("{}: steps/s dropped from {:.0f} to {:.0f}".format(
+                name, old_entry["steps_per_second"], entry["steps_per_second"]))
+        if entry["peak_memory"] is not None and old_entry["peak_memory"] is not None \
+                and entry["peak_memory"] > old_entry["peak_memory"] * (1 + tolerance):
+            regressions.append("{}: peak memory grew from {} to {} bytes".format(
+                name, old_entry["peak_memory"], entry["peak_memory"]))
+    return regressions
+
+
+def format_result(entry):
+    """Return a result as a line of the benchmark report"""
+    prefix = "{case:<26} {stage:<10} x{scale:<4}".format(**entry)
+    if "skipped" in entry:
+        return prefix + " skipped: " + entry["skipped"]
+    memory = "-" if entry["peak_memory"] is None else "{:.1f} KiB".format(entry["peak_memory"] / 1024)
+    line = " {size:>8} {wall_time:>9.4f}s {steps:>12} {steps_per_second:>12.0f}/s {memory:>12}  {reason}"
+    return prefix + line.format(memory=memory, **entry)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark all simulation stages on the machines in instances.py")
+    parser.add_argument("--cases", nargs="+", choices=[case.name for case in BENCHMARK_CASES])
+    parser.add_argument("--stages", nargs="+", choices=STAGES)
+    parser.add_argument("--scales", nargs="+", type=int, default=list(DEFAULT_SCALES))
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="step budget of each run")
+    parser.add_argument("--deadline", type=float, default=DEFAULT_DEADLINE, help="time budget of each run (s)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced runs that measure memory")
+    parser.add_argument("--save", metavar="PATH", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results with a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    print("{:<26} {:<10} {:<5} {:>8} {:>10} {:>12} {:>14} {:>12}  {}".format(
+        "case", "stage", "scale", "size", "time", "steps", "steps/s", "peak memory", "end"))
+    results = run_suite(args.cases, args.stages, args.scales, args.max_steps, args.deadline, not args.no_memory,
+                        progress=lambda entry: print(format_result(entry), flush=True))
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        regressions = compare_results(results, load_baseline(args.compare), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, it is only needed for batch simulations
+    np = None
+
+from .compiled_table import CompiledTransitionTable, UNDEFINED_ENTRY
+from .turing_machine import parse_tape_string
+
+
+class BatchTuringMachine:
+    """Runs one Turing machine on many input tapes at the same time. Requires NumPy.
+    All tapes are packed into a 2-D array of symbol ids, one row per tape, with per-row head positions, states and
+    step counts. Every step advances all rows that are still running in lockstep, by vectorized gathers from the
+    integer-compiled transition table (see CompiledTransitionTable). Rows are retired as soon as they halt.
+    The results are identical to running a TuringMachine with step() on each tape separately, except that a missing
+    transition only stops the affected row (see 'undefined') instead of exiting.
+
+    Attributes:
+        definition:     The Turing machine definition (TuringDefinition). Its own tape is not used.
+        table:          The machine's CompiledTransitionTable
+        cells:          The tapes as symbol ids (2-D array with one row per tape)
+        positions:      The head positions within the rows of cells (array)
+        states:         The state ids (array)
+        steps:          The number of steps each row has taken (array)
+        lo, hi:         The region of each row that makes up its tape (arrays, exclusive end)
+        undefined:      Flags for rows that have stopped at a missing transition (array)
+        """
+
+    def __init__(self, definition, tapes, tape_indices=None):
+        """
+        Arguments:
+            definition:     The Turing machine definition (TuringDefinition)
+            tapes:          The input tapes, as lists of symbols or as strings. A string may contain a caret (^)
+                                that marks the head position, like in TuringMachine.set_tape_string().
+            tape_indices:   The initial head positions, for tapes given as lists (defaults to 0)"""
+        if np is None:
+            raise ImportError("BatchTuringMachine requires NumPy")
+
+        parsed_tapes = []
+        for row, tape in enumerate(tapes):
+            if isinstance(tape, str):
+                parsed_tapes.append(parse_tape_string(tape, definition.blank))
+            else:
+                tape_index = 0 if tape_indices is None else tape_indices[row]
+                parsed_tapes.append((list(tape) if tape else [definition.blank], tape_index))
+
+        self.definition = definition
+        self.table = table = CompiledTransitionTable(
+            definition, extra_symbols={symbol for tape, _ in parsed_tapes for symbol in tape})
+
+        # unpack the compiled table into one lookup array per field
+        entries = np.array(table.table, dtype=np.int64)
+        self._defined = entries != UNDEFINED_ENTRY
+        entries = np.where(self._defined, entries, 0)
+        self._next_state = (entries >> (table.symbol_bits + 2)).astype(np.int64)
+        symbol_type = np.uint8 if table.num_symbols <= 256 else np.int32
+        self._write_symbol = ((entries >> 2) & ((1 << table.symbol_bits) - 1)).astype(symbol_type)
+        self._move = ((entries & 3) - 1).astype(np.int64)
+        self._stop = np.frombuffer(bytes(table.stop_bitmap), dtype=np.uint8).astype(bool)
+
+        # pack the tapes into rows, leaving some room for growth on both sides
+        count = len(parsed_tapes)
+        width = max([len(tape) for tape, _ in parsed_tapes] + [0])
+        margin = max(width, 16)
+        self.cells = np.zeros((count, margin + width + margin), dtype=symbol_type)
+        self.positions = np.empty(count, dtype=np.int64)
+        self.lo = np.full(count, margin, dtype=np.int64)
+        self.hi = np.empty(count, dtype=np.int64)
+        for row, (tape, tape_index) in enumerate(parsed_tapes):
+            self.cells[row, margin:margin + len(tape)] = [table.symbol_ids[symbol] for symbol in tape]
+            self.positions[row] = margin + tape_index
+            self.hi[row] = margin + len(tape)
+
+        self.states = np.full(count, table.state_ids[definition.initial_state], dtype=np.int64)
+        self.steps = np.zeros(count, dtype=np.int64)
+        self.undefined = np.zeros(count, dtype=bool)
+
+        # step() adds a blank if the head starts right behind the end of the tape
+        running = ~self._stop[self.states]
+        self.hi = np.where(running, np.maximum(self.hi, self.positions + 1), self.hi)
+
+    def __len__(self):
+        return len(self.states)
+
+    def halted(self):
+        """Return flags for the rows that have reached a stop state (array)"""
+        return self._stop[self.states]
+
+    def _grow(self, left):
+        """Grow all rows on one side, at least doubling their size"""
+        padding = max(self.cells.shape[1], 16)
+        blank = np.zeros((self.cells.shape[0], padding), dtype=self.cells.dtype)
+        if left:
+            self.cells = np.concatenate((blank, self.cells), axis=1)
+            self.positions += padding
+            self.lo += padding
+            self.hi += padding
+        else:
+            self.cells = np.concatenate((self.cells, blank), axis=1)
+
+    def run(self, max_steps=None):
+        """Run all rows until they halt, hit a missing transition or have taken max_steps steps in total.
+        Arguments:
+            max_steps:  The maximum step count of each row
+        Returns the flags for the rows that have halted (array)"""
+        num_symbols = self.table.num_symbols
+        rows = np.flatnonzero(~self._stop[self.states] & ~self.undefined)
+        if max_steps is not None:
+            rows = rows[self.steps[rows] < max_steps]
+
+        # the running rows' configurations are kept in compact arrays and written back once they retire
+        positions = self.positions[rows]
+        states = self.states[rows]
+        steps = self.steps[rows]
+        lo = self.lo[rows]
+        hi = self.hi[rows]
+        while len(rows):
+            symbols = self.cells[rows, positions]
+            entries = states * num_symbols + symbols
+            defined = self._defined[entries]
+            if not defined.all():
+                self.undefined[rows[~defined]] = True
+
+            self.cells[rows, positions] = np.where(defined, self._write_symbol[entries], symbols)
+            positions = positions + np.where(defined, self._move[entries], 0)
+            states = np.where(defined, self._next_state[entries], states)
+            steps = steps + defined
+            np.minimum(lo, positions, out=lo)
+            np.maximum(hi, positions + 1, out=hi)
+
+            # make sure that every head stays within the array, so the next step can read and write
+            if positions.min() < 0:
+                width = self.cells.shape[1]
+                self._grow(left=True)
+                shift = self.cells.shape[1] - width
+                positions += shift
+                lo += shift
+                hi += shift
+            if positions.max() >= self.cells.shape[1]:
+                self._grow(left=False)
+
+            retired = self._stop[states] | ~defined
+            if max_steps is not None:
+                retired |= steps >= max_steps
+            if retired.any():
+                retired_rows = rows[retired]
+                self.positions[retired_rows] = positions[retired]
+                self.states[retired_rows] = states[retired]
+                self.steps[retired_rows] = steps[retired]
+                self.lo[retired_rows] = lo[retired]
+                self.hi[retired_rows] = hi[retired]
+                running = ~retired
+                rows, positions, states, steps = rows[running], positions[running], states[running], steps[running]
+                lo, hi = lo[running], hi[running]
+
+        return self.halted()
+
+    def get_tape(self, row):
+        """Return the tape of a row as a list of symbols"""
+        symbols = self.table.symbols
+        return [symbols[cell] for cell in self.cells[row, self.lo[row]:self.hi[row]].tolist()]
+
+    def get_configuration(self, row):
+        """Return the configuration of a row as a tuple (tape, tape index, state, steps)"""
+        return (self.get_tape(row), int(self.positions[row] - self.lo[row]), self.table.states[self.states[row]],
+                int(self.steps[row]))
+
+    def get_stripped_tapes(self):
+        """Return the tapes of all rows, stripped of leading and trailing blanks (see
+        TuringMachine.get_stripped_tape())"""
+        stripped_tapes = []
+        for row in range(len(self)):
+            cells = self.cells[row, self.lo[row]:self.hi[row]]
+            used = np.flatnonzero(cells)
+            if len(used):
+                cells = cells[used[0]:used[-1] + 1]
+            else:
+                cells = cells[:0]
+            stripped_tapes.append([self.table.symbols[cell] for cell in cells.tolist()])
+        return stripped_tapes
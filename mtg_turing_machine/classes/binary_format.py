@@ -0,0 +1,240 @@
+import array
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+from contextlib import contextmanager
+
+from .checkpoint import pack_ids
+
+# file signature, followed by the format version and a padding byte
+_MAGIC = b"MTGDEF"
+_VERSION = 1
+
+# sections start at multiples of this many bytes, so that they can be used in place as typed arrays
+_ALIGNMENT = 8
+
+# head directions are stored as small integers
+_DIRECTIONS = ["<", "-", ">"]
+_DIRECTION_CODES = {direction: code for code, direction in enumerate(_DIRECTIONS)}
+
+
+def _padding(length):
+    return -length % _ALIGNMENT
+
+
+class StringTable:
+    """Interned strings (state and symbol names) of a definition file, so that every name is stored only once and
+    everything else refers to it by id.
+
+    Attributes:
+        strings:    The strings, indexed by id (list)
+        """
+
+    def __init__(self, strings=()):
+        self.strings = []
+        self._ids = {}
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string):
+        """Return the id of a string, adding it to the table if necessary"""
+        string_id = self._ids.get(string)
+        if string_id is None:
+            assert "\0" not in string, "names must not contain null characters"
+            string_id = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def intern_all(self, strings):
+        """Return the ids of a sequence of strings (array)"""
+        ids = [self.intern(string) for string in strings]
+        return pack_ids(ids, len(self.strings))
+
+    def to_bytes(self):
+        """Return the table as null-separated UTF-8 (bytes)"""
+        return "\0".join(self.strings).encode("utf-8")
+
+    @staticmethod
+    def decode(data):
+        """Return the strings of a table in the form of to_bytes() (list)"""
+        return bytes(data).decode("utf-8").split("\0")
+
+
+def get_bit_width(count):
+    """Return the number of bits a packed id occupies if there are 'count' distinct ids. Widths are rounded up to
+    1, 2, 4 or 8 bits, so that no id spans two bytes, and to 16 or 32 bits beyond that."""
+    bits = max(1, (count - 1).bit_length())
+    for width in (1, 2, 4, 8, 16, 32):
+        if bits <= width:
+            return width
+    raise OverflowError("too many ids to pack")
+
+
+def pack_bits(ids, bits):
+    """Pack a sequence of ids at the given bit width (see get_bit_width()), the first id in the lowest bits.
+    Returns an array.array"""
+    if bits > 8:
+        return array.array("H" if bits == 16 else "I", ids)
+    if bits == 8:
+        return array.array("B", ids)
+    per_byte = 8 // bits
+    ids = list(ids)
+    ids.extend([0] * (-len(ids) % per_byte))
+    packed = ids[::per_byte]
+    for index in range(1, per_byte):
+        shift = index * bits
+        packed = [byte | (symbol_id << shift) for byte, symbol_id in zip(packed, ids[index::per_byte])]
+    return array.array("B", packed)
+
+
+def unpack_bits(packed, bits, length):
+    """Unpack 'length' ids from the form of pack_bits() (list)"""
+    if bits >= 8:
+        return list(packed[:length])
+    per_byte = 8 // bits
+    mask = (1 << bits) - 1
+    ids = [0] * (len(packed) * per_byte)
+    for index in range(per_byte):
+        shift = index * bits
+        ids[index::per_byte] = [(byte >> shift) & mask for byte in packed]
+    del ids[length:]
+    return ids
+
+
+@contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector, e.g. while building the containers of a large definition. The many new
+    tuples would otherwise trigger repeated collections, although none of them can be part of a reference cycle."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def encode_directions(directions):
+    """Encode head directions ('<', '-', '>') as bytes"""
+    return array.array("B", [_DIRECTION_CODES[direction] for direction in directions])
+
+
+def decode_directions(codes):
+    """Decode head directions (see encode_directions()) (iterator)"""
+    return map(_DIRECTIONS.__getitem__, codes)
+
+
+def write_definition_file(path, kind, metadata, strings, sections):
+    """Write a binary definition file. The file is written to a temporary file first, so readers never see a
+    partially written definition.
+    File layout:
+        magic and version | header length (uint32) | header (JSON) | sections (raw arrays, little-endian)
+    Every section starts at a multiple of 8 bytes, so the file can be memory-mapped and its sections used in place.
+    Arguments:
+        path:       The definition file
+        kind:       The kind of definition, e.g. "turing_machine"
+        metadata:   Everything except the bulk data (JSON-serializable dict)
+        strings:    The interned names the sections refer to (StringTable)
+        sections:   The bulk data (dict of name: array.array)"""
+    sections = dict(sections, strings=array.array("B", strings.to_bytes()))
+    layout = []
+    offset = 0
+    for name, section in sections.items():
+        layout.append([name, section.typecode, len(section), offset])
+        length = len(section) * section.itemsize
+        offset += length + _padding(length)
+    header = json.dumps({"kind": kind, "metadata": metadata, "sections": layout},
+                        separators=(",", ":")).encode("utf-8")
+    prefix = _MAGIC + bytes([_VERSION, 0]) + struct.pack("<I", len(header)) + header
+    prefix += bytes(_padding(len(prefix)))
+
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp_path, "wb") as fid:
+        fid.write(prefix)
+        for section in sections.values():
+            if sys.byteorder != "little" and section.itemsize > 1:
+                section = array.array(section.typecode, section)
+                section.byteswap()
+            data = section.tobytes()
+            fid.write(data)
+            fid.write(bytes(_padding(len(data))))
+    os.replace(temp_path, path)
+
+
+class DefinitionFile:
+    """Reader for binary definition files (see write_definition_file()). To be used as a context manager:
+    the sections are views of the (memory-mapped) file and are only valid within the 'with' block.
+
+    Attributes:
+        kind:       The kind of definition, e.g. "turing_machine"
+        metadata:   The metadata (dict)
+        strings:    The interned names (list)
+        sections:   The bulk data (dict of name: memoryview or array.array)
+        """
+
+    def __init__(self, path, use_mmap=True):
+        """
+        Arguments:
+            path:       The definition file
+            use_mmap:   Map the file into memory instead of reading it"""
+        self._views = []
+        with open(path, "rb") as fid:
+            if use_mmap and os.path.getsize(path) > 0:
+                self._data = mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = fid.read()
+        try:
+            self._read(path)
+        except Exception:
+            self.close()
+            raise
+
+    def _read(self, path):
+        data = self._view(memoryview(self._data))
+        if bytes(data[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError("{} is not a definition file".format(path))
+        if data[len(_MAGIC)] != _VERSION:
+            raise ValueError("unsupported definition file version {}".format(data[len(_MAGIC)]))
+        position = len(_MAGIC) + 2
+        header_length, = struct.unpack_from("<I", data, position)
+        position += 4
+        header = json.loads(bytes(data[position:position + header_length]).decode("utf-8"))
+        position += header_length
+        position += _padding(position)
+
+        self.kind = header["kind"]
+        self.metadata = header["metadata"]
+        self.sections = {}
+        for name, typecode, length, offset in header["sections"]:
+            itemsize = array.array(typecode).itemsize
+            start = position + offset
+            section = self._view(data[start:start + length * itemsize])
+            if sys.byteorder != "little" and itemsize > 1:
+                section = array.array(typecode, section.tobytes())
+                section.byteswap()
+            elif itemsize > 1:
+                section = self._view(section.cast(typecode))
+            self.sections[name] = section
+        self.strings = StringTable.decode(self.sections.pop("strings"))
+
+    def _view(self, view):
+        self._views.append(view)
+        return view
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the sections and unmap the file"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = None
@@ -0,0 +1,185 @@
+import array
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+# file signature, followed by the format version
+_MAGIC = b"MTGCKPT"
+_VERSION = 1
+
+# number of steps between two checks of a time-based checkpoint interval, if no step interval is set
+_TIME_CHECK_STEPS = 1 << 16
+
+
+def pack_ids(ids, count=None):
+    """Pack a sequence of non-negative ids into an array of the smallest sufficient item size.
+    Arguments:
+        ids:    The ids (bytes, bytearray, list or array)
+        count:  The number of distinct ids, if known (saves a pass over the ids)
+    Returns an array.array"""
+    if isinstance(ids, (bytes, bytearray)):
+        return array.array("B", ids)
+    if count is None:
+        count = max(ids) + 1 if len(ids) else 0
+    for typecode in ("B", "H", "I", "Q"):
+        if count <= 1 << (8 * array.array(typecode).itemsize):
+            return array.array(typecode, ids)
+    raise OverflowError("too many ids to pack")
+
+
+def encode_symbols(symbols, alphabet=None):
+    """Encode a sequence of symbols as packed ids.
+    Arguments:
+        symbols:    The symbols to encode
+        alphabet:   Symbol names, indexed by id. Symbols missing from the alphabet are appended to it.
+    Returns a tuple (alphabet, ids)"""
+    alphabet = [] if alphabet is None else list(alphabet)
+    lookup = {symbol: symbol_id for symbol_id, symbol in enumerate(alphabet)}
+    ids = []
+    for symbol in symbols:
+        symbol_id = lookup.get(symbol)
+        if symbol_id is None:
+            symbol_id = lookup[symbol] = len(alphabet)
+            alphabet.append(symbol)
+        ids.append(symbol_id)
+    return alphabet, pack_ids(ids, len(alphabet))
+
+
+def decode_symbols(alphabet, ids):
+    """Decode packed ids to a list of symbols (see encode_symbols())"""
+    return [alphabet[symbol_id] for symbol_id in ids]
+
+
+def write_checkpoint(path, metadata, sections):
+    """Write a checkpoint file atomically: the data is written to a temporary file in the same directory, which then
+    replaces the checkpoint in a single step. A crash during the write leaves the previous checkpoint intact.
+    File layout:
+        magic and version | header length (uint32) | header (JSON) | sections (raw arrays, little-endian)
+    Arguments:
+        path:       The checkpoint file
+        metadata:   Everything except the bulk data (JSON-serializable dict)
+        sections:   The bulk data, e.g. tapes and words as packed symbol ids (dict of name: array.array)"""
+    layout = [[name, section.typecode, len(section)] for name, section in sections.items()]
+    header = json.dumps({"metadata": metadata, "sections": layout}, separators=(",", ":")).encode("utf-8")
+
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp_path, "wb") as fid:
+        fid.write(_MAGIC + bytes([_VERSION]))
+        fid.write(struct.pack("<I", len(header)))
+        fid.write(header)
+        for section in sections.values():
+            if sys.byteorder != "little" and section.itemsize > 1:
+                section = array.array(section.typecode, section)
+                section.byteswap()
+            fid.write(section.tobytes())
+        fid.flush()
+        os.fsync(fid.fileno())
+    os.replace(temp_path, path)
+
+
+def read_checkpoint(path):
+    """Read a checkpoint file (see write_checkpoint()).
+    Returns a tuple (metadata, sections)"""
+    with open(path, "rb") as fid:
+        signature = fid.read(len(_MAGIC) + 1)
+        if signature[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("{} is not a checkpoint file".format(path))
+        if signature[len(_MAGIC)] != _VERSION:
+            raise ValueError("unsupported checkpoint version {}".format(signature[len(_MAGIC)]))
+        header_length, = struct.unpack("<I", fid.read(4))
+        header = json.loads(fid.read(header_length).decode("utf-8"))
+
+        sections = {}
+        for name, typecode, length in header["sections"]:
+            section = array.array(typecode)
+            section.frombytes(fid.read(length * section.itemsize))
+            if sys.byteorder != "little" and section.itemsize > 1:
+                section.byteswap()
+            sections[name] = section
+    return header["metadata"], sections
+
+
+class CheckpointWriter:
+    """Writes periodic checkpoints of a running simulation from a background thread.
+    The simulation only takes a snapshot of its state and hands it over with submit(); serializing and writing
+    happen in the background, so the hot loop is not stalled by disk I/O. If snapshots are submitted faster than
+    they can be written, only the most recent one is written.
+
+    Attributes:
+        path:           The checkpoint file
+        every_steps:    Write a checkpoint every this many steps
+        every_seconds:  Write a checkpoint every this many seconds of wall time
+        written:        The number of checkpoints that have been written
+        """
+
+    def __init__(self, path, every_steps=None, every_seconds=None, steps=0):
+        """
+        Arguments:
+            path:           The checkpoint file
+            every_steps:    Write a checkpoint every this many steps
+            every_seconds:  Write a checkpoint every this many seconds of wall time
+            steps:          The simulation's step count at the start of the run"""
+        self.path = path
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.written = 0
+        self._last_steps = steps
+        self._last_time = time.perf_counter()
+        self._pending = None
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def check_interval(self):
+        """The number of steps after which the simulation should check whether a checkpoint is due"""
+        if self.every_steps is not None:
+            return self.every_steps
+        return _TIME_CHECK_STEPS
+
+    def due(self, steps):
+        """Check whether a checkpoint is due at the given (total) step count"""
+        if self.every_steps is not None and steps - self._last_steps >= self.every_steps:
+            return True
+        return self.every_seconds is not None and time.perf_counter() - self._last_time >= self.every_seconds
+
+    def submit(self, steps, metadata, sections):
+        """Hand over a snapshot to be written in the background (see write_checkpoint()).
+        The snapshot must not be modified afterwards. Instead of the sections, a function returning them can be
+        passed, which is called in the background thread, e.g. to pack a copied word."""
+        self._last_steps = steps
+        self._last_time = time.perf_counter()
+        with self._condition:
+            self._pending = (metadata, sections)
+            self._condition.notify()
+
+    def close(self):
+        """Write the remaining snapshot and stop the background thread. Raises the error of a failed write."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _write_loop(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                snapshot, self._pending = self._pending, None
+                if snapshot is None:
+                    return
+            try:
+                metadata, sections = snapshot
+                if callable(sections):
+                    sections = sections()
+                write_checkpoint(self.path, metadata, sections)
+                self.written += 1
+            except Exception as error:  # reported by close()
+                self._error = error
@@ -0,0 +1,65 @@
+import array
+
+UNDEFINED_PRODUCTION = None  # production of a symbol that has no production rule
+
+
+class CompiledProductionRules:
+    """Integer-compiled form of a two tag system's production rules.
+    Symbols are interned to small integers once, so that a simulation can run on a word of packed symbol ids
+    (array('H'), two bytes per symbol) instead of a sequence of symbol names. The productions are packed into
+    arrays of the same type code, so appending a production to the word is a single copy of its ids. Symbols are
+    only decoded back to their names on output.
+
+    Attributes:
+        symbols:            Symbol names, indexed by symbol id (list)
+        symbol_ids:         Lookup table from symbol name to symbol id (dict)
+        typecode:           The array type code of the word and the productions ('H', or 'I' for more than 65536
+                                symbols)
+        productions:        The production of each symbol id (list of arrays), UNDEFINED_PRODUCTION for symbols
+                                without a production rule, e.g. the halting symbol
+        production_lengths: The length of each production (list of int), 0 for undefined productions
+        halting_id:         The symbol id of the halting symbol
+        """
+
+    def __init__(self, production_rules, halting_symbol, extra_symbols=()):
+        """
+        Arguments:
+            production_rules:   The production rules to compile ({symbol: list of symbols})
+            halting_symbol:     The halting symbol
+            extra_symbols:      Symbols that need an id even if they do not occur in the production rules, e.g. the
+                                    symbols of the current word"""
+        symbols = set(production_rules)
+        for production in production_rules.values():
+            symbols.update(production)
+        symbols.update(extra_symbols)
+        symbols.add(halting_symbol)
+
+        self.symbols = sorted(symbols)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.typecode = "H" if len(self.symbols) <= 1 << 16 else "I"
+        self.productions = [UNDEFINED_PRODUCTION] * len(self.symbols)
+        self.production_lengths = [0] * len(self.symbols)
+        for symbol, production in production_rules.items():
+            symbol_id = self.symbol_ids[symbol]
+            self.productions[symbol_id] = self.encode_word(production)
+            self.production_lengths[symbol_id] = len(production)
+        self.halting_id = self.symbol_ids[halting_symbol]
+
+    def can_encode(self, word):
+        """Check whether every symbol of a word has a symbol id"""
+        return set(word).issubset(self.symbol_ids)
+
+    def encode_word(self, word):
+        """Convert a word of symbol names to an array of symbol ids"""
+        symbol_ids = self.symbol_ids
+        return array.array(self.typecode, [symbol_ids[symbol] for symbol in word])
+
+    def decode_word(self, ids):
+        """Convert an array of symbol ids back to a list of symbol names"""
+        symbols = self.symbols
+        return [symbols[symbol_id] for symbol_id in ids]
+
+    def decode_productions(self):
+        """Return the production rules as symbol names ({symbol: list of symbols})"""
+        return {self.symbols[symbol_id]: self.decode_word(production)
+                for symbol_id, production in enumerate(self.productions) if production is not UNDEFINED_PRODUCTION}
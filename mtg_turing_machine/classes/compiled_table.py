@@ -0,0 +1,213 @@
+import hashlib
+import sys
+
+from .tape import ByteTape
+
+# head directions are stored as (offset + 1), so they fit into the two lowest bits of a packed table entry
+_DIRECTION_CODES = {"<": 0, "-": 1, ">": 2}
+
+# status codes returned by the execution kernels
+HALTED = 0  # the machine has reached a stop state
+LIMIT = 1  # the step limit has been reached
+GROW = 2  # the head has left the cell buffer, which needs to grow before the kernel can continue
+UNDEFINED = 3  # there is no transition for the current state and symbol
+
+UNDEFINED_ENTRY = -1  # table entry for a missing transition
+
+_UNLIMITED = sys.maxsize
+
+
+class CompiledTransitionTable:
+    """Integer-compiled form of a Turing machine definition.
+    States and symbols are interned to small integers once, so that a simulation can run on a flat table instead
+    of looking up (state, symbol) tuples in a dictionary. The table is indexed by state * num_symbols + symbol, and
+    each entry packs the transition's target state, write symbol and head direction into a single integer:
+        entry = (target_state << (symbol_bits + 2)) | (write_symbol << 2) | (direction + 1)
+    Missing transitions are stored as UNDEFINED_ENTRY.
+
+    Attributes:
+        states:         State names, indexed by state id (list)
+        symbols:        Symbol names, indexed by symbol id (list). The blank always has the id 0, so that
+                            zero-filled buffers represent blank tape.
+        state_ids:      Lookup table from state name to state id (dict)
+        symbol_ids:     Lookup table from symbol name to symbol id (dict)
+        num_symbols:    The number of symbols, i.e. the row length of the table
+        symbol_bits:    The number of bits a symbol occupies in a packed entry
+        table:          The flat transition table (list of packed entries)
+        stop_bitmap:    One byte per state id, set to 1 for stop states (bytearray)
+        """
+
+    def __init__(self, definition, extra_symbols=()):
+        """
+        Arguments:
+            definition:     The Turing machine definition to compile (TuringDefinition)
+            extra_symbols:  Symbols that need an id even if they do not occur in the transition function,
+                                e.g. the symbols of the current tape"""
+        transitions = definition.transitions
+
+        states = set(definition.stop_states)
+        states.add(definition.initial_state)
+        symbols = set(extra_symbols)
+        for (source_state, read_symbol), (target_state, write_symbol, _) in transitions.items():
+            states.add(source_state)
+            states.add(target_state)
+            symbols.add(read_symbol)
+            symbols.add(write_symbol)
+        symbols.discard(definition.blank)
+
+        self.states = sorted(states)
+        self.symbols = [definition.blank] + sorted(symbols)  # make sure that the blank has the id 0
+        self.state_ids = {state: i for i, state in enumerate(self.states)}
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.num_symbols = len(self.symbols)
+        self.symbol_bits = max(1, (self.num_symbols - 1).bit_length())
+
+        self.table = [UNDEFINED_ENTRY] * (len(self.states) * self.num_symbols)
+        state_shift = self.symbol_bits + 2
+        for (source_state, read_symbol), (target_state, write_symbol, direction) in transitions.items():
+            index = self.state_ids[source_state] * self.num_symbols + self.symbol_ids[read_symbol]
+            self.table[index] = ((self.state_ids[target_state] << state_shift)
+                                 | (self.symbol_ids[write_symbol] << 2)
+                                 | _DIRECTION_CODES[direction])
+
+        self.stop_bitmap = bytearray(len(self.states))
+        for state in definition.stop_states:
+            self.stop_bitmap[self.state_ids[state]] = 1
+        self._hash = None
+
+    @classmethod
+    def from_arrays(cls, states, symbols, table, stop_bitmap):
+        """Construct a table from its attributes, e.g. ones that have been saved to a binary definition file,
+        without compiling a definition again.
+        Arguments:
+            states:         State names, indexed by state id (sequence)
+            symbols:        Symbol names, indexed by symbol id (sequence), starting with the blank
+            table:          The flat transition table (sequence of packed entries)
+            stop_bitmap:    One byte per state id, set to 1 for stop states (bytes-like)"""
+        compiled = cls.__new__(cls)
+        compiled.states = list(states)
+        compiled.symbols = list(symbols)
+        compiled.state_ids = {state: i for i, state in enumerate(compiled.states)}
+        compiled.symbol_ids = {symbol: i for i, symbol in enumerate(compiled.symbols)}
+        compiled.num_symbols = len(compiled.symbols)
+        compiled.symbol_bits = max(1, (compiled.num_symbols - 1).bit_length())
+        compiled.table = list(table)
+        compiled.stop_bitmap = bytearray(stop_bitmap)
+        assert len(compiled.table) == len(compiled.states) * compiled.num_symbols
+        assert len(compiled.stop_bitmap) == len(compiled.states)
+        compiled._hash = None
+        return compiled
+
+    def get_hash(self):
+        """Return a hash of everything that determines the behaviour of a kernel running on this table (string).
+        The table does not change after compilation, so the hash is only computed once."""
+        if self._hash is None:
+            content = repr((self.num_symbols, self.symbol_bits, self.table, bytes(self.stop_bitmap)))
+            self._hash = hashlib.sha256(content.encode()).hexdigest()
+        return self._hash
+
+    def can_encode(self, tape):
+        """Check whether every symbol of a tape has a symbol id"""
+        if isinstance(tape, ByteTape):
+            return all(tape.symbols[cell] in self.symbol_ids for cell in set(tape.cells()))
+        return set(tape).issubset(self.symbol_ids)
+
+    def encode_tape(self, tape):
+        """Convert a tape of symbol names to a buffer of symbol ids.
+        Small alphabets are stored in a bytearray, larger ones in a list."""
+        symbol_ids = self.symbol_ids
+        if isinstance(tape, ByteTape) and self.num_symbols <= 256:
+            # map the tape's own symbol ids to the table's ids in a single pass.
+            # Symbols the tape has interned but does not contain anymore may be unknown to the table.
+            translation = bytes(symbol_ids.get(symbol, 0) for symbol in tape.symbols)
+            return tape.cells().translate(translation.ljust(256, b"\0"))
+        ids = [symbol_ids[symbol] for symbol in tape]
+        if self.num_symbols <= 256:
+            return bytearray(ids)
+        return ids
+
+    def decode_tape(self, cells):
+        """Convert a buffer of symbol ids back to a list of symbol names"""
+        symbols = self.symbols
+        return [symbols[cell] for cell in cells]
+
+    def kernel(self, cells, pos, lo, hi, state, limit):
+        """Generic table-driven execution kernel.
+        Runs until the machine halts, hits a missing transition, has taken 'limit' steps, or the head leaves the
+        cell buffer. The kernel never allocates, growing the buffer is left to the caller (see execute()).
+        Arguments:
+            cells:  The tape as a buffer of symbol ids (bytearray or list)
+            pos:    The head position within the buffer
+            lo:     Start of the used region of the buffer. Cells outside of [lo, hi) have never been visited.
+            hi:     End of the used region of the buffer (exclusive)
+            state:  The current state id
+            limit:  The maximum number of steps to take
+        Returns a tuple (status, pos, lo, hi, state, steps)"""
+        table = self.table
+        stop_bitmap = self.stop_bitmap
+        num_symbols = self.num_symbols
+        symbol_mask = (1 << self.symbol_bits) - 1
+        state_shift = self.symbol_bits + 2
+        size = len(cells)
+
+        steps = 0
+        while steps < limit:
+            if stop_bitmap[state]:
+                return HALTED, pos, lo, hi, state, steps
+            entry = table[state * num_symbols + cells[pos]]
+            if entry < 0:
+                return UNDEFINED, pos, lo, hi, state, steps
+            cells[pos] = (entry >> 2) & symbol_mask
+            pos += (entry & 3) - 1
+            state = entry >> state_shift
+            steps += 1
+
+            # keep track of the visited region, so the tape can be cut to the same length step() would produce
+            if pos < lo:
+                lo = pos
+                if pos < 0:
+                    return GROW, pos, lo, hi, state, steps
+            elif pos >= hi:
+                hi = pos + 1
+                if pos == size:
+                    return GROW, pos, lo, hi, state, steps
+
+        if stop_bitmap[state]:
+            return HALTED, pos, lo, hi, state, steps
+        return LIMIT, pos, lo, hi, state, steps
+
+
+def grow_cells(cells, pos):
+    """Grow a cell buffer on the side the head has left it. The buffer at least doubles in size, so the growth is
+    amortized O(1) per step. New cells are blank (id 0).
+    Returns a tuple (cells, shift), where shift is the offset that needs to be added to all buffer positions"""
+    padding = max(len(cells), 16)
+    if pos < 0:
+        if isinstance(cells, bytearray):
+            return bytearray(padding) + cells, padding
+        return [0] * padding + cells, padding
+    if isinstance(cells, bytearray):
+        cells.extend(bytes(padding))
+    else:
+        cells.extend([0] * padding)
+    return cells, 0
+
+
+def execute(kernel, cells, pos, lo, hi, state, max_steps=None):
+    """Drive a kernel (see CompiledTransitionTable.kernel()) until it halts, hits a missing transition or
+    has taken max_steps steps. Grows the cell buffer whenever the kernel requests it.
+    Returns a tuple (status, cells, pos, lo, hi, state, steps, shift), where shift is the total offset that has been
+    added to all buffer positions by growing the buffer on the left"""
+    steps = 0
+    total_shift = 0
+    while True:
+        limit = _UNLIMITED if max_steps is None else max_steps - steps
+        status, pos, lo, hi, state, taken = kernel(cells, pos, lo, hi, state, limit)
+        steps += taken
+        if status != GROW:
+            return status, cells, pos, lo, hi, state, steps, total_shift
+        cells, shift = grow_cells(cells, pos)
+        pos += shift
+        lo += shift
+        hi += shift
+        total_shift += shift
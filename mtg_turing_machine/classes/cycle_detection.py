@@ -0,0 +1,182 @@
+from collections import deque
+from itertools import islice
+
+
+def _strip_blanks(cells, left):
+    """Strip blank cells (id 0) from one end of a cell buffer (bytearray or list)"""
+    if isinstance(cells, bytearray):
+        return cells.lstrip(b"\0") if left else cells.rstrip(b"\0")
+    start, end = 0, len(cells)
+    if left:
+        while start < end and cells[start] == 0:
+            start += 1
+    else:
+        while end > start and cells[end - 1] == 0:
+            end -= 1
+    return cells[start:end]
+
+
+def _blanks_like(cells, count):
+    """Return 'count' blank cells of the same buffer type as cells"""
+    return bytearray(count) if isinstance(cells, bytearray) else [0] * count
+
+
+def _window(cells, start, end, left):
+    """Return the cells of [start, end) with the blanks at the far end stripped, as a hashable value"""
+    window = _strip_blanks(cells[start:end], left)
+    return bytes(window) if isinstance(window, bytearray) else tuple(window)
+
+
+class _Snapshot:
+    """Configuration of a Turing machine at a sample point, plus the head's extent since then.
+    All positions are absolute, i.e. relative to the first cell of the tape the run started with.
+    The tape is only copied for sample points whose window matches an earlier one (see TuringCycleDetector)."""
+
+    def __init__(self, steps, position, right_window, left_window):
+        self.steps = steps
+        self.position = position
+        self.right_window = right_window
+        self.left_window = left_window
+        self.tape_lo = None
+        self.tape = None
+        self.run_min = position
+        self.run_max = position
+
+    def suffix(self, start):
+        """Return the tape content from the absolute position 'start' on"""
+        if start >= self.tape_lo:
+            return self.tape[start - self.tape_lo:]
+        return _blanks_like(self.tape, self.tape_lo - start) + self.tape
+
+    def prefix(self, end):
+        """Return the tape content up to the absolute position 'end' (exclusive), but not left of the tape"""
+        length = end - self.tape_lo
+        if length <= len(self.tape):
+            return self.tape[:max(length, 0)]
+        return self.tape + _blanks_like(self.tape, length - len(self.tape))
+
+
+class TuringCycleDetector:
+    """Detector for Turing machines that repeat a configuration, either exactly or translated along the tape.
+    The detector is fed with the machine's configuration at sample points. Let t1 < t2 be two sample points with
+    the same state, the head moving by d cells from t1 to t2, and m (M) the leftmost (rightmost) head position in
+    between. For d >= 0, the steps from t1 to t2 only depend on the tape from m on. If the tape from m + d on at t2
+    equals the tape from m on at t1, the machine repeats the same steps shifted by d forever. The case d < 0 is
+    symmetric with the tape up to M. Exact repeats are the special case d = 0.
+    Such a cycle requires the 'window' cells right of the head (for d >= 0) or left of the head (for d < 0) to
+    match as well. Sample points are therefore looked up by their state and windows, and only sample points whose
+    window matches an earlier one keep a copy of the tape for the full comparison. Cycles are found at the second
+    retained sample point whose distance to an earlier one is a multiple of the cycle's period.
+
+    Attributes:
+        max_snapshots:  The maximum number of retained sample points
+        window_size:    The number of cells in each window, including the head cell
+        """
+
+    def __init__(self, max_snapshots=64, window_size=16):
+        self.max_snapshots = max_snapshots
+        self.window_size = window_size
+        self._snapshots = deque()
+        self._by_right_window = {}
+        self._by_left_window = {}
+
+    def check(self, steps, state, cells, origin, pos, lo, hi, run_lo, run_hi):
+        """Add a sample point and compare it against the retained ones.
+        Arguments:
+            steps:          The step count at the sample point
+            state:          The state id
+            cells:          The cell buffer (bytearray or list of symbol ids)
+            origin:         The buffer position of the first cell of the tape the run started with
+            pos:            The buffer position of the head
+            lo, hi:         The region of the buffer that holds the tape (exclusive end)
+            run_lo, run_hi: The region of the buffer the head has visited since the previous sample point
+        Returns a tuple (period, shift) if the machine has entered a cycle, and None otherwise"""
+        for snapshot in self._snapshots:
+            snapshot.run_min = min(snapshot.run_min, run_lo - origin)
+            snapshot.run_max = max(snapshot.run_max, run_hi - 1 - origin)
+
+        position = pos - origin
+        right_key = (state, _window(cells, pos, min(pos + self.window_size, hi), False))
+        left_key = (state, _window(cells, max(pos + 1 - self.window_size, lo), pos + 1, True))
+        current = _Snapshot(steps, position, right_key, left_key)
+        candidates = [snapshot for snapshot in self._by_right_window.get(right_key, ())
+                      if position >= snapshot.position]
+        candidates += [snapshot for snapshot in self._by_left_window.get(left_key, ())
+                       if position < snapshot.position]
+        if candidates:
+            current.tape_lo = lo - origin
+            current.tape = cells[lo:hi]
+        for snapshot in sorted(candidates, key=lambda candidate: -candidate.steps):
+            shift = position - snapshot.position
+            if snapshot.tape is not None and self._is_cycle(snapshot, current, shift):
+                return steps - snapshot.steps, shift
+
+        self._snapshots.append(current)
+        self._by_right_window.setdefault(right_key, []).append(current)
+        self._by_left_window.setdefault(left_key, []).append(current)
+        if len(self._snapshots) > self.max_snapshots:
+            oldest = self._snapshots.popleft()
+            self._remove(self._by_right_window, oldest.right_window, oldest)
+            self._remove(self._by_left_window, oldest.left_window, oldest)
+        return None
+
+    @staticmethod
+    def _remove(snapshots_by_key, key, snapshot):
+        """Remove a snapshot from one of the lookup tables"""
+        snapshots = snapshots_by_key[key]
+        snapshots.remove(snapshot)
+        if not snapshots:
+            del snapshots_by_key[key]
+
+    @staticmethod
+    def _is_cycle(old, new, shift):
+        """Check whether the configuration 'new' repeats the configuration 'old', shifted by 'shift' cells"""
+        if shift >= 0:
+            return _strip_blanks(old.suffix(old.run_min), False) == \
+                   _strip_blanks(new.suffix(old.run_min + shift), False)
+        return _strip_blanks(old.prefix(old.run_max + 1), True) == \
+            _strip_blanks(new.prefix(old.run_max + 1 + shift), True)
+
+
+class TagCycleDetector:
+    """Detector for two tag systems that repeat a word exactly.
+    The detector is fed with the word at sample points and looks them up by a fingerprint of the word's length and
+    the symbols at both of its ends. Only words whose fingerprint matches an earlier one are copied and compared in
+    full, so a repeat is found at the second retained sample point whose distance to an earlier one is a multiple
+    of the cycle's period.
+
+    Attributes:
+        max_snapshots:  The maximum number of retained sample points
+        window_size:    The number of symbols taken from each end of the word for the fingerprint
+        """
+
+    def __init__(self, max_snapshots=64, window_size=16):
+        self.max_snapshots = max_snapshots
+        self.window_size = window_size
+        self._samples = {}
+        self._order = deque()
+
+    def check(self, steps, word):
+        """Add a sample point and compare it against the retained ones.
+        Arguments:
+            steps:  The step count at the sample point
+            word:   The current word (sequence of symbols)
+        Returns the period if the two tag system has entered a cycle, and None otherwise"""
+        fingerprint = (len(word), tuple(islice(word, self.window_size)),
+                       tuple(islice(reversed(word), self.window_size)))
+        samples = self._samples.setdefault(fingerprint, [])
+        full_word = tuple(word) if samples else None
+        for previous_steps, previous_word in reversed(samples):
+            if previous_word is not None and previous_word == full_word:
+                return steps - previous_steps
+
+        sample = (steps, full_word)
+        samples.append(sample)
+        self._order.append((fingerprint, sample))
+        if len(self._order) > self.max_snapshots:
+            oldest_fingerprint, oldest = self._order.popleft()
+            oldest_samples = self._samples[oldest_fingerprint]
+            oldest_samples.remove(oldest)
+            if not oldest_samples:
+                del self._samples[oldest_fingerprint]
+        return None
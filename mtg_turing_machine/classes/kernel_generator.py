@@ -0,0 +1,152 @@
+from collections import OrderedDict
+
+from .compiled_table import HALTED, LIMIT, GROW, UNDEFINED, UNDEFINED_ENTRY
+
+# generated kernels, keyed by the hash of the transition table they were generated from and the inline depth.
+# The least recently used kernel is dropped once the cache is full, so the code of kernels for transition tables
+# that are not used anymore does not pile up.
+_KERNEL_CACHE = OrderedDict()
+KERNEL_CACHE_SIZE = 64
+
+
+def get_kernel(table, inline_depth=1):
+    """Return a kernel specialized for a CompiledTransitionTable, generating and compiling it if necessary.
+    Kernels are cached by the hash of the transition table, so machines with the same table share a kernel.
+    The kernel has the same interface as CompiledTransitionTable.kernel().
+    Arguments:
+        table:          The CompiledTransitionTable
+        inline_depth:   The number of successor states that are inlined into each transition (see
+                            generate_kernel_source())"""
+    key = (table.get_hash(), inline_depth)
+    kernel = _KERNEL_CACHE.get(key)
+    if kernel is not None:
+        _KERNEL_CACHE.move_to_end(key)
+        return kernel
+
+    source = generate_kernel_source(table, inline_depth)
+    namespace = {}
+    exec(compile(source, "<kernel {}>".format(key[0][:12]), "exec"), namespace)
+    kernel = namespace["kernel"]
+    _KERNEL_CACHE[key] = kernel
+    if len(_KERNEL_CACHE) > KERNEL_CACHE_SIZE:
+        _KERNEL_CACHE.popitem(last=False)
+    return kernel
+
+
+class _SourceWriter:
+    """Helper class collecting indented lines of generated source code"""
+
+    def __init__(self):
+        self.lines = []
+
+    def add(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def source(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def generate_kernel_source(table, inline_depth=1):
+    """Generate the Python source of a kernel specialized for a CompiledTransitionTable.
+    Every state becomes a code block with its own inner loop, in which the transitions for each symbol are inlined
+    as straight-line code. The state and symbol cases are selected by binary decision trees, so neither dictionary
+    lookups nor tuple unpacking remain in the hot loop. Self-loop transitions stay inside the state's inner loop.
+    Selecting a state in the state tree takes log2(#states) comparisons, which dominates for machines with many
+    states, e.g. binarized ones. Therefore, the code of the successor states is inlined into each transition up to
+    the given depth, so a state change only goes through the state tree every inline_depth + 1 steps.
+    Returns the source code as a string, defining the function kernel(cells, pos, lo, hi, state, limit)"""
+    writer = _SourceWriter()
+    writer.add(0, "def kernel(cells, pos, lo, hi, state, limit):")
+    writer.add(1, "size = len(cells)")
+    writer.add(1, "steps = 0")
+    writer.add(1, "while True:")
+    _write_state_tree(writer, table, 0, len(table.states), inline_depth, 2)
+    return writer.source()
+
+
+def _write_state_tree(writer, table, first, last, inline_depth, indent):
+    """Write a binary decision tree that selects the code block for the state ids in [first, last)"""
+    if last - first == 1:
+        _write_state_block(writer, table, first, inline_depth, indent)
+        return
+    middle = (first + last) // 2
+    writer.add(indent, "if state < {}:".format(middle))
+    _write_state_tree(writer, table, first, middle, inline_depth, indent + 1)
+    writer.add(indent, "else:")
+    _write_state_tree(writer, table, middle, last, inline_depth, indent + 1)
+
+
+def _write_state_block(writer, table, state, inline_depth, indent):
+    """Write the code block of a single state"""
+    if table.stop_bitmap[state]:
+        writer.add(indent, "return {}, pos, lo, hi, state, steps".format(HALTED))
+        return
+    writer.add(indent, "while True:")
+    _write_state_step(writer, table, state, state, inline_depth, indent + 1)
+
+
+def _write_state_step(writer, table, block_state, state, inline_depth, indent):
+    """Write the code of a single step in a (possibly inlined) state.
+    Arguments:
+        block_state:    The state whose inner loop the code is part of
+        state:          The state the step is taken in
+        inline_depth:   The number of successor states that may still be inlined"""
+    row = table.table[state * table.num_symbols:(state + 1) * table.num_symbols]
+    writer.add(indent, "if steps >= limit:")
+    writer.add(indent + 1, "return {}, pos, lo, hi, {}, steps".format(LIMIT, state))
+    writer.add(indent, "symbol = cells[pos]")
+    _write_symbol_tree(writer, table, block_state, state, row, 0, len(row), inline_depth, indent)
+
+
+def _write_symbol_tree(writer, table, block_state, state, row, first, last, inline_depth, indent):
+    """Write a binary decision tree that selects the transition for the symbol ids in [first, last)"""
+    if all(entry == row[first] for entry in row[first:last]):
+        read_symbol = first if last - first == 1 else None
+        _write_transition(writer, table, block_state, state, row[first], read_symbol, inline_depth, indent)
+        return
+    middle = (first + last) // 2
+    writer.add(indent, "if symbol < {}:".format(middle))
+    _write_symbol_tree(writer, table, block_state, state, row, first, middle, inline_depth, indent + 1)
+    writer.add(indent, "else:")
+    _write_symbol_tree(writer, table, block_state, state, row, middle, last, inline_depth, indent + 1)
+
+
+def _write_transition(writer, table, block_state, state, entry, read_symbol, inline_depth, indent):
+    """Write the straight-line code of a single transition.
+    Arguments:
+        read_symbol:    The symbol id the transition is selected by, if it is known exactly"""
+    if entry == UNDEFINED_ENTRY:
+        writer.add(indent, "return {}, pos, lo, hi, {}, steps".format(UNDEFINED, state))
+        return
+
+    target_state = entry >> (table.symbol_bits + 2)
+    write_symbol = (entry >> 2) & ((1 << table.symbol_bits) - 1)
+    direction = (entry & 3) - 1
+
+    if write_symbol != read_symbol:
+        writer.add(indent, "cells[pos] = {}".format(write_symbol))
+    writer.add(indent, "steps += 1")
+    if direction < 0:
+        writer.add(indent, "pos -= 1")
+        writer.add(indent, "if pos < lo:")
+        writer.add(indent + 1, "lo = pos")
+        writer.add(indent + 1, "if pos < 0:")
+        writer.add(indent + 2, "return {}, pos, lo, hi, {}, steps".format(GROW, target_state))
+    elif direction > 0:
+        writer.add(indent, "pos += 1")
+        writer.add(indent, "if pos >= hi:")
+        writer.add(indent + 1, "hi = pos + 1")
+        writer.add(indent + 1, "if pos == size:")
+        writer.add(indent + 2, "return {}, pos, lo, hi, {}, steps".format(GROW, target_state))
+
+    if table.stop_bitmap[target_state]:
+        writer.add(indent, "return {}, pos, lo, hi, {}, steps".format(HALTED, target_state))
+    elif target_state == block_state:
+        if state != block_state:
+            writer.add(indent, "continue")
+        # a self-loop of the block's state simply continues with the state's inner loop
+    elif inline_depth > 0:
+        _write_state_step(writer, table, block_state, target_state, inline_depth - 1, indent)
+    else:
+        writer.add(indent, "state = {}".format(target_state))
+        writer.add(indent, "break")
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+
+# status codes of a simulated block visit
+_EXIT = 0  # the head has left the block
+_HALT = 1  # the machine has reached a stop state inside the block
+_UNDEFINED = 2  # there is no transition for the current state and symbol
+_LOOP = 3  # the machine never leaves the block again
+_LIMIT = 4  # the step limit has been reached inside the block
+
+
+class MacroMachine:
+    """k-block macro machine for accelerating a TuringMachine.
+    The tape is viewed as a sequence of blocks of k symbols. Whenever the head enters a block, the behaviour of the
+    machine until the head leaves that block again only depends on the state, the block content and the position
+    the head entered at. These block visits are memoized as
+        (state, block, entry position) -> (new state, new block, exit position, step count)
+    in a bounded least-recently-used cache, so repeated local behaviour is replayed instead of re-simulated.
+    Binarized machines (see TuringMachine.convert_to_two_symbol()) encode every original symbol as a block of
+    bit_depth cells, which makes bit_depth the natural block size for them.
+
+    Attributes:
+        turing_machine: The Turing machine that is run. Its tape, state and steps are updated by run().
+        block_size:     The number of symbols per block (k)
+        cache_size:     The maximum number of memoized block visits
+        cache_hits:     The number of block visits that were replayed from the cache
+        cache_misses:   The number of block visits that had to be simulated
+        """
+
+    def __init__(self, turing_machine, block_size=None, cache_size=1 << 16):
+        """
+        Arguments:
+            turing_machine: The Turing machine to run
+            block_size:     The number of symbols per block. Defaults to the machine's binarized_bit_depth if it
+                                has been binarized, and 1 otherwise. Multiples of the bit depth keep the blocks
+                                aligned with the binarized symbols and replay more steps per cache hit.
+            cache_size:     The maximum number of memoized block visits"""
+        if block_size is None:
+            block_size = turing_machine.binarized_bit_depth if turing_machine.has_been_binarized else 1
+        assert block_size >= 1
+        self.turing_machine = turing_machine
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = OrderedDict()
+        self._table = None
+
+    def _simulate_block(self, state, block, offset, limit=None):
+        """Simulate the machine inside a single block.
+        Arguments:
+            state:  The state id the head enters the block with
+            block:  The block content (bytes or tuple of symbol ids)
+            offset: The position inside the block the head enters at
+            limit:  The maximum number of steps to simulate
+        Returns a tuple (status, state, block, offset, steps, min_offset, max_offset), where min_offset and
+        max_offset are the extreme head positions inside the block"""
+        table = self._table
+        num_symbols = table.num_symbols
+        symbol_mask = (1 << table.symbol_bits) - 1
+        state_shift = table.symbol_bits + 2
+        size = self.block_size
+
+        cells = list(block)
+        steps = 0
+        min_offset = max_offset = offset
+        visited = set()
+        status = _EXIT
+        while 0 <= offset < size:
+            if table.stop_bitmap[state]:
+                status = _HALT
+                break
+            if limit is not None and steps == limit:
+                status = _LIMIT
+                break
+            if limit is None:
+                configuration = (state, offset, tuple(cells))
+                if configuration in visited:
+                    status = _LOOP
+                    break
+                visited.add(configuration)
+
+            entry = table.table[state * num_symbols + cells[offset]]
+            if entry < 0:
+                status = _UNDEFINED
+                break
+            cells[offset] = (entry >> 2) & symbol_mask
+            offset += (entry & 3) - 1
+            state = entry >> state_shift
+            steps += 1
+            if 0 <= offset < size:
+                min_offset = min(min_offset, offset)
+                max_offset = max(max_offset, offset)
+
+        new_block = bytes(cells) if isinstance(block, bytes) else tuple(cells)
+        return status, state, new_block, offset, steps, min_offset, max_offset
+
+    def _visit_block(self, state, block, offset):
+        """Return the result of a complete block visit, from the cache if possible (see _simulate_block())"""
+        key = (state, block, offset)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return result
+        self.cache_misses += 1
+        result = self._simulate_block(state, block, offset)
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def run(self, max_steps=None):
+        """Run the Turing machine block by block, without any output.
+        The resulting tape, head position, state and step count are identical to calling step() until it returns
+        True. If the machine gets stuck in an endless loop inside a single block and max_steps is not set, the run
+        ends at the beginning of that block visit.
+        Arguments:
+            max_steps:  Stop after this many steps, even if the machine has not halted yet
+        Returns True if the machine has halted"""
+        tm = self.turing_machine
+        table = tm.compile()
+        if table is not self._table:
+            self._cache.clear()  # the cached block visits use the symbol and state ids of the previous table
+            self._table = table
+        if table.num_symbols <= 256:
+            make_block = bytes
+        else:
+            make_block = tuple
+        size = self.block_size
+        blank_block = make_block([0] * size)
+
+        # split the tape into blocks that are aligned to the tape's first cell
+        cells = table.encode_tape(tm.definition.tape)
+        blocks = {}
+        for start in range(0, len(cells), size):
+            block = list(cells[start:start + size])
+            blocks[start // size] = make_block(block + [0] * (size - len(block)))
+
+        position = tm.definition.tape_index
+        state = table.state_ids[tm.current_state]
+        lo, hi = 0, len(cells)
+
+        # step() adds a blank if the head starts right behind the end of the tape
+        if position == hi and not table.stop_bitmap[state]:
+            hi += 1
+
+        steps = 0
+        status = _EXIT
+        while True:
+            if table.stop_bitmap[state]:
+                status = _HALT
+                break
+            if max_steps is not None and steps >= max_steps:
+                status = _LIMIT
+                break
+
+            block_index, offset = divmod(position, size)
+            block = blocks.get(block_index, blank_block)
+            result = self._visit_block(state, block, offset)
+            if result[0] == _LOOP and max_steps is None:
+                break
+            if result[0] == _LOOP or (max_steps is not None and steps + result[4] > max_steps):
+                # the step limit ends inside this block, simulate the remaining steps without caching
+                result = self._simulate_block(state, block, offset, limit=max_steps - steps)
+
+            status, state, blocks[block_index], offset, block_steps, min_offset, max_offset = result
+            steps += block_steps
+            if status == _UNDEFINED and steps == max_steps:
+                # the undefined transition would only be taken after the step limit
+                status = _LIMIT
+            block_start = block_index * size
+            position = block_start + offset
+            lo = min(lo, block_start + min_offset, position)
+            hi = max(hi, block_start + max_offset + 1, position + 1)
+            if status != _EXIT:
+                break
+
+        # reassemble the visited region of the tape from the blocks
+        first_block = lo // size
+        last_block = (hi - 1) // size
+        cells = []
+        for block_index in range(first_block, last_block + 1):
+            cells.extend(blocks.get(block_index, blank_block))
+        cells = cells[lo - first_block * size:hi - first_block * size]
+
+        return tm.store_compiled_run(table, cells, position - lo, state, steps, undefined=status == _UNDEFINED)
@@ -1,7 +1,11 @@
 import copy
+import itertools
+import time
 
 from collections import deque
 
+from .checkpoint import CheckpointWriter, encode_symbols, pack_ids, read_checkpoint, write_checkpoint
+from .run_result import RunResult, HALTED, MAX_STEPS, DEADLINE
 from .universal_turing_machine import UniversalTuringMachine
 
 # Map the UTM(2,18) symbols to single letter representations of creature types
@@ -65,6 +69,9 @@ COALITION_VICTORY = "Coalition Victory"
 SOUL_SNUFFERS = "Soul Snuffers"
 CLOAK_OF_INVISIBILITY = "Cloak of Invisibility"
 
+# token colors in the order used for checkpoints
+_COLORS = [GREEN, WHITE, BLACK, BLUE]
+
 
 class Queue(deque):
     """Wrapper for the normal deque that allows access like queue, but retains the benefit
@@ -157,6 +164,15 @@ class Card:
         return attached_card
 
 
+def _get_tape_order(token):
+    """Return the sort key of a tape token, in the same order as MagicTheGatheringTuringMachine.get_tape_sorted()"""
+    if token.color == GREEN:
+        return 0, -token.power_toughness
+    if token.color == BLUE:
+        return 1, 0
+    return 2, token.power_toughness
+
+
 class MagicTheGatheringTuringMachine:
     """The Magic: The Gathering Turing Machine. The current version does not run any simulations, so
     it is only used to convert a UTM(2,18) to its corresponding card representation."""
@@ -179,6 +195,12 @@ class MagicTheGatheringTuringMachine:
         self.state = 0  # keep track of state for printing
         self.cycles = 0
 
+        # tokens that may be near the head, to render trace records without sorting the whole tape (see
+        # record_trace()), and the tokens created since they have been selected
+        self._trace_tokens = None
+        self._trace_cycles = 0
+        self._created_tokens = None
+
     def get_tape_sorted(self):
         tape = list(self.bob.table_tape)
         tape.append(list(self.alice.table_tape)[0])
@@ -430,6 +452,8 @@ class MagicTheGatheringTuringMachine:
 
                 self.alice.table_tape.remove(alice_head)
                 self.alice.table_tape.add(new_token)
+                if self._created_tokens is not None:
+                    self._created_tokens.append(new_token)
                 self.bob.table_tape.add(alice_head)
 
                 # in case an end-of tape token (Lhurgoyf "<" or Rat ">") was created, Alice's Rotlung Reanimator
@@ -591,9 +615,143 @@ class MagicTheGatheringTuringMachine:
         # == MAIN PHASE 2 == (nothing to do: hand is empty)
         # == ENDING PHASE == (nothing to do)
 
-    def run(self, verbose=False):
+    def get_checkpoint(self):
+        """Return the game state as checkpoint data, together with the UTM it has been created from
+        (see UniversalTuringMachine.get_checkpoint()). The tape tokens are stored as packed arrays of creature type
+        ids, power/toughness and flags (color, tapped, controlled by Alice).
+        Returns a tuple (metadata, sections)"""
+        metadata, sections = self._utm.get_checkpoint()
+        tokens = [(token, False) for token in self.bob.table_tape] + [(token, True) for token in self.alice.table_tape]
+        creature_types, type_ids = encode_symbols(token.creature_type for token, _ in tokens)
+        flags = [_COLORS.index(token.color) | token.tapped << 2 | alice << 3 for token, alice in tokens]
+
+        metadata["mtg_turing_machine"] = {
+            "creature_types": creature_types,
+            "hand": None if self.alice.hand is None else self.alice.hand.name,
+            "library": [card.name for card in self.alice.library],
+            "phased_in": [card.phased_in for card in self.bob.table_control],
+            "state": self.state,
+            "cycles": self.cycles,
+            "win": self.alice.win,
+        }
+        sections["token_types"] = type_ids
+        sections["token_power"] = pack_ids([token.power_toughness for token, _ in tokens])
+        sections["token_flags"] = pack_ids(flags, 16)
+        return metadata, sections
+
+    def save_checkpoint(self, path):
+        """Atomically write the game state to a checkpoint file"""
+        write_checkpoint(path, *self.get_checkpoint())
+
+    @classmethod
+    def from_checkpoint(cls, metadata, sections):
+        """Construct a MTG-TM from checkpoint data (see get_checkpoint()).
+        The cards are set up from the UTM as usual, then the tape tokens, Alice's hand and library and the phasing
+        of Bob's controllers are restored."""
+        utm = UniversalTuringMachine.from_checkpoint(metadata, sections)
+        mtg_metadata = metadata["mtg_turing_machine"]
+        mtg_tm = cls(utm)
+
+        illusory_gains = list(mtg_tm.alice.table_tape)[0].detach_card()
+        mtg_tm.alice.table_tape = set()
+        mtg_tm.bob.table_tape = set()
+        creature_types = mtg_metadata["creature_types"]
+        for type_id, power_toughness, flags in zip(sections["token_types"], sections["token_power"],
+                                                   sections["token_flags"]):
+            token = Token(creature_types[type_id], _COLORS[flags & 3], power_toughness, tapped=bool(flags & 4))
+            if flags & 8:
+                token.attach_card(illusory_gains)
+                mtg_tm.alice.table_tape.add(token)
+            else:
+                mtg_tm.bob.table_tape.add(token)
+        assert len(mtg_tm.alice.table_tape) == 1
+
+        cards = {card.name: card for card in [mtg_tm.alice.hand] + list(mtg_tm.alice.library)}
+        mtg_tm.alice.hand = None if mtg_metadata["hand"] is None else cards[mtg_metadata["hand"]]
+        mtg_tm.alice.library.clear()
+        mtg_tm.alice.library.extend(cards[name] for name in mtg_metadata["library"])  # same order as saved
+        for card, phased_in in zip(mtg_tm.bob.table_control, mtg_metadata["phased_in"]):
+            card.phased_in = phased_in
+
+        mtg_tm.state = mtg_metadata["state"]
+        mtg_tm.cycles = mtg_metadata["cycles"]
+        mtg_tm.alice.win = mtg_metadata["win"]
+        return mtg_tm
+
+    @classmethod
+    def resume(cls, path):
+        """Construct a MTG-TM from a checkpoint file, so that a game can be continued where it has been saved"""
+        return cls.from_checkpoint(*read_checkpoint(path))
+
+    def record_trace(self, trace):
+        """Write the current tape tokens to a TraceWriter. The step count is the number of cycles, the state is
+        the UTM state and the cells are the tokens' creature types around the head. The head is the 2/2 token, or
+        the token with the lowest power/toughness in the middle of a cycle.
+        A token's power/toughness grows with its distance to the head and changes by at most one per cycle. So the
+        tokens that can be within the trace window during the next cycles are selected once by their
+        power/toughness, and each record only sorts these and the tokens that have been created since."""
+        margin = 4 * trace.window
+        if self._trace_tokens is None or self.cycles - self._trace_cycles > margin:
+            # tokens are at most two points off their distance to the head in the middle of a cycle
+            max_power_toughness = trace.window + margin + 6
+            self._trace_tokens = [token for token in itertools.chain(self.bob.table_tape, self.alice.table_tape)
+                                  if token.power_toughness <= max_power_toughness]
+            self._trace_cycles = self.cycles
+        else:
+            self._trace_tokens = [token for token in itertools.chain(self._trace_tokens, self._created_tokens)
+                                  if token in self.bob.table_tape or token in self.alice.table_tape]
+        self._created_tokens = []
+
+        sorted_tape = sorted(self._trace_tokens, key=_get_tape_order)
+        head = 0
+        for index, token in enumerate(sorted_tape):
+            if token.power_toughness <= sorted_tape[head].power_toughness:
+                head = index
+        trace.record_tape(self.cycles, "q{}".format(self.state + 1), [token.creature_type for token in sorted_tape],
+                          head)
+
+    def run(self, verbose=False, checkpoint_path=None, checkpoint_steps=None, checkpoint_seconds=None, trace=None,
+            max_cycles=None, deadline=None):
+        """Run the game until Alice wins, or until a cycle or time budget is used up.
+        Arguments:
+            verbose:            Print the tape every cycle
+            max_cycles:         Stop after this many cycles (UTM steps), even if Alice has not won yet
+            deadline:           Stop after this many seconds of wall time
+            trace:              Record the game to a TraceWriter, sampled by cycles and UTM state
+            checkpoint_path:    Periodically write checkpoints to this file (see resume()), and a final one when
+                                    the game ends. Checkpoints are written from a background thread.
+            checkpoint_steps:   Write a checkpoint every this many cycles
+            checkpoint_seconds: Write a checkpoint every this many seconds of wall time
+        Returns a RunResult, whose steps are the cycles"""
+        start_time = time.perf_counter()
+        reason = HALTED
+        writer = None
+        if checkpoint_path is not None:
+            writer = CheckpointWriter(checkpoint_path, every_steps=checkpoint_steps, every_seconds=checkpoint_seconds,
+                                      steps=self.cycles)
+        if trace is not None:
+            self.record_trace(trace)
         while not self.alice.win:
+            if max_cycles is not None and self.cycles >= max_cycles:
+                reason = MAX_STEPS
+                break
+            if deadline is not None and time.perf_counter() - start_time >= deadline:
+                reason = DEADLINE
+                break
             self.step(verbose)
+            if trace is not None and trace.due(self.cycles, "q{}".format(self.state + 1)):
+                self.record_trace(trace)
+            if writer is not None and writer.due(self.cycles):
+                writer.submit(self.cycles, *self.get_checkpoint())
+        if trace is not None:
+            self.record_trace(trace)
+            trace.flush()
+            self._trace_tokens = self._created_tokens = None
+        if writer is not None:
+            writer.submit(self.cycles, *self.get_checkpoint())
+            writer.close()
+        return RunResult(self.alice.win, reason, self.cycles, time.perf_counter() - start_time,
+                         "q{}".format(self.state + 1))
 
     def get_utm(self):
         self.decode_tape()
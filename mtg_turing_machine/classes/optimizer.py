@@ -0,0 +1,340 @@
+def find_reachable(transitions, roots, stop_states, tape_symbols):
+    """Find the states and symbols that can occur while a Turing machine runs.
+    A state is reachable if it is a root or the target of a reachable transition. A symbol is reachable if it is
+    on the tape or written by a reachable transition. A transition is reachable if its source state and its read
+    symbol are reachable and the source is not a stop state. Every transition is looked at no more than twice,
+    once when its state and once when its symbol becomes reachable.
+    Arguments:
+        transitions:    The transition function (see TuringDefinition)
+        roots:          The states the machine can start in
+        stop_states:    The stop states
+        tape_symbols:   The symbols that can be on the tape initially, including the blank
+    Returns a tuple (states, symbols) of sets"""
+    stop_states = set(stop_states)
+    transitions_by_state = {}
+    transitions_by_symbol = {}
+    for (source_state, read_symbol), transition in transitions.items():
+        if source_state not in stop_states:
+            transitions_by_state.setdefault(source_state, []).append((read_symbol, transition))
+            transitions_by_symbol.setdefault(read_symbol, []).append((source_state, transition))
+
+    states = set()
+    symbols = set()
+    pending_states = list(roots)
+    pending_symbols = list(tape_symbols)
+    while pending_states or pending_symbols:
+        new_transitions = []
+        while pending_states:
+            state = pending_states.pop()
+            if state not in states:
+                states.add(state)
+                new_transitions.extend(transition for read_symbol, transition in transitions_by_state.get(state, ())
+                                       if read_symbol in symbols)
+        while pending_symbols:
+            symbol = pending_symbols.pop()
+            if symbol not in symbols:
+                symbols.add(symbol)
+                new_transitions.extend(transition for source_state, transition
+                                       in transitions_by_symbol.get(symbol, ()) if source_state in states)
+        for target_state, write_symbol, _ in new_transitions:
+            pending_states.append(target_state)
+            pending_symbols.append(write_symbol)
+    return states, symbols
+
+
+def fuse_stay_transitions(transitions, stop_states):
+    """Fuse transitions that do not move the head with the transition that follows them.
+    After a transition (a, x) -> (b, y, '-'), the machine always continues with the transition for (b, y), so the
+    first transition can write that transition's symbol and go to its state right away. Chains of such transitions
+    are followed until a transition moves the head, enters a stop state or is undefined. Cycles of '-' transitions
+    are left alone. The machine computes the same tapes in fewer steps.
+    Arguments:
+        transitions:    The transition function (see TuringDefinition)
+        stop_states:    The stop states
+    Returns a tuple (new transitions, number of fused transitions)"""
+    stop_states = set(stop_states)
+    fused_transitions = {}
+    fused_count = 0
+    for key, transition in transitions.items():
+        visited = {key}
+        fused = transition
+        target_state, write_symbol, direction = fused
+        while direction == "-" and target_state not in stop_states:
+            next_key = (target_state, write_symbol)
+            if next_key in visited:
+                # the machine never leaves this cell
+                fused = transition
+                break
+            if next_key not in transitions:
+                break
+            visited.add(next_key)
+            fused = transitions[next_key]
+            target_state, write_symbol, direction = fused
+        if fused != transition:
+            fused_count += 1
+        fused_transitions[key] = fused
+    return fused_transitions, fused_count
+
+
+def merge_equivalent_states(transitions, stop_states, initial_state, alphabet, roots=()):
+    """Merge equivalent states and drop the states that cannot be reached.
+    Two states are equivalent if they write the same symbols, move in the same directions and go to equivalent
+    states for every symbol of the alphabet. The equivalence classes are found by partition refinement, starting
+    with one class for all other states and one class for each stop state. Each class is represented by the
+    initial state, or by its smallest state name.
+    Arguments:
+        transitions:    The transition function (see TuringDefinition)
+        stop_states:    The stop states
+        initial_state:  The initial state
+        alphabet:       The symbols that can be read
+        roots:          Further states the machine can be in, e.g. the current state
+    Returns a tuple (new transitions, mapping of every state to the state that represents it)"""
+    stop_states = set(stop_states)
+    states = set(stop_states)
+    states.add(initial_state)
+    states.update(roots)
+    for (source_state, _), (target_state, _, _) in transitions.items():
+        states.add(source_state)
+        states.add(target_state)
+
+    classes = {state: state if state in stop_states else None for state in states}
+    class_count = len(set(classes.values()))
+    while True:
+        signatures = {}
+        for state in states:
+            row = []
+            for symbol in alphabet:
+                transition = transitions.get((state, symbol))
+                if transition is not None:
+                    target_state, write_symbol, direction = transition
+                    transition = (classes[target_state], write_symbol, direction)
+                row.append(transition)
+            signatures[state] = (classes[state], tuple(row))
+        signature_ids = {}
+        classes = {state: signature_ids.setdefault(signature, len(signature_ids))
+                   for state, signature in signatures.items()}
+        if len(signature_ids) == class_count:
+            break
+        class_count = len(signature_ids)
+
+    representatives = {}
+    for state in sorted(states, key=lambda name: (name != initial_state, name)):
+        representatives.setdefault(classes[state], state)
+    renamed = {state: representatives[classes[state]] for state in states}
+
+    # keep the transitions of the representatives that can be reached from the roots
+    merged_transitions = {}
+    pending = [initial_state] + [renamed[state] for state in roots]
+    reachable = set(pending)
+    while pending:
+        state = pending.pop()
+        for symbol in alphabet:
+            transition = transitions.get((state, symbol))
+            if transition is not None:
+                target_state, write_symbol, direction = transition
+                target_state = renamed[target_state]
+                merged_transitions[(state, symbol)] = (target_state, write_symbol, direction)
+                if target_state not in reachable:
+                    reachable.add(target_state)
+                    pending.append(target_state)
+    return merged_transitions, renamed
+
+
+class OptimizationReport:
+    """Summary of an optimization pass (see optimize_definition()).
+    Symbols are never renamed, so the optimized machine's tapes need no decoding. States are renamed to the
+    representative of their equivalence class, which state_mapping translates.
+
+    Attributes:
+        state_mapping:      Maps every original state that is still in use to the state that replaces it (dict)
+        removed_states:     The original states that cannot be reached (sorted list)
+        removed_symbols:    The symbols that can never be on the tape (sorted list)
+        fused_transitions:  The number of transitions that have been fused with a following '-' transition
+        states:             The number of states before and after the optimization (tuple)
+        transitions:        The number of transitions before and after the optimization (tuple)
+        """
+
+    def __init__(self, state_mapping, removed_states, removed_symbols, fused_transitions, states, transitions):
+        self.state_mapping = state_mapping
+        self.removed_states = removed_states
+        self.removed_symbols = removed_symbols
+        self.fused_transitions = fused_transitions
+        self.states = states
+        self.transitions = transitions
+
+    def __repr__(self):
+        return "{name}(states={states[0]}->{states[1]}, transitions={transitions[0]}->{transitions[1]}, " \
+               "removed_symbols={removed_symbols!r}, fused_transitions={fused})".format(
+                   name=type(self).__name__, states=self.states, transitions=self.transitions,
+                   removed_symbols=self.removed_symbols, fused=self.fused_transitions)
+
+
+def _get_states(transitions):
+    states = set()
+    for (source_state, _), (target_state, _, _) in transitions.items():
+        states.add(source_state)
+        states.add(target_state)
+    return states
+
+
+def optimize_definition(definition, input_alphabet=None, current_state=None):
+    """Optimize a Turing machine definition, e.g. before converting it to a binary Turing machine. The pass
+        1. fuses '-' transitions with the transition that follows them (see fuse_stay_transitions()),
+        2. removes the states and symbols that cannot be reached (see find_reachable()),
+        3. merges equivalent states (see merge_equivalent_states()).
+    The optimized machine computes the same tapes for the given input alphabet, in the same number of steps or
+    fewer. The optimized definition starts with a copy of the definition's tape.
+    Arguments:
+        definition:     The Turing machine definition (TuringDefinition)
+        input_alphabet: The symbols the tape may contain when the machine is started. Defaults to the symbols of
+                            the definition's current tape.
+        current_state:  The state the machine is currently in, if it is not the initial state
+    Returns a tuple (optimized TuringDefinition, OptimizationReport)"""
+    transitions = definition.transitions
+    tape = definition.tape.to_list()
+    if input_alphabet is None:
+        input_alphabet = tape
+    tape_symbols = set(input_alphabet)
+    tape_symbols.add(definition.blank)
+    roots = [definition.initial_state]
+    if current_state is not None:
+        roots.append(current_state)
+
+    fused_transitions, fused_count = fuse_stay_transitions(transitions, definition.stop_states)
+    states, symbols = find_reachable(fused_transitions, roots, definition.stop_states, tape_symbols)
+    reachable_transitions = {(source_state, read_symbol): transition
+                             for (source_state, read_symbol), transition in fused_transitions.items()
+                             if source_state in states and read_symbol in symbols
+                             and source_state not in definition.stop_states}
+    stop_states = [state for state in definition.stop_states if state in states]
+    merged_transitions, renamed = merge_equivalent_states(reachable_transitions, stop_states,
+                                                          definition.initial_state, sorted(symbols), roots)
+    assert merged_transitions, "the machine halts before it takes a single step"
+
+    all_states = _get_states(transitions)
+    all_states.update(definition.stop_states)
+    all_states.add(definition.initial_state)
+    all_symbols = set(tape_symbols)
+    for (_, read_symbol), (_, write_symbol, _) in transitions.items():
+        all_symbols.add(read_symbol)
+        all_symbols.add(write_symbol)
+    used_states = _get_states(merged_transitions)
+    used_states.update(roots)
+    state_mapping = {state: renamed[state] for state in sorted(states) if renamed[state] in used_states}
+
+    optimized_definition = type(definition)(merged_transitions, definition.initial_state, stop_states, tape,
+                                            definition.tape_index, blank=definition.blank)
+    report = OptimizationReport(state_mapping, sorted(all_states - states), sorted(all_symbols - symbols),
+                                fused_count, (len(all_states), len(used_states)),
+                                (len(transitions), len(merged_transitions)))
+    return optimized_definition, report
+
+
+def find_reachable_symbols(production_rules, word_symbols, halting_symbol):
+    """Find the symbols that can occur in the word of a two tag system.
+    A symbol can occur if it is in the initial word or in the production of a symbol that can be read, i.e. of a
+    symbol that can occur and is not the halting symbol.
+    Arguments:
+        production_rules:   The production rules ({symbol: list of symbols})
+        word_symbols:       The symbols of the initial word
+        halting_symbol:     The halting symbol
+    Returns a set of symbols"""
+    symbols = set()
+    pending = list(word_symbols)
+    while pending:
+        symbol = pending.pop()
+        if symbol not in symbols:
+            symbols.add(symbol)
+            if symbol != halting_symbol:
+                pending.extend(production_rules.get(symbol, ()))
+    return symbols
+
+
+def merge_equivalent_symbols(production_rules, symbols, fixed_symbols):
+    """Merge the symbols of a two tag system whose productions are equivalent.
+    Two symbols are equivalent if their productions have the same length and equivalent symbols at every position,
+    so a word can be read with either of them. The equivalence classes are found by partition refinement, starting
+    with one class for each production length, and one class for each fixed symbol and each symbol without a
+    production rule. Each class is represented by its smallest symbol.
+    Arguments:
+        production_rules:   The production rules ({symbol: list of symbols})
+        symbols:            The symbols that can occur, including every symbol of their productions
+        fixed_symbols:      Symbols that must not be merged, e.g. the halting symbol
+    Returns a tuple (new production rules, mapping of every symbol to the symbol that represents it)"""
+    classes = {symbol: ("fixed", symbol) if symbol in fixed_symbols or symbol not in production_rules
+               else len(production_rules[symbol]) for symbol in symbols}
+    class_count = len(set(classes.values()))
+    while True:
+        signatures = {symbol: (classes[symbol], tuple(classes[target] for target in production_rules.get(symbol, ())))
+                      for symbol in symbols}
+        signature_ids = {}
+        classes = {symbol: signature_ids.setdefault(signature, len(signature_ids))
+                   for symbol, signature in signatures.items()}
+        if len(signature_ids) == class_count:
+            break
+        class_count = len(signature_ids)
+
+    representatives = {}
+    for symbol in sorted(symbols):
+        representatives.setdefault(classes[symbol], symbol)
+    renamed = {symbol: representatives[classes[symbol]] for symbol in symbols}
+
+    merged_rules = {symbol: [renamed[target] for target in production]
+                    for symbol, production in production_rules.items()
+                    if symbol in symbols and renamed[symbol] == symbol}
+    return merged_rules, renamed
+
+
+class RuleOptimizationReport:
+    """Summary of an optimization pass over the production rules of a two tag system (see
+    optimize_production_rules()). Symbols are renamed to the representative of their equivalence class, which
+    symbol_mapping translates, e.g. to compare the words of the original and the optimized system.
+
+    Attributes:
+        symbol_mapping:     Maps every original symbol that can still occur to the symbol that replaces it (dict)
+        removed_symbols:    The original symbols that can never occur in the word (sorted list)
+        symbols:            The number of symbols before and after the optimization (tuple)
+        production_rules:   The number of production rules before and after the optimization (tuple)
+        """
+
+    def __init__(self, symbol_mapping, removed_symbols, symbols, production_rules):
+        self.symbol_mapping = symbol_mapping
+        self.removed_symbols = removed_symbols
+        self.symbols = symbols
+        self.production_rules = production_rules
+
+    def __repr__(self):
+        return "{name}(symbols={symbols[0]}->{symbols[1]}, production_rules={rules[0]}->{rules[1]})".format(
+            name=type(self).__name__, symbols=self.symbols, rules=self.production_rules)
+
+
+def optimize_production_rules(production_rules, word_symbols, halting_symbol, fixed_symbols=()):
+    """Optimize the production rules of a two tag system, e.g. before encoding it for a UTM, where every symbol
+    lengthens the unary encodings of the others. The pass
+        1. removes the symbols that can never occur in the word and the rules that are never applied, including a
+            rule for the halting symbol (see find_reachable_symbols()),
+        2. merges equivalent symbols (see merge_equivalent_symbols()).
+    The optimized system takes the same steps on the renamed word and halts on the same halting symbol.
+    Arguments:
+        production_rules:   The production rules ({symbol: list of symbols})
+        word_symbols:       The symbols the word may contain when the system is started
+        halting_symbol:     The halting symbol, which is never renamed
+        fixed_symbols:      Further symbols that must not be renamed
+    Returns a tuple (optimized production rules, RuleOptimizationReport)"""
+    symbols = find_reachable_symbols(production_rules, word_symbols, halting_symbol)
+    reachable_rules = {symbol: production for symbol, production in production_rules.items()
+                       if symbol in symbols and symbol != halting_symbol}
+    fixed_symbols = set(fixed_symbols)
+    fixed_symbols.add(halting_symbol)
+    merged_rules, renamed = merge_equivalent_symbols(reachable_rules, symbols, fixed_symbols)
+
+    all_symbols = set(production_rules)
+    for production in production_rules.values():
+        all_symbols.update(production)
+    all_symbols.update(word_symbols)
+    all_symbols.add(halting_symbol)
+    symbol_mapping = {symbol: renamed[symbol] for symbol in sorted(symbols)}
+    report = RuleOptimizationReport(symbol_mapping, sorted(all_symbols - symbols),
+                                    (len(all_symbols), len(set(renamed.values()))),
+                                    (len(production_rules), len(merged_rules)))
+    return merged_rules, report
@@ -0,0 +1,216 @@
+import json
+import sys
+
+from .compiled_table import HALTED, LIMIT, GROW, UNDEFINED, grow_cells
+
+_UNLIMITED = sys.maxsize
+
+
+class TransitionProfile:
+    """Profile of a Turing machine run (see TuringMachine.run_profiled()).
+
+    Attributes:
+        transition_hits:    The number of times each transition has been taken (dict of (state, symbol): hits),
+                                only transitions that have been taken at least once
+        transitions:        The transition function, to show what the counted transitions do (see TuringDefinition)
+        head_positions:     Histogram of the head position of every step, relative to the first cell of the initial
+                                tape (dict of position: steps)
+        sweep_lengths:      Histogram of the number of consecutive moves in the same direction (dict of
+                                length: sweeps). Steps that do not move the head do not interrupt a sweep.
+        steps:              The number of steps taken during the run
+        elapsed:            The wall time of the run in seconds. The instrumented loop is considerably slower than
+                                run_silent(), so steps_per_second only compares profiled runs with each other.
+        """
+
+    def __init__(self, transition_hits, transitions, head_positions, sweep_lengths, steps, elapsed):
+        self.transition_hits = transition_hits
+        self.transitions = transitions
+        self.head_positions = head_positions
+        self.sweep_lengths = sweep_lengths
+        self.steps = steps
+        self.elapsed = elapsed
+
+    @property
+    def steps_per_second(self):
+        """The number of steps per second of wall time"""
+        return self.steps / self.elapsed if self.elapsed > 0 else 0.0
+
+    def get_top_transitions(self, count=None):
+        """Return the most frequent transitions as a list of ((state, symbol), hits), most frequent first"""
+        ranked = sorted(self.transition_hits.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if count is None else ranked[:count]
+
+    def get_mean_sweep_length(self):
+        """Return the mean number of consecutive moves in the same direction"""
+        sweeps = sum(self.sweep_lengths.values())
+        if sweeps == 0:
+            return 0.0
+        return sum(length * count for length, count in self.sweep_lengths.items()) / sweeps
+
+    def to_dict(self):
+        """Return the profile in a JSON-serializable form"""
+        transitions = []
+        for (state, symbol), hits in self.get_top_transitions():
+            target_state, write_symbol, direction = self.transitions[(state, symbol)]
+            transitions.append({"state": state, "symbol": symbol, "target_state": target_state,
+                                "write_symbol": write_symbol, "direction": direction, "hits": hits})
+        return {
+            "steps": self.steps,
+            "elapsed": self.elapsed,
+            "steps_per_second": self.steps_per_second,
+            "transitions": transitions,
+            "head_positions": [[position, count] for position, count in sorted(self.head_positions.items())],
+            "sweep_lengths": [[length, count] for length, count in sorted(self.sweep_lengths.items())],
+        }
+
+    def save_json(self, path):
+        """Write the profile to a JSON file (see to_dict())"""
+        with open(path, "w") as fid:
+            json.dump(self.to_dict(), fid, indent=1)
+
+    def get_report(self, top=10):
+        """Return a human-readable report of the profile (string).
+        Arguments:
+            top:    The number of transitions to show"""
+        lines = ["steps: {steps}, elapsed: {elapsed:.3f}s, steps/s: {rate:.0f}".format(
+            steps=self.steps, elapsed=self.elapsed, rate=self.steps_per_second)]
+        lines.append("transitions taken: {used} of {total}".format(used=len(self.transition_hits),
+                                                                   total=len(self.transitions)))
+        for (state, symbol), hits in self.get_top_transitions(top):
+            target_state, write_symbol, direction = self.transitions[(state, symbol)]
+            line = "   {share:6.2f}% {hits:>12}  ({state}, {symbol!r}) -> ({target}, {write!r}, {direction})"
+            lines.append(line.format(
+                share=100 * hits / max(self.steps, 1), hits=hits, state=state, symbol=symbol, target=target_state,
+                write=write_symbol, direction=direction))
+        if self.head_positions:
+            lines.append("head positions: {lo} to {hi}, {cells} cells visited".format(
+                lo=min(self.head_positions), hi=max(self.head_positions), cells=len(self.head_positions)))
+        if self.sweep_lengths:
+            lines.append("sweeps: {count}, mean length: {mean:.1f}, longest: {longest}".format(
+                count=sum(self.sweep_lengths.values()), mean=self.get_mean_sweep_length(),
+                longest=max(self.sweep_lengths)))
+        return "\n".join(lines)
+
+    def print_report(self, top=10):
+        """Print the report of get_report()"""
+        print(self.get_report(top))
+
+
+class TransitionProfiler:
+    """Instrumented counterpart of CompiledTransitionTable.kernel(). It counts the transitions, head positions and
+    sweep lengths of a run on a compiled transition table. This is a separate loop, so runs that are not profiled
+    do not pay for the counting.
+
+    Attributes:
+        table:  The CompiledTransitionTable being profiled
+        """
+
+    def __init__(self, table):
+        self.table = table
+        self._hits = [0] * len(table.table)
+        self._visits = []
+        self._origin = 0
+        self._sweep_lengths = {}
+        self._sweep_direction = 0
+        self._sweep_length = 0
+
+    def kernel(self, cells, pos, lo, hi, state, limit):
+        """Same as CompiledTransitionTable.kernel(), but counts every step"""
+        table = self.table.table
+        stop_bitmap = self.table.stop_bitmap
+        num_symbols = self.table.num_symbols
+        symbol_mask = (1 << self.table.symbol_bits) - 1
+        state_shift = self.table.symbol_bits + 2
+        size = len(cells)
+        hits = self._hits
+        visits = self._visits
+        sweep_lengths = self._sweep_lengths
+        sweep_direction = self._sweep_direction
+        sweep_length = self._sweep_length
+
+        status = LIMIT
+        steps = 0
+        while steps < limit:
+            if stop_bitmap[state]:
+                status = HALTED
+                break
+            index = state * num_symbols + cells[pos]
+            entry = table[index]
+            if entry < 0:
+                status = UNDEFINED
+                break
+            hits[index] += 1
+            visits[pos] += 1
+            cells[pos] = (entry >> 2) & symbol_mask
+            direction = (entry & 3) - 1
+            state = entry >> state_shift
+            steps += 1
+
+            if direction:
+                if direction == sweep_direction:
+                    sweep_length += 1
+                else:
+                    if sweep_length:
+                        sweep_lengths[sweep_length] = sweep_lengths.get(sweep_length, 0) + 1
+                    sweep_direction = direction
+                    sweep_length = 1
+                pos += direction
+
+            if pos < lo:
+                lo = pos
+                if pos < 0:
+                    status = GROW
+                    break
+            elif pos >= hi:
+                hi = pos + 1
+                if pos == size:
+                    status = GROW
+                    break
+
+        if status == LIMIT and stop_bitmap[state]:
+            status = HALTED
+        self._sweep_direction = sweep_direction
+        self._sweep_length = sweep_length
+        return status, pos, lo, hi, state, steps
+
+    def execute(self, cells, pos, lo, hi, state, max_steps=None):
+        """Same as compiled_table.execute() with kernel()"""
+        if len(self._visits) < len(cells):
+            self._visits.extend([0] * (len(cells) - len(self._visits)))
+        steps = 0
+        total_shift = 0
+        while True:
+            limit = _UNLIMITED if max_steps is None else max_steps - steps
+            status, pos, lo, hi, state, taken = self.kernel(cells, pos, lo, hi, state, limit)
+            steps += taken
+            if status != GROW:
+                return status, cells, pos, lo, hi, state, steps, total_shift
+            size = len(cells)
+            cells, shift = grow_cells(cells, pos)
+            padding = len(cells) - size
+            if shift:
+                self._visits = [0] * padding + self._visits
+                self._origin += shift
+            else:
+                self._visits.extend([0] * padding)
+            pos += shift
+            lo += shift
+            hi += shift
+            total_shift += shift
+
+    def get_profile(self, transitions, elapsed):
+        """Return the counts collected so far as a TransitionProfile.
+        Arguments:
+            transitions:    The transition function of the profiled machine
+            elapsed:        The wall time of the profiled run in seconds"""
+        states = self.table.states
+        symbols = self.table.symbols
+        num_symbols = self.table.num_symbols
+        transition_hits = {(states[index // num_symbols], symbols[index % num_symbols]): hits
+                           for index, hits in enumerate(self._hits) if hits}
+        head_positions = {position - self._origin: count for position, count in enumerate(self._visits) if count}
+        sweep_lengths = dict(self._sweep_lengths)
+        if self._sweep_length:
+            sweep_lengths[self._sweep_length] = sweep_lengths.get(self._sweep_length, 0) + 1
+        return TransitionProfile(transition_hits, transitions, head_positions, sweep_lengths,
+                                 sum(self._hits), elapsed)
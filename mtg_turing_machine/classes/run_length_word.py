@@ -0,0 +1,155 @@
+from collections import deque
+from itertools import chain, groupby, repeat, zip_longest
+
+# fill value for the missing second symbol of a word with an odd number of symbols
+_NO_SYMBOL = object()
+
+
+def get_primitive_block(block):
+    """Split a block of symbols into its shortest repeating part.
+    Returns a tuple (part, repetitions), e.g. (('a', 'x'), 3) for the block ('a', 'x', 'a', 'x', 'a', 'x')"""
+    length = len(block)
+    for period in range(1, length // 2 + 1):
+        if length % period == 0 and block[:period] * (length // period) == block:
+            return block[:period], length // period
+    return block, 1
+
+
+class RunLengthWord:
+    """Run-length encoded word of a two tag system.
+    The word is a queue of [block, count] runs, each standing for 'count' repetitions of a tuple of symbols. Blocks
+    are reduced to their shortest repeating part, and a run that is appended right behind a run of the same block
+    is merged into it, so e.g. the unary 'a x' and 'b x' parts of the word of a two tag system that has been
+    converted from a Turing machine (see TwoTagSystem.convert_tm_to_two_tag_system()) stay a single run each.
+    Counts may be arbitrarily large integers, so a word can be far longer than anything that fits into memory.
+    Like a deque, the word supports popleft(), extend() and reading symbols near its front.
+
+    Attributes:
+        runs:   The runs, first run first (deque of [block, count])
+        length: The number of symbols of the word (int). Unlike len(), it is not limited to sys.maxsize.
+        """
+
+    def __init__(self, symbols=()):
+        """
+        Arguments:
+            symbols:    The initial word (iterable of symbols)"""
+        self.runs = deque()
+        self.length = 0
+        # a two tag system reads every other symbol, so the word is split into pairs
+        symbols = iter(symbols)
+        for pair, repetitions in groupby(zip_longest(symbols, symbols, fillvalue=_NO_SYMBOL)):
+            if pair[1] is _NO_SYMBOL:
+                pair = pair[:1]
+            self._append_run(pair, len(list(repetitions)))
+
+    @classmethod
+    def from_runs(cls, runs):
+        """Construct a word from runs without expanding them.
+        Arguments:
+            runs:   The runs, first run first (iterable of (block, count), with a block being a tuple of symbols)"""
+        word = cls()
+        for block, count in runs:
+            word.append(block, count)
+        return word
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __iter__(self):
+        return chain.from_iterable(chain.from_iterable(repeat(block, count)) for block, count in self.runs)
+
+    def __repr__(self):
+        return "RunLengthWord.from_runs({runs})".format(runs=[tuple(run) for run in self.runs])
+
+    def __getitem__(self, index):
+        """Return the symbol at a position. The runs are walked from the front, so this is meant for positions near
+        the beginning of the word, e.g. the symbol that is read next."""
+        if index < 0:
+            index += self.length
+        if 0 <= index:
+            for block, count in self.runs:
+                run_length = len(block) * count
+                if index < run_length:
+                    return block[index % len(block)]
+                index -= run_length
+        raise IndexError("word index out of range")
+
+    def get_symbols(self):
+        """Return the set of symbols that occur in the word"""
+        symbols = set()
+        for block, _ in self.runs:
+            symbols.update(block)
+        return symbols
+
+    def popleft(self):
+        """Remove and return the first symbol of the word"""
+        symbol = self[0]
+        self.remove(1)
+        return symbol
+
+    def extend(self, symbols):
+        """Append symbols at the end of the word"""
+        self.append(tuple(symbols))
+
+    def append(self, block, count=1):
+        """Append 'count' repetitions of a block (tuple of symbols) at the end of the word.
+        A single repetition is appended pair by pair, so that its parts can be merged with the runs around them."""
+        if count == 1 and len(block) > 2:
+            for start in range(0, len(block), 2):
+                self._append_run(block[start:start + 2], 1)
+        elif block and count:
+            self._append_run(block, count)
+
+    def _append_run(self, block, count):
+        if len(block) > 1:
+            block, repetitions = get_primitive_block(block)
+            count *= repetitions
+        self.length += len(block) * count
+        runs = self.runs
+        if runs and runs[-1][0] == block:
+            runs[-1][1] += count
+        else:
+            runs.append([block, count])
+
+    def remove(self, length):
+        """Remove the first 'length' symbols of the word. The word must have at least that many symbols."""
+        assert length <= self.length
+        self.length -= length
+        runs = self.runs
+        while length:
+            run = runs[0]
+            block, count = run
+            block_length = len(block)
+            if block_length * count <= length:
+                runs.popleft()
+                length -= block_length * count
+                continue
+            repetitions, length = divmod(length, block_length)
+            count -= repetitions
+            run[1] = count
+            if length:
+                # the word now starts inside a repetition of the block: the rest of the run is a run of the rotated
+                # block, followed by the remainder of the last repetition
+                run[0] = block[length:]
+                run[1] = 1
+                if count > 1:
+                    runs.appendleft([block[length:] + block[:length], count - 1])
+                length = 0
+
+    def split_odd_run(self):
+        """Replace the first run, a run of a block with an odd number of symbols, by a run of the block's double,
+        followed by a single repetition of the block if the count is odd. A two tag system reads the double at the
+        same positions in every repetition (see TwoTagSystem.run_chained())."""
+        run = self.runs[0]
+        block, count = run
+        assert len(block) % 2 == 1 and count > 1
+        pairs, remainder = divmod(count, 2)
+        if remainder:
+            run[1] = 1
+            self.runs.appendleft([block * 2, pairs])
+        else:
+            run[0] = block * 2
+            run[1] = pairs
@@ -0,0 +1,49 @@
+# reasons for the end of a run
+HALTED = "halted"  # the machine has halted on its own
+MAX_STEPS = "max_steps"  # the step budget has been used up
+DEADLINE = "deadline"  # the time budget has been used up
+NON_HALTING = "non_halting"  # the machine has been proven to never halt (see cycle_detection)
+
+
+class RunResult:
+    """Result of a silent run (see e.g. TuringMachine.run_silent())
+
+    Attributes:
+        halted:     Flag whether the machine has halted
+        reason:     Why the run ended (HALTED, MAX_STEPS, DEADLINE or NON_HALTING)
+        steps:      The machine's total step count after the run
+        elapsed:    The wall time of the run in seconds
+        state:      The final state. For two tag systems, this is the first symbol of the word.
+        """
+
+    def __init__(self, halted, reason, steps, elapsed, state):
+        self.halted = halted
+        self.reason = reason
+        self.steps = steps
+        self.elapsed = elapsed
+        self.state = state
+
+    def __repr__(self):
+        return "{name}(halted={halted}, reason={reason!r}, steps={steps}, elapsed={elapsed:.3f}, " \
+               "state={state!r})".format(name=type(self).__name__, halted=self.halted, reason=self.reason,
+                                         steps=self.steps, elapsed=self.elapsed, state=self.state)
+
+
+class NonHalting(RunResult):
+    """Result of a silent run that has been stopped because the machine has entered a cycle it can never leave
+
+    Attributes:
+        period:     The number of steps after which the configuration repeats
+        shift:      The number of cells the configuration moves by per period (0 for exact repeats). For two tag
+                        systems, this is always 0.
+        """
+
+    def __init__(self, steps, elapsed, state, period, shift=0):
+        super().__init__(False, NON_HALTING, steps, elapsed, state)
+        self.period = period
+        self.shift = shift
+
+    def __repr__(self):
+        return "{name}(steps={steps}, elapsed={elapsed:.3f}, state={state!r}, period={period}, " \
+               "shift={shift})".format(name=type(self).__name__, steps=self.steps, elapsed=self.elapsed,
+                                       state=self.state, period=self.period, shift=self.shift)
@@ -0,0 +1,323 @@
+class Tape:
+    """Two-sided growable Turing tape, backed by a list of symbols.
+    The cells are kept in a buffer that has free space on both ends. The tape [0, len) starts at the buffer
+    position 'origin', so adding a cell on either side only moves the origin or the end. If the buffer runs out of
+    space, it is reallocated with (at least) doubled size, which makes growth amortized O(1) in both directions.
+    Tape indices are always relative to the current origin, i.e. growing the tape on the left shifts all indices
+    by one, exactly like prepending to a list.
+
+    Attributes:
+        blank:  The blank symbol used for growing the tape
+        """
+
+    def __init__(self, symbols=(), blank=" "):
+        """
+        Arguments:
+            symbols:    The initial tape content (iterable of symbols)
+            blank:      The blank symbol"""
+        self.blank = blank
+        self._cells = self._encode_all(symbols)
+        self._origin = 0
+        self._end = len(self._cells)
+
+    # -- cell encoding, overridden by subclasses that do not store the symbols themselves --
+
+    def _encode_all(self, symbols):
+        return list(symbols)
+
+    def _encode(self, symbol):
+        return symbol
+
+    def _decode_all(self, cells):
+        return list(cells)
+
+    def _empty_cells(self, count):
+        return [self.blank] * count
+
+    # -- sequence protocol --
+
+    def __len__(self):
+        return self._end - self._origin
+
+    def _buffer_index(self, index):
+        """Convert a tape index to a buffer index"""
+        length = self._end - self._origin
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("tape index out of range")
+        return self._origin + index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(len(self))
+            if stride > 0:
+                return self._decode_all(self._cells[self._origin + start:self._origin + max(start, stop):stride])
+            return self.to_list()[index]
+        return self._cells[self._buffer_index(index)]
+
+    def __setitem__(self, index, symbol):
+        self._cells[self._buffer_index(index)] = self._encode(symbol)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __reversed__(self):
+        return reversed(self.to_list())
+
+    def __eq__(self, other):
+        if isinstance(other, (Tape, list, tuple)):
+            return self.to_list() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{name}({symbols!r}, blank={blank!r})".format(name=type(self).__name__, symbols=self.to_list(),
+                                                             blank=self.blank)
+
+    def to_list(self):
+        """Return the tape content as a list of symbols"""
+        return self._decode_all(self._cells[self._origin:self._end])
+
+    def get_cells(self, start, end):
+        """Return the cells [start, end) without decoding them, i.e. as a list of symbols, or as a bytearray of
+        symbol ids for a ByteTape. Cells outside the tape are blank, so any window can be read."""
+        if end <= start:
+            return self._encode_all([])
+        inner_start = min(max(start, 0), len(self))
+        inner_end = max(min(end, len(self)), inner_start)
+        cells = self._cells[self._origin + inner_start:self._origin + inner_end]
+        if inner_start - start or end - inner_end:
+            blank = self._encode_all([self.blank])
+            cells = blank * (inner_start - start) + cells + blank * (end - inner_end)
+        return cells
+
+    # -- growth --
+
+    def _reserve(self, left, right):
+        """Make sure the buffer has at least the given number of free cells on each side.
+        Reallocates the buffer with doubled size if necessary."""
+        free_left = self._origin
+        free_right = len(self._cells) - self._end
+        if free_left >= left and free_right >= right:
+            return
+        padding = max(len(self), 16)
+        new_left = max(left, padding) if free_left < left else free_left
+        new_right = max(right, padding) if free_right < right else free_right
+        used = self._cells[self._origin:self._end]
+        self._cells = self._empty_cells(new_left) + used + self._empty_cells(new_right)
+        self._origin = new_left
+        self._end = new_left + len(used)
+
+    def prepend(self, symbol):
+        """Add a cell to the left end of the tape. All tape indices shift by one."""
+        if self._origin == 0:
+            self._reserve(1, 0)
+        self._origin -= 1
+        self._cells[self._origin] = self._encode(symbol)
+
+    def append(self, symbol):
+        """Add a cell to the right end of the tape"""
+        if self._end == len(self._cells):
+            self._reserve(0, 1)
+        self._cells[self._end] = self._encode(symbol)
+        self._end += 1
+
+    def grow_left(self):
+        """Add a blank cell to the left end of the tape. All tape indices shift by one."""
+        self.prepend(self.blank)
+
+    def grow_right(self):
+        """Add a blank cell to the right end of the tape"""
+        self.append(self.blank)
+
+
+class ByteTape(Tape):
+    """Two-sided growable Turing tape for alphabets of at most 256 symbols.
+    The tape stores one byte per cell in a bytearray instead of a reference to a symbol string. Symbols are
+    interned to ids in the order they are first seen, starting with the blank (id 0).
+
+    Attributes:
+        blank:      The blank symbol used for growing the tape
+        symbols:    Symbol names, indexed by symbol id (list)
+        symbol_ids: Lookup table from symbol name to symbol id (dict)
+        """
+
+    MAX_SYMBOLS = 256
+
+    def __init__(self, symbols=(), blank=" "):
+        self.symbols = []
+        self.symbol_ids = {}
+        self.intern(blank)
+        super().__init__(symbols, blank)
+
+    @classmethod
+    def from_cells(cls, cells, symbols, blank):
+        """Construct a tape directly from a buffer of symbol ids, without decoding each cell.
+        Arguments:
+            cells:      The tape content as symbol ids (bytearray)
+            symbols:    Symbol names, indexed by symbol id (list)
+            blank:      The blank symbol"""
+        tape = cls((), blank)
+        for symbol in symbols:
+            tape.intern(symbol)
+        assert tape.symbols[:len(symbols)] == list(symbols)
+        tape._cells = bytearray(cells)
+        tape._origin = 0
+        tape._end = len(tape._cells)
+        return tape
+
+    def intern(self, symbol):
+        """Return the id of a symbol, assigning a new one if the symbol has not been seen before"""
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            if symbol_id >= self.MAX_SYMBOLS:
+                raise OverflowError("ByteTape cannot store more than {} symbols".format(self.MAX_SYMBOLS))
+            self.symbols.append(symbol)
+            self.symbol_ids[symbol] = symbol_id
+        return symbol_id
+
+    def cells(self):
+        """Return a copy of the tape content as a bytearray of symbol ids"""
+        return self._cells[self._origin:self._end]
+
+    def _encode_all(self, symbols):
+        return bytearray(self.intern(symbol) for symbol in symbols)
+
+    def _encode(self, symbol):
+        return self.intern(symbol)
+
+    def _decode_all(self, cells):
+        symbols = self.symbols
+        return [symbols[cell] for cell in cells]
+
+    def _empty_cells(self, count):
+        return bytearray(count)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return super().__getitem__(index)
+        return self.symbols[self._cells[self._buffer_index(index)]]
+
+
+def make_tape(symbols=(), blank=" ", alphabet=()):
+    """Create the most compact tape for the given content.
+    Arguments:
+        symbols:    The initial tape content (iterable of symbols)
+        blank:      The blank symbol
+        alphabet:   All symbols that may be written to the tape later on
+    Returns a ByteTape if all symbols fit into a byte, and a list-backed Tape otherwise"""
+    symbols = list(symbols)
+    all_symbols = set(alphabet).union(symbols)
+    all_symbols.add(blank)
+    if len(all_symbols) <= ByteTape.MAX_SYMBOLS:
+        return ByteTape(symbols, blank)
+    return Tape(symbols, blank)
+
+
+class RunLengthTape:
+    """Run-length encoded Turing tape for chain stepping.
+    The tape is split into the head cell and two stacks of [symbol, count] runs, one on each side of the head.
+    The nearest run is the last element of each stack, so moving the head or sweeping it over a whole run only
+    touches the ends of the stacks. Cells beyond the stacks are blank.
+
+    Attributes:
+        head:       The symbol under the head
+        left:       Runs left of the head, nearest run last (list of [symbol, count])
+        right:      Runs right of the head, nearest run last (list of [symbol, count])
+        position:   The absolute head position (0 is the first cell of the tape this one was created from)
+        blank:      The blank symbol
+        """
+
+    def __init__(self, symbols, index, blank):
+        """
+        Arguments:
+            symbols:    The tape content (iterable of symbols)
+            index:      The head position
+            blank:      The blank symbol"""
+        symbols = list(symbols)
+        self.blank = blank
+        self.left = []
+        self.right = []
+        for symbol in symbols[:index]:
+            self._push(self.left, symbol, 1)
+        for symbol in reversed(symbols[index + 1:]):
+            self._push(self.right, symbol, 1)
+        self.head = symbols[index] if index < len(symbols) else blank
+        self.position = index
+
+    @staticmethod
+    def _push(stack, symbol, count):
+        """Push cells onto a stack of runs, merging them with the nearest run if possible"""
+        if stack and stack[-1][0] == symbol:
+            stack[-1][1] += count
+        else:
+            stack.append([symbol, count])
+
+    def _pop(self, stack):
+        """Take the nearest cell from a stack of runs. Returns a blank if the stack is empty."""
+        if not stack:
+            return self.blank
+        run = stack[-1]
+        run[1] -= 1
+        if run[1] == 0:
+            stack.pop()
+        return run[0]
+
+    def move(self, direction):
+        """Move the head by a single cell (direction -1, 0 or 1)"""
+        if direction > 0:
+            self._push(self.left, self.head, 1)
+            self.head = self._pop(self.right)
+        elif direction < 0:
+            self._push(self.right, self.head, 1)
+            self.head = self._pop(self.left)
+        self.position += direction
+
+    def run_length(self, direction):
+        """Return the number of cells next to the head (in the given direction) that hold the head's symbol.
+        Returns None if the run is infinite, i.e. the head is on a blank and only blanks follow."""
+        stack = self.right if direction > 0 else self.left
+        if self.head == self.blank and (not stack or (len(stack) == 1 and stack[0][0] == self.blank)):
+            return None
+        if stack and stack[-1][0] == self.head:
+            return stack[-1][1]
+        return 0
+
+    def sweep(self, direction, write_symbol, count):
+        """Write a symbol to the head cell and the 'count' following cells of the head's run, and move the head
+        past them, in one operation. The caller has to make sure that all these cells hold the head's symbol.
+        Cells beyond the end of the stack count as blanks, so a blank head may sweep past the end of the stack.
+        Arguments:
+            direction:      -1 (left) or 1 (right)
+            write_symbol:   The symbol to write
+            count:          The number of cells to sweep in addition to the head cell"""
+        ahead, behind = (self.right, self.left) if direction > 0 else (self.left, self.right)
+        if count and ahead:
+            run = ahead[-1]
+            if run[1] > count:
+                run[1] -= count
+            else:
+                ahead.pop()
+        self._push(behind, write_symbol, count + 1)
+        self.head = self._pop(ahead)
+        self.position += direction * (count + 1)
+
+    def to_list(self, lo, hi):
+        """Return the cells of the absolute region [lo, hi) as a list"""
+        left_cells = []
+        for symbol, count in self.left:
+            left_cells += [symbol] * count
+        right_cells = []
+        for symbol, count in reversed(self.right):
+            right_cells += [symbol] * count
+
+        start = self.position - len(left_cells)
+        cells = left_cells + [self.head] + right_cells
+        if start > lo:
+            cells = [self.blank] * (start - lo) + cells
+            start = lo
+        cells = cells[lo - start:hi - start]
+        return cells + [self.blank] * (hi - lo - len(cells))
@@ -0,0 +1,146 @@
+import gzip
+import itertools
+import lzma
+
+# compression formats by file extension
+_COMPRESSION_BY_EXTENSION = {
+    ".gz": "gzip",
+    ".xz": "lzma",
+    ".lzma": "lzma",
+}
+
+
+def _open_trace_file(path, compression, buffer_size):
+    """Open a trace file for writing text, optionally compressed ("gzip" or "lzma")"""
+    if compression == "gzip":
+        return gzip.open(path, "wt", compresslevel=6)
+    if compression == "lzma":
+        return lzma.open(path, "wt")
+    assert compression is None, "unknown compression: {}".format(compression)
+    return open(path, "w", buffering=buffer_size)
+
+
+class TraceWriter:
+    """Execution trace of a simulation, written to a (compressed) text file.
+    The trace is sampled: a record is written every 'every' steps and/or whenever the state changes. Each record
+    only shows a window of cells around the head, so its cost does not depend on the length of the tape. Records
+    are collected in a buffer and written in large blocks.
+    Every record is a line of the form
+        <steps> <state>: <cells left of the head> [<head cell>] <cells right of the head>
+    All engines accept a TraceWriter, see e.g. TuringMachine.run_silent().
+
+    Attributes:
+        path:               The trace file
+        every:              Record every this many steps
+        on_state_change:    Record whenever the state changes (for two tag systems: the first symbol of the word).
+                                The engines can only check the state between two calls of their inner loop, so
+                                this makes them take a single step per call (see chunk_size), which costs a
+                                multiple of the untraced run time. Prefer 'every' for long runs.
+        window:             The number of cells shown on each side of the head
+        records:            The number of records written so far
+        """
+
+    def __init__(self, path, every=None, on_state_change=False, window=8, compression=None, buffer_size=1 << 16):
+        """
+        Arguments:
+            path:               The trace file
+            every:              Record every this many steps. If neither every nor on_state_change is set, every
+                                    step is recorded.
+            on_state_change:    Record whenever the state changes
+            window:             The number of cells shown on each side of the head
+            compression:        "gzip", "lzma" or None. Inferred from the file extension (.gz, .xz, .lzma) if
+                                    not set.
+            buffer_size:        The number of characters collected before they are written"""
+        if every is None and not on_state_change:
+            every = 1
+        if compression is None:
+            for extension, extension_compression in _COMPRESSION_BY_EXTENSION.items():
+                if path.endswith(extension):
+                    compression = extension_compression
+        self.path = path
+        self.every = every
+        self.on_state_change = on_state_change
+        self.window = window
+        self.records = 0
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._buffered = 0
+        self._next_sample = 0
+        self._last_state = None
+        self._last_cells = None
+        self._last_rendered_cells = None
+        self._fid = _open_trace_file(path, compression, buffer_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def chunk_size(self):
+        """The number of steps an engine may take between two calls of due(). A state change can happen at any
+        step, so it is 1 if on_state_change is set."""
+        if self.on_state_change:
+            return 1
+        return self.every
+
+    def due(self, steps, state):
+        """Check whether a record is due at the given step count and state"""
+        if self.every is not None and steps >= self._next_sample:
+            return True
+        return self.on_state_change and state != self._last_state
+
+    def record(self, steps, state, cells, head):
+        """Write a record.
+        Arguments:
+            steps:  The step count
+            state:  The current state
+            cells:  The window of cells around the head (sequence of symbols)
+            head:   The position of the head within cells"""
+        self._last_state = state
+        if self.every is not None:
+            self._next_sample = steps - steps % self.every + self.every
+
+        # the rendered cells are reused as long as the window does not change, e.g. while the machine
+        # only changes its state
+        cells = tuple(cells)
+        if cells != self._last_cells or head != self._last_rendered_cells[0]:
+            rendered = [str(symbol) for symbol in cells]
+            if head < len(rendered):
+                rendered[head] = "[" + rendered[head] + "]"
+            self._last_cells = cells
+            self._last_rendered_cells = (head, " ".join(rendered))
+        line = "{steps} {state}: {cells}\n".format(steps=steps, state=state, cells=self._last_rendered_cells[1])
+
+        self._buffer.append(line)
+        self._buffered += len(line)
+        self.records += 1
+        if self._buffered >= self._buffer_size:
+            self.flush()
+
+    def record_tape(self, steps, state, tape, index):
+        """Write a record of a tape (any iterable of symbols, e.g. a list or a deque), showing the window around the
+        head position 'index'"""
+        start = max(index - self.window, 0)
+        self.record(steps, state, itertools.islice(tape, start, index + self.window + 1), index - start)
+
+    def record_cells(self, steps, state, cells, pos, lo, hi, symbols):
+        """Write a record of a tape given as symbol ids (see CompiledTransitionTable), restricted to [lo, hi)"""
+        start = max(pos - self.window, lo)
+        end = min(pos + self.window + 1, hi)
+        self.record(steps, state, [symbols[cell] for cell in cells[start:end]], pos - start)
+
+    def flush(self):
+        """Write the buffered records to the file"""
+        if self._buffer:
+            self._fid.write("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        """Write the remaining records and close the file"""
+        if self._fid is not None:
+            self.flush()
+            self._fid.close()
+            self._fid = None
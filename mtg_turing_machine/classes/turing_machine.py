@@ -1,27 +1,54 @@
+import array
 import sys
 import re
 import math
+import time
+from operator import itemgetter
+
+from .binary_format import StringTable, DefinitionFile, write_definition_file, get_bit_width, pack_bits, \
+    unpack_bits, encode_directions, decode_directions, gc_paused
+from .checkpoint import CheckpointWriter, pack_ids, encode_symbols, decode_symbols, read_checkpoint, \
+    write_checkpoint
+from .compiled_table import CompiledTransitionTable, execute, UNDEFINED, LIMIT
+from .cycle_detection import TuringCycleDetector
+from .kernel_generator import get_kernel
+from .optimizer import merge_equivalent_states, optimize_definition
+from .profiler import TransitionProfiler
+from .tape import Tape, ByteTape, RunLengthTape, make_tape
+from .run_result import RunResult, NonHalting, HALTED, MAX_STEPS, DEADLINE
+
+# number of steps between two deadline checks, if no progress interval is set
+_DEADLINE_CHECK_STEPS = 1 << 16
+# number of steps between two cycle checks, if no progress interval is set
+_CYCLE_CHECK_STEPS = 1 << 12
 
 
 def _strip_list(input_list, item):
     """Strip all occurrences of an item from the beginning and end of a list"""
-    while True:
-        if input_list:
-            if input_list[0] == item:
-                input_list = input_list[1:]
-            else:
-                break
-        else:
-            break
-    while True:
-        if input_list:
-            if input_list[-1] == item:
-                input_list = input_list[0:-1]
-            else:
-                break
-        else:
-            break
-    return input_list
+    start = 0
+    end = len(input_list)
+    while start < end and input_list[start] == item:
+        start += 1
+    while end > start and input_list[end - 1] == item:
+        end -= 1
+    return input_list[start:end]
+
+
+def parse_tape_string(string, blank):
+    """Convert a tape string to a list of symbols and a head position.
+    Arguments:
+        string: The tape in the form of a string. May contain a caret (^) that indicates the head position.
+                    The head will be right to the caret. An empty tape consists of a single blank.
+        blank:  The blank symbol
+    Returns a tuple (tape, tape_index)"""
+    if "^" in string:
+        tape_index = string.find("^")
+        if string == "^":
+            return [blank], tape_index
+        return list(string.replace("^", "")), tape_index
+    if string:
+        return list(string), 0
+    return [blank], 0
 
 
 def _to_binary(number, bit_depth):
@@ -32,6 +59,51 @@ def _to_binary(number, bit_depth):
     return binary
 
 
+class TransitionFunction(dict):
+    """Transition function of a Turing machine (see TuringDefinition), a dict that counts how often it has been
+    changed. Compiled forms of the function (see TuringMachine.compile()) use the count to notice changes, including
+    transitions that are replaced in place.
+
+    Attributes:
+        version:    The number of changes so far
+        """
+
+    # a class attribute, so that unpickling (which sets the items before the attributes) can count changes
+    version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key, default=None):
+        self.version += 1
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+
 class TuringDefinition:
     """Definition of a Turing Machine"""
 
@@ -43,7 +115,7 @@ class TuringDefinition:
                                     head_direction can be '<', '-', '>'
             initial_state:      The Turing machine's initial state (string)
             stop_states:        A list of states to halt the machine when reached (list of string)
-            tape:               A pre-filled Turing tape (list of strings or single string)
+            tape:               A pre-filled Turing tape (list of strings, single string or Tape)
                                     list input supports multiple character symbols
                                     string input requires single-character symbols
             tape_index:         The head position where the Turing machine should start
@@ -52,17 +124,54 @@ class TuringDefinition:
         self.transitions = transitions
         self.initial_state = initial_state
         self.stop_states = stop_states
+        self._tape = None
+        self.blank = blank
         if tape:
-            self.tape = list(tape)
+            self.tape = tape
         else:
             self.tape = [blank]
         self.tape_index = tape_index
-        self.blank = blank
 
         # store length of the longest symbol (for multi-character symbols), for output formatting
-        alphabet = [symbol for _, symbol in transitions.keys()]
-        alphabet_lengths = [len(a) for a in alphabet]
-        self.max_symbol_length = max(alphabet_lengths)
+        alphabet = set(map(itemgetter(1), transitions.keys()))
+        self.max_symbol_length = max(map(len, alphabet))
+
+    @property
+    def transitions(self):
+        """The transition function (TransitionFunction). Assigning any other mapping copies it."""
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, transitions):
+        if not isinstance(transitions, TransitionFunction):
+            transitions = TransitionFunction(transitions)
+        self._transitions = transitions
+
+    @property
+    def tape(self):
+        """The Turing tape (Tape). Assigning a list or string replaces the tape with the most compact Tape
+        implementation for the machine's alphabet, assigning a Tape instance uses it as is."""
+        return self._tape
+
+    @tape.setter
+    def tape(self, symbols):
+        if isinstance(symbols, Tape):
+            symbols.blank = self._blank
+            self._tape = symbols
+        else:
+            alphabet = set(map(itemgetter(1), self.transitions.values()))
+            self._tape = make_tape(symbols, self._blank, alphabet)
+
+    @property
+    def blank(self):
+        """The blank symbol. Changing it also changes the symbol the tape grows with."""
+        return self._blank
+
+    @blank.setter
+    def blank(self, blank):
+        self._blank = blank
+        if self._tape is not None:
+            self._tape.blank = blank
 
 
 class TuringMachine:
@@ -93,6 +202,8 @@ class TuringMachine:
         self.binarized_bit_depth = None
         self.binarized_symbol_lookup = None
         self.pre_binarize_blank = None
+        self._compiled_table = None
+        self._compiled_key = None
 
         if isinstance(definition, TuringDefinition):
             self.definition = definition
@@ -110,8 +221,8 @@ class TuringMachine:
     def sanity_check(self):
         """Run some checks on the machine"""
         assert 0 <= self.definition.tape_index < len(self.definition.tape)
-        for (_, _), (_, _, head_dir) in self.definition.transitions.items():
-            assert head_dir in ["<", "-", ">"]
+        head_dirs = set(map(itemgetter(2), self.definition.transitions.values()))
+        assert head_dirs.issubset(["<", "-", ">"])
 
     @staticmethod
     def read_definition_from_path(path):
@@ -159,13 +270,34 @@ class TuringMachine:
         definition = TuringDefinition(transitions, initial_state, stop_states)
         return definition
 
-    def convert_to_two_symbol(self):
+    def optimize(self, input_alphabet=None):
+        """Optimize the machine in place, e.g. before converting it to a binary Turing machine or a tag system:
+        remove unreachable states and symbols, merge equivalent states and fuse transitions that do not move the
+        head with the transition that follows them (see optimizer.optimize_definition()). The machine computes the
+        same tapes, in the same number of steps or fewer. Symbols are not renamed, so tapes need no decoding.
+        Arguments:
+            input_alphabet: The symbols the tape may contain when the machine is started. Defaults to the symbols
+                                of the current tape, so set this if the tape will be replaced.
+        Returns an OptimizationReport, which maps the original states to the new ones"""
+        assert not self.has_been_binarized, "optimize the machine before binarizing it"
+        optimized, report = optimize_definition(self.definition, input_alphabet, self.current_state)
+
+        # the tape is kept as is
+        self.definition.transitions = optimized.transitions
+        self.definition.stop_states = optimized.stop_states
+        self.current_state = report.state_mapping.get(self.current_state, self.current_state)
+        return report
+
+    def convert_to_two_symbol(self, optimized=False):
         """Convert the Turing machine to a binary Turing machine with only two symbols.
         This is done by encoding each symbol in binary using a fixed-width encoding.
         This is necessary as the resulting TM will not be able to distinguish between a meaningful blank
         and one of the infinite blanks at the start and end of the tape. So instead, each transition of
         the original TM will be converted to a set of transitions that reads and writes one
-        fixed-length encoded block and then moves the head to the next or previous block."""
+        fixed-length encoded block and then moves the head to the next or previous block.
+        Arguments:
+            optimized:  Use the state-sharing encoding (see _get_optimized_binary_transitions()), which results in
+                            fewer states and fewer steps. The tape encoding is the same for both."""
         # collect all symbols in the transitions (left and right side)
         alphabet = [symbol for _, symbol in self.definition.transitions.keys()]
         alphabet += [symbol for _, symbol, _ in self.definition.transitions.values()]
@@ -181,6 +313,41 @@ class TuringMachine:
         alphabet_size = len(alphabet)
         bit_depth = int(math.ceil(math.log(alphabet_size)/math.log(2)))
 
+        if optimized:
+            new_transitions, new_stop_states = self._get_optimized_binary_transitions(alphabet, bit_depth)
+        else:
+            new_transitions, new_stop_states = self._get_binary_transitions(alphabet, bit_depth)
+
+        # encode the tape to binary
+        new_tape = ""
+        for symbol in self.definition.tape:
+            new_tape += _to_binary(symbol_to_idx_lookup[symbol], bit_depth)
+        new_tape = list(new_tape)
+        tape_index = self.definition.tape_index * bit_depth
+
+        # overwrite members, the old definition will be lost
+        self.has_been_binarized = True
+        self.binarized_bit_depth = bit_depth
+        self.binarized_symbol_lookup = alphabet
+        self.pre_binarize_blank = self.definition.blank
+
+        self.definition.transitions = new_transitions
+        self.definition.stop_states = new_stop_states
+        self.definition.tape_index = tape_index
+        self.definition.tape = new_tape
+        self.definition.blank = "0"
+        self.definition.initial_state = self.definition.initial_state + "_" + str(0)
+        self.current_state = self.definition.initial_state
+
+    def _get_binary_transitions(self, alphabet, bit_depth):
+        """Return the transitions and stop states of the binary Turing machine (see convert_to_two_symbol()).
+        Every transition of the original machine gets its own chain of states that backtracks to the beginning of
+        the symbol's block, writes the new symbol, backtracks again and moves the head by a whole block.
+        Arguments:
+            alphabet:   The original machine's alphabet, the blank first (list)
+            bit_depth:  The number of bits per symbol
+        Returns a tuple (transitions, stop states)"""
+        symbol_to_idx_lookup = {symbol: i for i, symbol in enumerate(alphabet)}
         new_transitions = {}
         new_stop_states = []
 
@@ -275,44 +442,111 @@ class TuringMachine:
                     new_transitions[(binary_source_state, "0")] = (binary_target_state, "0", direction)
                     new_transitions[(binary_source_state, "1")] = (binary_target_state, "1", direction)
 
-        # encode the tape to binary
-        new_tape = ""
-        for symbol in self.definition.tape:
-            new_tape += _to_binary(symbol_to_idx_lookup[symbol], bit_depth)
-        new_tape = list(new_tape)
-        tape_index = self.definition.tape_index * bit_depth
-
-        # overwrite members, the old definition will be lost
-        self.has_been_binarized = True
-        self.binarized_bit_depth = bit_depth
-        self.binarized_symbol_lookup = alphabet
-        self.pre_binarize_blank = self.definition.blank
+        return new_transitions, new_stop_states
+
+    def _get_optimized_binary_transitions(self, alphabet, bit_depth):
+        """Return the transitions and stop states of the optimized binary Turing machine (see convert_to_two_symbol()).
+        Each original state reads its symbol's block from left to right in a binary tree of states. The transition
+        that reads the last bit already knows the original transition: it writes the new last bit and the head
+        returns to the first bit that changes, writing the new bits on the way, and then moves on to the target
+        block. Bits that do not change are not revisited, so a transition that keeps the symbol and moves right
+        takes only bit_depth steps, and '-' only returns to the beginning of the block instead of sweeping.
+        The states after the read tree only depend on the remaining head path, the bits to write and the target
+        state, so they are shared between all transitions. Finally, equivalent states are merged.
+        Arguments:
+            alphabet:   The original machine's alphabet, the blank first (list)
+            bit_depth:  The number of bits per symbol
+        Returns a tuple (transitions, stop states)"""
+        definition = self.definition
+        transitions = definition.transitions
+        stop_states = set(definition.stop_states)
+        symbol_bits = {symbol: _to_binary(i, bit_depth) for i, symbol in enumerate(alphabet)}
+        new_transitions = {}
 
-        self.definition.transitions = new_transitions
-        self.definition.stop_states = new_stop_states
-        self.definition.tape_index = tape_index
-        self.definition.tape = new_tape
-        self.definition.blank = "0"
-        self.definition.initial_state = self.definition.initial_state + "_" + str(0)
-        self.current_state = self.definition.initial_state
+        def add_chain(path, target_state):
+            """Add the shared states that follow a head path of (write bit or None, direction) pairs, writing the
+            bits and keeping the cells that are None, then enter target_state. Returns the first state."""
+            state = target_state + "_0"
+            for index in range(len(path) - 1, -1, -1):
+                chain_state = target_state + "_" + "".join((bit or "k") + direction for bit, direction in path[index:])
+                bit, direction = path[index]
+                new_transitions[(chain_state, "0")] = (state, bit or "0", direction)
+                new_transitions[(chain_state, "1")] = (state, bit or "1", direction)
+                state = chain_state
+            return state
+
+        source_states = sorted(set(state for state, _ in transitions.keys()) - stop_states)
+        for source_state in source_states:
+            # the read tree: the state for a prefix of bits reads the next bit
+            for symbol, bits in symbol_bits.items():
+                if (source_state, symbol) not in transitions:
+                    continue
+                target_state, write_symbol, direction = transitions[(source_state, symbol)]
+                new_bits = symbol_bits[write_symbol]
+                for depth in range(bit_depth - 1):
+                    read_state = source_state + ("_0" if depth == 0 else "_r" + bits[:depth])
+                    next_state = source_state + "_r" + bits[:depth + 1]
+                    new_transitions[(read_state, bits[depth])] = (next_state, bits[depth], ">")
+
+                # plan the head path from the last bit: back to the first changed bit, then to the target block
+                changed = [i for i in range(bit_depth) if bits[i] != new_bits[i]]
+                first_changed = changed[0] if changed else bit_depth
+                destination = {">": bit_depth, "<": -bit_depth, "-": 0}[direction]
+                lowest = min(first_changed, destination, bit_depth - 1)
+                positions = list(range(bit_depth - 1, lowest - 1, -1)) + list(range(lowest + 1, destination + 1))
+                last = positions[-1]
+                if len(positions) == 1 or (0 <= last < bit_depth and bits[last] != new_bits[last]):
+                    # bits are written when the head leaves them, so a '-' transition writes its first bit by
+                    # staying there for a step
+                    positions.append(last)
+                path = []
+                for position, next_position in zip(positions, positions[1:]):
+                    bit = new_bits[position] if 0 <= position < bit_depth else None
+                    path.append((bit, {-1: "<", 0: "-", 1: ">"}[next_position - position]))
+
+                read_state = source_state + ("_0" if bit_depth == 1 else "_r" + bits[:-1])
+                bit, direction = path[0]
+                new_transitions[(read_state, bits[-1])] = (add_chain(path[1:], target_state), bit, direction)
+
+        initial_state = definition.initial_state + "_0"
+        new_stop_states = [state + "_0" for state in definition.stop_states]
+        merged_transitions, _ = merge_equivalent_states(new_transitions, new_stop_states, initial_state, ("0", "1"))
+        return merged_transitions, new_stop_states
+
+    def get_binarization_report(self, max_steps=None):
+        """Compare the standard and the optimized binarization (see convert_to_two_symbol()) on copies of this
+        machine and its current tape. The machine itself is not changed.
+        Arguments:
+            max_steps:  The maximum number of steps of each run
+        Returns a dict with an entry for the "original", "standard" and "optimized" machine, each a dict with the
+        number of states and transitions, the steps of the run, whether it halted and the decoded output tape"""
+        assert not self.has_been_binarized
+        report = {}
+        for encoding in ("original", "standard", "optimized"):
+            definition = self.definition
+            turing_machine = TuringMachine(TuringDefinition(
+                dict(definition.transitions), definition.initial_state, list(definition.stop_states),
+                definition.tape.to_list(), blank=definition.blank))
+            turing_machine.definition.tape_index = definition.tape_index  # may be right behind the end of the tape
+            if encoding != "original":
+                turing_machine.convert_to_two_symbol(optimized=encoding == "optimized")
+            transitions = turing_machine.definition.transitions
+            result = turing_machine.run_silent(max_steps=max_steps)
+            report[encoding] = {
+                "states": len(set(state for state, _ in transitions.keys())),
+                "transitions": len(transitions),
+                "steps": result.steps,
+                "halted": result.halted,
+                "tape": turing_machine.get_stripped_tape(decode_binarized=turing_machine.has_been_binarized),
+            }
+        return report
 
     def set_tape_string(self, string):
         """Set the Turing machine's tape. Only possible if the machine has not been binarized yet.
         Arguments:
             string: The tape in the form of a string. May contain a caret (^) that indicates the head position.
             The head will be right to the caret. After setting the tape, the caret will be removed."""
-        if "^" in string:
-            self.definition.tape_index = string.find("^")
-            if string == "^":
-                self.definition.tape = [self.definition.blank]
-            else:
-                self.definition.tape = list(string.replace("^", ""))
-        else:
-            self.definition.tape_index = 0
-            if string:
-                self.definition.tape = list(string)
-            else:
-                self.definition.tape = [self.definition.blank]
+        self.definition.tape, self.definition.tape_index = parse_tape_string(string, self.definition.blank)
 
     def get_stripped_tape(self, decode_binarized=False):
         """Return a version of the tape that has been stripped of leading and trailing blanks"""
@@ -320,10 +554,430 @@ class TuringMachine:
             tape = self.decode_binarized_tape()
             blank = self.pre_binarize_blank
         else:
-            tape = self.definition.tape
+            tape = self.definition.tape.to_list()
             blank = self.definition.blank
         return _strip_list(tape, blank)
 
+    def _get_definition_metadata(self):
+        """Return everything about the machine that does not change while it runs, except the transition function"""
+        definition = self.definition
+        return {
+            "initial_state": definition.initial_state,
+            "stop_states": list(definition.stop_states),
+            "blank": definition.blank,
+            "has_been_binarized": self.has_been_binarized,
+            "binarized_bit_depth": self.binarized_bit_depth,
+            "binarized_symbol_lookup": self.binarized_symbol_lookup,
+            "pre_binarize_blank": self.pre_binarize_blank,
+        }
+
+    def _set_definition_metadata(self, metadata):
+        """Restore the binarization and run state of the machine from metadata (see _get_definition_metadata())"""
+        self.has_been_binarized = metadata["has_been_binarized"]
+        self.binarized_bit_depth = metadata["binarized_bit_depth"]
+        self.binarized_symbol_lookup = metadata["binarized_symbol_lookup"]
+        self.pre_binarize_blank = metadata["pre_binarize_blank"]
+        self.current_state = metadata["current_state"]
+        self.steps = metadata["steps"]
+
+    def _get_checkpoint_definition(self):
+        """Return everything about the machine that does not change while it runs, as checkpoint metadata"""
+        transitions = [[source_state, read_symbol, target_state, write_symbol, direction]
+                       for (source_state, read_symbol), (target_state, write_symbol, direction)
+                       in self.definition.transitions.items()]
+        metadata = self._get_definition_metadata()
+        metadata.update(kind="turing_machine", transitions=transitions)
+        return metadata
+
+    def get_checkpoint(self):
+        """Return the machine's definition and configuration as checkpoint data (see checkpoint.write_checkpoint()).
+        The tape is stored as packed symbol ids.
+        Returns a tuple (metadata, sections)"""
+        tape = self.definition.tape
+        if isinstance(tape, ByteTape):
+            symbols, cells = list(tape.symbols), pack_ids(tape.cells())
+        else:
+            symbols, cells = encode_symbols(tape, [self.definition.blank])
+        metadata = self._get_checkpoint_definition()
+        metadata.update(symbols=symbols, tape_index=self.definition.tape_index, current_state=self.current_state,
+                        steps=self.steps)
+        return metadata, {"tape": cells}
+
+    def save_checkpoint(self, path):
+        """Atomically write the machine's definition and configuration to a checkpoint file"""
+        write_checkpoint(path, *self.get_checkpoint())
+
+    @classmethod
+    def from_checkpoint(cls, metadata, sections):
+        """Construct a machine from checkpoint data (see get_checkpoint())"""
+        assert metadata["kind"] == "turing_machine"
+        transitions = {(source_state, read_symbol): (target_state, write_symbol, direction)
+                       for source_state, read_symbol, target_state, write_symbol, direction
+                       in metadata["transitions"]}
+        tape = decode_symbols(metadata["symbols"], sections["tape"])
+        definition = TuringDefinition(transitions, metadata["initial_state"], metadata["stop_states"], tape,
+                                      metadata["tape_index"], blank=metadata["blank"])
+        turing_machine = cls(definition)
+        turing_machine._set_definition_metadata(metadata)
+        return turing_machine
+
+    @classmethod
+    def resume(cls, path):
+        """Construct a machine from a checkpoint file, so that a run can be continued where it has been saved"""
+        return cls.from_checkpoint(*read_checkpoint(path))
+
+    def save_binary(self, path):
+        """Write the machine's definition, tape and configuration to a compact binary file (see binary_format).
+        State and symbol names are stored once in a string table, the transitions as arrays of ids into it and
+        the tape at the minimal bit width of its alphabet. The compiled transition table is stored as well, so that
+        it does not need to be compiled again after loading. Load the file with load_binary()."""
+        definition = self.definition
+        table = self.compile()
+        strings = StringTable()
+        source_states, read_symbols = zip(*definition.transitions.keys()) if definition.transitions else ((), ())
+        target_states, write_symbols, directions = \
+            zip(*definition.transitions.values()) if definition.transitions else ((), (), ())
+        tape = definition.tape
+        if isinstance(tape, ByteTape):
+            tape_symbols, tape_ids = list(tape.symbols), tape.cells()
+        else:
+            tape_symbols, tape_ids = encode_symbols(tape, [definition.blank])
+        tape_bits = get_bit_width(len(tape_symbols))
+        sections = {
+            "source_states": strings.intern_all(source_states),
+            "read_symbols": strings.intern_all(read_symbols),
+            "target_states": strings.intern_all(target_states),
+            "write_symbols": strings.intern_all(write_symbols),
+            "directions": encode_directions(directions),
+            "tape_symbols": strings.intern_all(tape_symbols),
+            "tape": pack_bits(tape_ids, tape_bits),
+            "table_states": strings.intern_all(table.states),
+            "table_symbols": strings.intern_all(table.symbols),
+            "table": array.array("q", table.table),
+            "stop_bitmap": array.array("B", table.stop_bitmap),
+        }
+        metadata = self._get_definition_metadata()
+        metadata.update(tape_length=len(tape_ids), tape_bits=tape_bits, tape_index=definition.tape_index,
+                        current_state=self.current_state, steps=self.steps)
+        write_definition_file(path, "turing_machine", metadata, strings, sections)
+
+    @classmethod
+    def load_binary(cls, path, use_mmap=True):
+        """Construct a machine from a binary file written by save_binary(). The compiled transition table is taken
+        from the file, only the transition function is built from the id arrays.
+        Arguments:
+            path:       The binary file
+            use_mmap:   Map the file into memory instead of reading it"""
+        with DefinitionFile(path, use_mmap) as definition_file, gc_paused():
+            assert definition_file.kind == "turing_machine"
+            metadata = definition_file.metadata
+            sections = definition_file.sections
+            name = definition_file.strings.__getitem__
+            transitions = dict(zip(
+                zip(map(name, sections["source_states"]), map(name, sections["read_symbols"])),
+                zip(map(name, sections["target_states"]), map(name, sections["write_symbols"]),
+                    decode_directions(sections["directions"]))))
+            tape_symbols = [name(string_id) for string_id in sections["tape_symbols"]]
+            tape_ids = unpack_bits(sections["tape"], metadata["tape_bits"], metadata["tape_length"])
+            table = None
+            if "table" in sections:  # files of earlier versions do not contain the compiled table
+                table = CompiledTransitionTable.from_arrays(map(name, sections["table_states"]),
+                                                            map(name, sections["table_symbols"]),
+                                                            sections["table"], sections["stop_bitmap"])
+        definition = TuringDefinition(transitions, metadata["initial_state"], metadata["stop_states"],
+                                      decode_symbols(tape_symbols, tape_ids), metadata["tape_index"],
+                                      blank=metadata["blank"])
+        turing_machine = cls(definition)
+        turing_machine._set_definition_metadata(metadata)
+        if table is not None:
+            turing_machine.set_compiled_table(table)
+        return turing_machine
+
+    def write_definition_text(self, path):
+        """Write the transition function in the text format of read_definition_from_path(). All stop states are
+        written as '-', the only stop state of the text format, and the blank ' ' as '_'. Other blank symbols need
+        to be set again after reading the file."""
+        definition = self.definition
+        stop_states = set(definition.stop_states)
+        assert definition.initial_state not in stop_states
+        assert any(source_state == definition.initial_state for source_state, _ in definition.transitions), \
+            "the text format requires a transition from the initial state"
+
+        def to_text(name, is_state=False):
+            if is_state and name in stop_states:
+                return "-"
+            assert "\t" not in name and "\n" not in name and "#" not in name
+            return "_" if name == " " else name
+
+        # the first line defines the initial state
+        transitions = sorted(definition.transitions.items(), key=lambda item: item[0][0] != definition.initial_state)
+        lines = []
+        for (source_state, read_symbol), (target_state, write_symbol, direction) in transitions:
+            lines.append("\t".join((to_text(source_state, True), to_text(read_symbol), to_text(write_symbol),
+                                    {"<": "L", ">": "R", "-": "-"}[direction], to_text(target_state, True))))
+        with open(path, "w") as fid:
+            fid.write("\n".join(lines) + "\n")
+
+    def _get_compiled_key(self):
+        """Return everything a compiled transition table depends on, except the tape"""
+        definition = self.definition
+        return (definition.transitions, definition.transitions.version, definition.blank,
+                tuple(definition.stop_states), definition.initial_state)
+
+    def compile(self):
+        """Return the integer-compiled transition table of the machine (see CompiledTransitionTable).
+        The table is cached and rebuilt whenever the transition function is replaced or changed, the blank, stop
+        states or initial state are replaced, or the tape contains symbols the table cannot encode."""
+        definition = self.definition
+        key = self._get_compiled_key()
+        table = self._compiled_table
+        if (table is None or self._compiled_key[0] is not key[0] or self._compiled_key[1:] != key[1:]
+                or not table.can_encode(definition.tape)):
+            table = CompiledTransitionTable(definition, extra_symbols=definition.tape)
+            self._compiled_table = table
+            self._compiled_key = key
+        return table
+
+    def set_compiled_table(self, table):
+        """Use a precompiled transition table for the current definition, e.g. one that is shared by many machines
+        with the same transition function. The table is replaced by compile() like its own one would be."""
+        self._compiled_table = table
+        self._compiled_key = self._get_compiled_key()
+
+    def run_compiled(self, max_steps=None):
+        """Run the machine on its integer-compiled transition table without any output.
+        The resulting tape, head position, state and step count are identical to calling step() until it returns
+        True, but the per-step dictionary lookups, stop state checks and direction comparisons are avoided.
+        Arguments:
+            max_steps:  Stop after this many steps, even if the machine has not halted yet
+        Returns True if the machine has halted"""
+        return self.run_silent(max_steps=max_steps).halted
+
+    def run_silent(self, max_steps=None, deadline=None, progress_every=None, progress=None, generated_kernel=False,
+                   detect_cycles=False, checkpoint_path=None, checkpoint_steps=None, checkpoint_seconds=None,
+                   checkpoint_metadata=None, trace=None):
+        """Run the machine on its integer-compiled transition table without any output, within a step and time
+        budget. The hot loop runs in chunks of steps that contain no I/O; budgets and progress are only checked
+        between the chunks. The final configuration is identical to calling step() the same number of times.
+        Arguments:
+            max_steps:      Stop after this many steps, even if the machine has not halted yet
+            deadline:       Stop after this many seconds of wall time. The deadline is checked every progress_every
+                                steps, or every 65536 steps if progress_every is not set.
+            progress_every: Call progress every this many steps
+            progress:       Callback that receives an intermediate RunResult
+            generated_kernel:   Run on a kernel that has been generated and compiled specifically for this
+                                    machine's transition table (see kernel_generator.get_kernel())
+            detect_cycles:  Stop with a NonHalting result as soon as the machine is found to repeat its
+                                configuration, either exactly or translated along the tape (see
+                                cycle_detection.TuringCycleDetector). Cycles are checked every progress_every
+                                steps, or every 4096 steps if progress_every is not set.
+            checkpoint_path:    Periodically write checkpoints to this file (see resume()), and a final one when
+                                    the run ends. Checkpoints are written from a background thread.
+            checkpoint_steps:   Write a checkpoint every this many steps
+            checkpoint_seconds: Write a checkpoint every this many seconds of wall time. Checkpoints are only due
+                                    between chunks, i.e. every progress_every steps if it is set.
+            checkpoint_metadata:    Additional metadata stored with every checkpoint (dict), e.g. by the UTM
+            trace:          Record the run to a TraceWriter. The trace is sampled between chunks, which are as
+                                long as the trace's sampling interval unless progress_every is set.
+        Returns a RunResult"""
+        start_time = time.perf_counter()
+        table = self.compile()
+        kernel = get_kernel(table) if generated_kernel else table.kernel
+        cells = table.encode_tape(self.definition.tape)
+        pos = self.definition.tape_index
+        state = table.state_ids[self.current_state]
+
+        # step() adds a blank if the head starts right behind the end of the tape
+        if pos == len(cells) and not table.stop_bitmap[state]:
+            cells.append(0)
+        lo, hi = 0, len(cells)
+        origin = 0  # buffer position of the first cell of the initial tape
+
+        chunk_size = progress_every
+        if chunk_size is None and trace is not None:
+            chunk_size = trace.chunk_size
+        if chunk_size is None and detect_cycles:
+            chunk_size = _CYCLE_CHECK_STEPS
+        if chunk_size is None and deadline is not None:
+            chunk_size = _DEADLINE_CHECK_STEPS
+        detector = TuringCycleDetector() if detect_cycles else None
+        if trace is not None:
+            trace.record_cells(self.steps, self.current_state, cells, pos, lo, hi, table.symbols)
+        writer = None
+        if checkpoint_path is not None:
+            writer = CheckpointWriter(checkpoint_path, every_steps=checkpoint_steps, every_seconds=checkpoint_seconds,
+                                      steps=self.steps)
+            checkpoint_definition = self._get_checkpoint_definition()
+            checkpoint_definition.update(checkpoint_metadata or {}, symbols=table.symbols)
+            if chunk_size is None:
+                chunk_size = writer.check_interval
+
+        steps = 0
+        reason = None
+        cycle = None
+        while True:
+            limit = chunk_size
+            if max_steps is not None:
+                limit = max_steps - steps if limit is None else min(limit, max_steps - steps)
+            # each chunk reports the region the head has visited during that chunk
+            status, cells, pos, run_lo, run_hi, state, taken, shift = execute(kernel, cells, pos, pos, pos + 1,
+                                                                              state, max_steps=limit)
+            steps += taken
+            origin += shift
+            lo = min(lo + shift, run_lo)
+            hi = max(hi + shift, run_hi)
+            if status != LIMIT:
+                break
+            if max_steps is not None and steps >= max_steps:
+                reason = MAX_STEPS
+                break
+            elapsed = time.perf_counter() - start_time
+            if deadline is not None and elapsed >= deadline:
+                reason = DEADLINE
+                break
+            if detector is not None:
+                cycle = detector.check(self.steps + steps, state, cells, origin, pos, lo, hi, run_lo, run_hi)
+                if cycle is not None:
+                    break
+            if trace is not None and trace.due(self.steps + steps, table.states[state]):
+                trace.record_cells(self.steps + steps, table.states[state], cells, pos, lo, hi, table.symbols)
+            if writer is not None and writer.due(self.steps + steps):
+                # only the snapshot is taken here, the checkpoint is written in the background
+                metadata = dict(checkpoint_definition, tape_index=pos - lo, current_state=table.states[state],
+                                steps=self.steps + steps)
+                writer.submit(self.steps + steps, metadata, {"tape": pack_ids(cells[lo:hi], table.num_symbols)})
+            if progress is not None:
+                progress(RunResult(False, None, self.steps + steps, elapsed, table.states[state]))
+
+        if trace is not None:
+            trace.record_cells(self.steps + steps, table.states[state], cells, pos, lo, hi, table.symbols)
+            trace.flush()
+        halted = self.store_compiled_run(table, cells[lo:hi], pos - lo, state, steps, undefined=status == UNDEFINED)
+        if writer is not None:
+            metadata, sections = self.get_checkpoint()
+            metadata.update(checkpoint_metadata or {})
+            writer.submit(self.steps, metadata, sections)
+            writer.close()
+        elapsed = time.perf_counter() - start_time
+        if cycle is not None:
+            period, cycle_shift = cycle
+            return NonHalting(self.steps, elapsed, self.current_state, period, cycle_shift)
+        return RunResult(halted, HALTED if halted else reason, self.steps, elapsed, self.current_state)
+
+    def run_profiled(self, max_steps=None):
+        """Run the machine like run_silent(), but on an instrumented loop that counts how often each transition is
+        taken, where the head is and how far it sweeps in one direction (see profiler.TransitionProfiler).
+        The final configuration is the same as with run_silent().
+        Arguments:
+            max_steps:  Stop after this many steps, even if the machine has not halted yet
+        Returns a tuple (RunResult, TransitionProfile)"""
+        start_time = time.perf_counter()
+        table = self.compile()
+        profiler = TransitionProfiler(table)
+        cells = table.encode_tape(self.definition.tape)
+        pos = self.definition.tape_index
+        state = table.state_ids[self.current_state]
+
+        # step() adds a blank if the head starts right behind the end of the tape
+        if pos == len(cells) and not table.stop_bitmap[state]:
+            cells.append(0)
+        size = len(cells)
+        status, cells, pos, run_lo, run_hi, state, steps, shift = profiler.execute(cells, pos, pos, pos + 1, state,
+                                                                                   max_steps=max_steps)
+        # the result covers the initial tape and the region the head has visited
+        lo = min(shift, run_lo)
+        hi = max(shift + size, run_hi)
+        elapsed = time.perf_counter() - start_time
+        profile = profiler.get_profile(self.definition.transitions, elapsed)
+
+        halted = self.store_compiled_run(table, cells[lo:hi], pos - lo, state, steps, undefined=status == UNDEFINED)
+        return RunResult(halted, HALTED if halted else MAX_STEPS, self.steps, elapsed, self.current_state), profile
+
+    def store_compiled_run(self, table, cells, tape_index, state, steps, undefined=False):
+        """Write the result of a run on the compiled transition table back to the machine.
+        Arguments:
+            table:      The CompiledTransitionTable the run was based on
+            cells:      The visited region of the tape as symbol ids (bytearray or list)
+            tape_index: The head position within cells
+            state:      The final state id
+            steps:      The number of steps taken during the run
+            undefined:  Flag indicating that the run stopped at a missing transition
+        Returns True if the machine has halted"""
+        if table.num_symbols <= 256:
+            self.definition.tape = ByteTape.from_cells(bytearray(cells), table.symbols, table.symbols[0])
+        else:
+            self.definition.tape = table.decode_tape(cells)
+        self.definition.tape_index = tape_index
+        self.current_state = table.states[state]
+        self.steps += steps
+
+        if undefined:
+            read_symbol = self.definition.tape[self.definition.tape_index]
+            sys.exit("Invalid input: (state={state}, symbol={symbol})".format(state=self.current_state,
+                                                                              symbol=read_symbol))
+        return bool(table.stop_bitmap[state])
+
+    def run_chained(self, max_steps=None):
+        """Run the machine on a run-length encoded tape with chain stepping, without any output.
+        Whenever a transition keeps its state and moves the head over a run of identical symbols, e.g. a state
+        that skips over a block of 1s, the whole run is processed in a single operation. The step counter still
+        advances by the exact number of steps, and the resulting tape, head position and state are identical to
+        calling step() until it returns True.
+        If the machine would sweep over the infinite blank part of the tape forever and max_steps is not set,
+        the run ends at the beginning of that sweep.
+        Arguments:
+            max_steps:  Stop after this many steps, even if the machine has not halted yet
+        Returns True if the machine has halted"""
+        table = self.compile()
+        num_symbols = table.num_symbols
+        symbol_mask = (1 << table.symbol_bits) - 1
+        state_shift = table.symbol_bits + 2
+
+        cells = table.encode_tape(self.definition.tape)
+        tape = RunLengthTape(cells, self.definition.tape_index, 0)
+        state = table.state_ids[self.current_state]
+        lo, hi = 0, len(cells)
+
+        # step() adds a blank if the head starts right behind the end of the tape
+        if tape.position == hi and not table.stop_bitmap[state]:
+            hi += 1
+
+        steps = 0
+        undefined = False
+        while max_steps is None or steps < max_steps:
+            if table.stop_bitmap[state]:
+                break
+            entry = table.table[state * num_symbols + tape.head]
+            if entry < 0:
+                undefined = True
+                break
+            target_state = entry >> state_shift
+            write_symbol = (entry >> 2) & symbol_mask
+            direction = (entry & 3) - 1
+
+            if target_state == state and direction != 0:
+                # chain step: the transition applies to the whole run of identical symbols ahead of the head
+                count = tape.run_length(direction)
+                if count is None:  # sweeping over infinite blanks
+                    if max_steps is None:
+                        break
+                    count = max_steps - steps - 1
+                elif max_steps is not None:
+                    count = min(count, max_steps - steps - 1)
+                tape.sweep(direction, write_symbol, count)
+                steps += count + 1
+            else:
+                tape.head = write_symbol
+                tape.move(direction)
+                state = target_state
+                steps += 1
+
+            lo = min(lo, tape.position)
+            hi = max(hi, tape.position + 1)
+
+        return self.store_compiled_run(table, tape.to_list(lo, hi), tape.position - lo, state, steps,
+                                       undefined=undefined)
+
     def step(self):
         """Execute a single step of the Turing machine.
         Returns True if the machine stops after this step, and False if it needs to continue"""
@@ -331,11 +985,13 @@ class TuringMachine:
         if self.current_state in self.definition.stop_states:
             return True
 
+        tape = self.definition.tape
+
         # add a blank if the end is reached
-        if self.definition.tape_index == len(self.definition.tape):
-            self.definition.tape += [self.definition.blank]
+        if self.definition.tape_index == len(tape):
+            tape.grow_right()
 
-        read_symbol = self.definition.tape[self.definition.tape_index]
+        read_symbol = tape[self.definition.tape_index]
         if not (self.current_state, read_symbol) in self.definition.transitions:
             sys.exit("Invalid input: (state={state}, symbol={symbol})".format(state=self.current_state,
                                                                               symbol=read_symbol))
@@ -343,7 +999,7 @@ class TuringMachine:
         # write to tape and change state
         new_state, write_symbol, direction = self.definition.transitions[(self.current_state, read_symbol)]
         self.current_state = new_state
-        self.definition.tape[self.definition.tape_index] = write_symbol
+        tape[self.definition.tape_index] = write_symbol
 
         # move head
         if direction == "<":
@@ -353,14 +1009,14 @@ class TuringMachine:
         else:
             assert direction == "-"  # no head movement
 
-        # add a blank if the beginning or end is reached
+        # add a blank if the beginning or end is reached (amortized O(1), see Tape)
         if self.definition.tape_index == -1:
-            self.definition.tape = [self.definition.blank] + self.definition.tape
+            tape.grow_left()
             self.definition.tape_index = 0
-        elif self.definition.tape_index == len(self.definition.tape):
-            self.definition.tape += [self.definition.blank]
+        elif self.definition.tape_index == len(tape):
+            tape.grow_right()
 
-        assert 0 <= self.definition.tape_index < len(self.definition.tape)
+        assert 0 <= self.definition.tape_index < len(tape)
         self.steps += 1
 
         return False
@@ -384,6 +1040,18 @@ class TuringMachine:
             print("  ({}) -> ({})".format(" ".join(left_side), " ".join(right_side)))
         print("Tape: {}".format(" ".join(self.definition.tape)))
 
+    def print_binarization_report(self, max_steps=None):
+        """Print a comparison of the standard and the optimized binarization (see get_binarization_report())"""
+        report = self.get_binarization_report(max_steps)
+        print("Binarization")
+        print("------------")
+        print("{:<10} {:>8} {:>12} {:>12}".format("Encoding", "States", "Transitions", "Steps"))
+        for encoding, entry in report.items():
+            steps = str(entry["steps"]) if entry["halted"] else ">{}".format(entry["steps"])
+            print("{:<10} {:>8} {:>12} {:>12}".format(encoding, entry["states"], entry["transitions"], steps))
+        if report["standard"]["tape"] != report["optimized"]["tape"]:
+            print("Warning: the binarized machines' output tapes differ")
+
     def print(self, line_break=False, fid=None):
         """Print the current state of the machine, including the contents of its tape"""
         # TODO This needs to get cleaned up!
@@ -443,26 +1111,51 @@ class TuringMachine:
 
     def decode_binarized_tape(self):
         """Decodes the binarized tape back to the original alphabet"""
+        return list(self.iter_decoded_tape())
+
+    def _get_decoding_padding(self):
+        """Return the number of bits missing in front of the tape's first cell to align the bit fields with the
+        head position"""
+        return -self.definition.tape_index % self.binarized_bit_depth
+
+    def get_decoded_tape_index(self):
+        """Return the head position on the decoded tape (see iter_decoded_tape())"""
         assert self.has_been_binarized
+        return (self.definition.tape_index + self._get_decoding_padding()) // self.binarized_bit_depth
 
-        output = []
-        tape_string = "".join(self.definition.tape)
-        tape_index = self.definition.tape_index
-
-        # fill the beginning and end of the tape with 0 to align the bit fields
-        while tape_index % self.binarized_bit_depth != 0:
-            tape_string = "0" + tape_string
-            tape_index += 1
-        while len(tape_string) % self.binarized_bit_depth != 0:
-            tape_string += "0"
-
-        # convert each bit field to its corresponding original TM symbol
-        while len(tape_string) >= self.binarized_bit_depth:
-            symbol = tape_string[0:self.binarized_bit_depth]
-            tape_string = tape_string[self.binarized_bit_depth:]
-            symbol_idx = int(symbol, 2)
-            output.append(self.binarized_symbol_lookup[symbol_idx])
-        return output
+    def iter_decoded_tape(self, start=0, end=None, chunk_size=1 << 16):
+        """Decode the binarized tape back to the original alphabet, one symbol at a time.
+        The bit fields are aligned with the head position, like in decode_binarized_tape(). The tape is read in
+        windows of chunk_size symbols, so decoding takes linear time and never copies the whole tape.
+        Arguments:
+            start:      The first decoded position (the first bit field of decode_binarized_tape() is 0)
+            end:        The decoded position to stop at (exclusive). Defaults to the end of the tape.
+                            Positions outside the tape decode to the original blank.
+            chunk_size: The number of symbols decoded per window
+        Returns an iterator over symbols"""
+        assert self.has_been_binarized
+        bit_depth = self.binarized_bit_depth
+        symbol_lookup = self.binarized_symbol_lookup
+        tape = self.definition.tape
+        padding = self._get_decoding_padding()
+        if end is None:
+            end = (len(tape) + padding + bit_depth - 1) // bit_depth
+
+        bit_characters = None
+        if isinstance(tape, ByteTape):
+            bit_characters = b"".join(b"1" if symbol == "1" else b"0" for symbol in tape.symbols).ljust(256, b"0")
+
+        for chunk_start in range(start, end, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, end)
+            cells = tape.get_cells(chunk_start * bit_depth - padding, chunk_end * bit_depth - padding)
+            bits = "".join(cells) if bit_characters is None else cells.translate(bit_characters)
+            for offset in range(0, len(bits), bit_depth):
+                yield symbol_lookup[int(bits[offset:offset + bit_depth], 2)]
+
+    def decode_region(self, start, end):
+        """Return the decoded symbols [start, end) of the binarized tape (see iter_decoded_tape()), e.g. to
+        inspect a part of a huge tape during a run. The head is at get_decoded_tape_index()."""
+        return list(self.iter_decoded_tape(start, end))
 
     def run(self, line_break=False, write_to_file=False, brief=False):
         """Run the Turing machine until it stops.
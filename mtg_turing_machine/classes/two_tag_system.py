@@ -1,42 +1,71 @@
+import array
+import time
+from collections import deque
+from itertools import chain, islice
+
 from .turing_machine import TuringDefinition
+from .binary_format import StringTable, DefinitionFile, write_definition_file, get_bit_width, pack_bits, \
+    unpack_bits, gc_paused
+from .checkpoint import CheckpointWriter, pack_ids, encode_symbols, decode_symbols, read_checkpoint, \
+    write_checkpoint
+from .cycle_detection import TagCycleDetector
+from .run_result import RunResult, NonHalting, HALTED, MAX_STEPS, DEADLINE
+from .run_length_word import RunLengthWord
+from .word_summary import WordSummary
+from .compiled_rules import CompiledProductionRules, UNDEFINED_PRODUCTION
+from .optimizer import optimize_production_rules
+
+# number of steps between two deadline checks, if no progress interval is set
+_DEADLINE_CHECK_STEPS = 1 << 14
+# number of steps between two cycle checks, if no progress interval is set
+_CYCLE_CHECK_STEPS = 1 << 10
 
 
 class TwoTagSystem:
     """Two tag system main class
     Attributes:
         production_rules:       Production rules (dict), corresponds to the transition function of a Turing machine
-        current_word:           The current word (list of symbols), corresponds to the tape of a Turing machine
+        current_word:           The current word (deque of symbols), corresponds to the tape of a Turing machine.
+                                    Symbols are consumed at the front and appended at the back in O(1) each.
+                                    A compact word is a RunLengthWord instead, which is not expanded by run_chained()
+                                    and run_cycles().
         halting_symbol:         Symbol indicating when the two tag system should halt.
         steps:                  The number of steps the two tag system has taken so far
         from_turing_machine:    Flag indicating that the two tag system has been converted from a Turing machine
         """
 
-    def __init__(self, definition):
+    def __init__(self, definition, compact_word=False):
         """Initialize
         Arguments:
             definition: Definition of the two tag system. Either a Turing Machine Definition or production rules
                 - Turing machine as binary TuringDefinition (binary Turing machine only consists of the symbols 0 and 1)
                 - Production rules as a dictionary of the form:
                     {symbol: list of symbols}
+            compact_word:   Keep the start word of a Turing machine as a RunLengthWord instead of a deque. The start
+                                word's length is exponential in the length of the TM's tape.
             """
         assert isinstance(definition, TuringDefinition) or isinstance(definition, dict)
+        self._compiled_rules = None
+        self._compiled_key = None
         if isinstance(definition, TuringDefinition):
-            self.init_from_turing_machine(definition)
+            self.init_from_turing_machine(definition, compact_word)
         else:
             self.production_rules = definition
-            self.current_word = [""]
+            self.current_word = deque([""])
             self.halting_symbol = ""
             self.steps = 0
             self.from_turing_machine = False
 
-    def init_from_turing_machine(self, tm_definition):
-        """Initialize the two tag system from a binary Turing machine"""
+    def init_from_turing_machine(self, tm_definition, compact_word=False):
+        """Initialize the two tag system from a binary Turing machine, with the start word as a RunLengthWord if
+        compact_word is set"""
         assert isinstance(tm_definition, TuringDefinition)
         assert tm_definition.blank == '0'
         alphabet = self.get_alphabet(tm_definition.transitions)
         assert alphabet == {'0', '1'} or alphabet == {"0"} or alphabet == {"1"}
 
-        self.production_rules, self.current_word = self.convert_tm_to_two_tag_system(tm_definition)
+        self.production_rules, start_word = self.convert_tm_to_two_tag_system(tm_definition)
+        self.current_word = start_word if compact_word else deque(start_word)
 
         self.halting_symbol = "#"
         self.steps = 0
@@ -52,7 +81,8 @@ class TwoTagSystem:
     @staticmethod
     def convert_tm_to_two_tag_system(tm_definition):
         """Convert a binary Turing machine to a two tag system.
-        For details refer to the Cocke/Minsky paper in the 'literature' directory."""
+        For details refer to the Cocke/Minsky paper in the 'literature' directory.
+        Returns a tuple (production rules, start word), with the start word as a RunLengthWord"""
 
         # Todo: adapt and test to make it work with arbitrary TM head positions.
         assert tm_definition.tape_index == 0
@@ -78,10 +108,9 @@ class TwoTagSystem:
             adapted_transitions.append(adapted_transition)
 
         # Express the tm tape (which only has 0s and 1s) as two binary numbers, m and n (left and right of the head)
+        # (the first tape cell is the least significant bit of n)
         tape_m = 0
-        tape_n = 0
-        for i, symbol in enumerate(tm_definition.tape):
-            tape_n += int(symbol) * 2 ** i
+        tape_n = int("".join(tm_definition.tape)[::-1] or "0", 2)
 
         # A special unique start state (uss) needs to be prepended since the Turing machine's original start state
         # was split into two states and we must begin with a single start state
@@ -95,7 +124,9 @@ class TwoTagSystem:
         # The upper case A x and B x only occur once and act as separators between the left and right hand side
         # Each adapted state 's' will receive their own A and B variants, named a_'s' and b_'s'.
         # In this instance, 's' is the unique start state uss. The remaining a_'s' and b_'s' will be defined later.
-        start_word = ["A_" + uss, "x"] + ["a_" + uss, "x"] * tape_m + ["B_" + uss, "x"] + ["b_" + uss, "x"] * tape_n
+        # The word is built from its runs, since it has 2 * (m + n + 2) symbols
+        start_word = RunLengthWord.from_runs((
+            (("A_" + uss, "x"), 1), (("a_" + uss, "x"), tape_m), (("B_" + uss, "x"), 1), (("b_" + uss, "x"), tape_n)))
 
         production_rules = {}
 
@@ -206,21 +237,514 @@ class TwoTagSystem:
         return final_production_rules
 
     def set_initial_word(self, initial_word, halting_symbol):
-        """Set the initial word and halting symbol. This will reset the steps counter."""
-        if isinstance(initial_word, str):
-            initial_word = list(initial_word)
+        """Set the initial word (string or sequence of symbols, or a RunLengthWord that is kept as a compact word) and
+        halting symbol. This will reset the steps counter."""
         self.steps = 0
-        self.current_word = initial_word
+        self.current_word = initial_word if isinstance(initial_word, RunLengthWord) else deque(initial_word)
         self.halting_symbol = halting_symbol
 
     def step(self):
         """Compute a single step of the two tag system"""
         # cut off the first two symbols and place the result of the production rule based on the first symbol to the
         # end of the word
-        first_symbol = self.current_word[0]
-        self.current_word = self.current_word[2:] + self.production_rules[first_symbol]
+        word = self.current_word
+        first_symbol = word.popleft()
+        if word:
+            word.popleft()
+        word.extend(self.production_rules[first_symbol])
         self.steps += 1
 
+    def get_alphabet_of_rules(self):
+        """Return all symbols that can occur in the word: the production rules' symbols, the halting symbol and the
+        symbols of the current word (sorted list)"""
+        alphabet = set(self.production_rules)
+        for production in self.production_rules.values():
+            alphabet.update(production)
+        alphabet.update(self.get_word_symbols())
+        alphabet.add(self.halting_symbol)
+        return sorted(alphabet)
+
+    def optimize(self):
+        """Optimize the production rules in place, e.g. before encoding the system for a UTM: remove the rules of
+        symbols that can never occur and merge equivalent symbols (see optimizer.optimize_production_rules()). The
+        current word is renamed accordingly, and the system takes the same steps as before. The halting symbol is
+        kept, and so are the 'A', 'a', 'B' and 'b' symbols of a system converted from a Turing machine, so that
+        run(brief=True) and get_word_as_tm_tape() work as before. Cycles can no longer be computed in closed form
+        (see get_cycle()), as they depend on the names of the other symbols.
+        Returns a RuleOptimizationReport, which maps the original symbols to the new ones"""
+        fixed_symbols = []
+        if self.from_turing_machine:
+            fixed_symbols = [symbol for symbol in self.get_alphabet_of_rules() if symbol[:1] in ("A", "a", "B", "b")]
+        self.production_rules, report = optimize_production_rules(self.production_rules, self.get_word_symbols(),
+                                                                  self.halting_symbol, fixed_symbols)
+
+        mapping = report.symbol_mapping
+        word = self.current_word
+        if isinstance(word, RunLengthWord):
+            self.current_word = RunLengthWord.from_runs((tuple(mapping[symbol] for symbol in block), count)
+                                                        for block, count in word.runs)
+        else:
+            self.current_word = deque(mapping[symbol] for symbol in word)
+        return report
+
+    def get_word_symbols(self):
+        """Return the set of symbols that occur in the current word, without expanding a compact word"""
+        word = self.current_word
+        return word.get_symbols() if isinstance(word, RunLengthWord) else set(word)
+
+    def expand_word(self):
+        """Replace a compact current word (RunLengthWord) by a deque of its symbols"""
+        if isinstance(self.current_word, RunLengthWord):
+            self.current_word = deque(self.current_word)
+
+    def _get_checkpoint_definition(self):
+        """Return everything about the two tag system that does not change while it runs, as checkpoint metadata"""
+        return {
+            "kind": "two_tag_system",
+            "production_rules": self.production_rules,
+            "halting_symbol": self.halting_symbol,
+            "from_turing_machine": self.from_turing_machine,
+            "symbols": self.get_alphabet_of_rules(),
+        }
+
+    def get_checkpoint(self):
+        """Return the production rules and the current word as checkpoint data (see checkpoint.write_checkpoint()).
+        The word is stored as packed symbol ids.
+        Returns a tuple (metadata, sections)"""
+        metadata = self._get_checkpoint_definition()
+        metadata["steps"] = self.steps
+        _, word = encode_symbols(self.current_word, metadata["symbols"])
+        return metadata, {"word": word}
+
+    def save_checkpoint(self, path):
+        """Atomically write the production rules and the current word to a checkpoint file"""
+        write_checkpoint(path, *self.get_checkpoint())
+
+    @classmethod
+    def from_checkpoint(cls, metadata, sections):
+        """Construct a two tag system from checkpoint data (see get_checkpoint())"""
+        assert metadata["kind"] == "two_tag_system"
+        two_tag = cls(metadata["production_rules"])
+        two_tag.set_initial_word(decode_symbols(metadata["symbols"], sections["word"]), metadata["halting_symbol"])
+        two_tag.from_turing_machine = metadata["from_turing_machine"]
+        two_tag.steps = metadata["steps"]
+        return two_tag
+
+    @classmethod
+    def resume(cls, path):
+        """Construct a two tag system from a checkpoint file, so that a run can be continued where it has been
+        saved"""
+        return cls.from_checkpoint(*read_checkpoint(path))
+
+    def save_binary(self, path):
+        """Write the production rules and the current word to a compact binary file (see binary_format).
+        Symbols are stored once in a string table, the productions as one array of ids into it and the word at the
+        minimal bit width of its alphabet. Load the file with load_binary()."""
+        strings = StringTable()
+        productions = list(self.production_rules.values())
+        word_symbols, word_ids = encode_symbols(self.current_word)
+        word_bits = get_bit_width(len(word_symbols))
+        sections = {
+            "rule_symbols": strings.intern_all(self.production_rules.keys()),
+            "production_lengths": pack_ids([len(production) for production in productions]),
+            "productions": strings.intern_all([symbol for production in productions for symbol in production]),
+            "word_symbols": strings.intern_all(word_symbols),
+            "word": pack_bits(word_ids, word_bits),
+        }
+        metadata = {
+            "halting_symbol": self.halting_symbol,
+            "from_turing_machine": self.from_turing_machine,
+            "word_length": len(word_ids),
+            "word_bits": word_bits,
+            "steps": self.steps,
+        }
+        write_definition_file(path, "two_tag_system", metadata, strings, sections)
+
+    @classmethod
+    def load_binary(cls, path, use_mmap=True):
+        """Construct a two tag system from a binary file written by save_binary().
+        Arguments:
+            path:       The binary file
+            use_mmap:   Map the file into memory instead of reading it"""
+        with DefinitionFile(path, use_mmap) as definition_file, gc_paused():
+            assert definition_file.kind == "two_tag_system"
+            metadata = definition_file.metadata
+            sections = definition_file.sections
+            strings = definition_file.strings
+            production_symbols = [strings[string_id] for string_id in sections["productions"]]
+            production_rules = {}
+            start = 0
+            for rule_symbol, length in zip(sections["rule_symbols"], sections["production_lengths"]):
+                production_rules[strings[rule_symbol]] = production_symbols[start:start + length]
+                start += length
+            word_symbols = [strings[string_id] for string_id in sections["word_symbols"]]
+            word_ids = unpack_bits(sections["word"], metadata["word_bits"], metadata["word_length"])
+        two_tag = cls(production_rules)
+        two_tag.set_initial_word(decode_symbols(word_symbols, word_ids), metadata["halting_symbol"])
+        two_tag.from_turing_machine = metadata["from_turing_machine"]
+        two_tag.steps = metadata["steps"]
+        return two_tag
+
+    def run_silent(self, max_steps=None, deadline=None, progress_every=None, progress=None, detect_cycles=False,
+                   checkpoint_path=None, checkpoint_steps=None, checkpoint_seconds=None, trace=None):
+        """Run the two tag system without any output, within a step and time budget.
+        Stops under the same conditions as run(): when the halting symbol is read or the word becomes shorter
+        than 2 symbols. Budgets and progress are only checked between chunks of steps.
+        Arguments:
+            max_steps:      Stop after this many steps, even if the system has not halted yet
+            deadline:       Stop after this many seconds of wall time. The deadline is checked every progress_every
+                                steps, or every 16384 steps if progress_every is not set.
+            progress_every: Call progress every this many steps
+            progress:       Callback that receives an intermediate RunResult
+            detect_cycles:  Stop with a NonHalting result as soon as the word repeats (see
+                                cycle_detection.TagCycleDetector). Cycles are checked every progress_every steps,
+                                or every 1024 steps if progress_every is not set.
+            checkpoint_path:    Periodically write checkpoints to this file (see resume()), and a final one when
+                                    the run ends. Checkpoints are written from a background thread.
+            checkpoint_steps:   Write a checkpoint every this many steps
+            checkpoint_seconds: Write a checkpoint every this many seconds of wall time. Checkpoints are only due
+                                    between chunks, i.e. every progress_every steps if it is set.
+            trace:          Record the run to a TraceWriter, showing the beginning of the word. The trace is sampled
+                                between chunks, which are as long as the trace's sampling interval unless
+                                progress_every is set.
+        Returns a RunResult"""
+        start_time = time.perf_counter()
+        production_rules = self.production_rules
+        halting_symbol = self.halting_symbol
+        self.expand_word()
+
+        chunk_size = progress_every
+        if chunk_size is None and trace is not None:
+            chunk_size = trace.chunk_size
+        if chunk_size is None and detect_cycles:
+            chunk_size = _CYCLE_CHECK_STEPS
+        if chunk_size is None and deadline is not None:
+            chunk_size = _DEADLINE_CHECK_STEPS
+        detector = TagCycleDetector() if detect_cycles else None
+        writer = None
+        if checkpoint_path is not None:
+            writer = CheckpointWriter(checkpoint_path, every_steps=checkpoint_steps, every_seconds=checkpoint_seconds,
+                                      steps=self.steps)
+            checkpoint_definition = self._get_checkpoint_definition()
+            if chunk_size is None:
+                chunk_size = writer.check_interval
+
+        word = self.current_word
+        pop_first = word.popleft
+        append_production = word.extend
+        if trace is not None:
+            trace.record_tape(self.steps, word[0] if word else None, word, 0)
+        steps = 0
+        halted = False
+        reason = None
+        period = None
+        while True:
+            limit = chunk_size
+            if max_steps is not None:
+                limit = max_steps - steps if limit is None else min(limit, max_steps - steps)
+
+            taken = 0
+            while limit is None or taken < limit:
+                if len(word) < 2 or word[0] == halting_symbol:
+                    halted = True
+                    break
+                first_symbol = pop_first()
+                pop_first()
+                append_production(production_rules[first_symbol])
+                taken += 1
+            steps += taken
+
+            if halted or (len(word) < 2 or word[0] == halting_symbol):
+                halted = True
+                break
+            if max_steps is not None and steps >= max_steps:
+                reason = MAX_STEPS
+                break
+            elapsed = time.perf_counter() - start_time
+            if deadline is not None and elapsed >= deadline:
+                reason = DEADLINE
+                break
+            if detector is not None:
+                period = detector.check(self.steps + steps, word)
+                if period is not None:
+                    break
+            if trace is not None and trace.due(self.steps + steps, word[0]):
+                trace.record_tape(self.steps + steps, word[0], word, 0)
+            if writer is not None and writer.due(self.steps + steps):
+                # only the word is copied here, it is packed and written in the background
+                writer.submit(self.steps + steps, dict(checkpoint_definition, steps=self.steps + steps),
+                              self._pack_word_later(list(word), checkpoint_definition["symbols"]))
+            if progress is not None:
+                progress(RunResult(False, None, self.steps + steps, elapsed, word[0]))
+
+        self.steps += steps
+        if trace is not None:
+            trace.record_tape(self.steps, word[0] if word else None, word, 0)
+            trace.flush()
+        if writer is not None:
+            writer.submit(self.steps, *self.get_checkpoint())
+            writer.close()
+        elapsed = time.perf_counter() - start_time
+        if period is not None:
+            return NonHalting(self.steps, elapsed, word[0], period)
+        return RunResult(halted, HALTED if halted else reason, self.steps, elapsed, word[0] if word else None)
+
+    def run_chained(self, max_steps=None):
+        """Run the two tag system on a run-length encoded word (see RunLengthWord), without any output.
+        A run of repetitions of a block with an even number of symbols is read at the same positions in every
+        repetition, so the whole run is replaced by a run of the block's product in a single operation. For a two
+        tag system converted from a Turing machine, the work per simulated Turing machine step scales with the
+        number of runs instead of the length of the word. The step counter still advances by the exact number of
+        steps, and the resulting word is identical to calling step() until the system halts. A compact word stays
+        compact, so its counts may be far too large for the word to be expanded.
+        Arguments:
+            max_steps:  Stop after this many steps, even if the system has not halted yet
+        Returns True if the two tag system has halted"""
+        production_rules = self.production_rules
+        halting_symbol = self.halting_symbol
+        compact = isinstance(self.current_word, RunLengthWord)
+        word = self.current_word if compact else RunLengthWord(self.current_word)
+        runs = word.runs
+        # the product of a single repetition of a block, or None if one of its read symbols is the halting symbol
+        block_products = {}
+
+        steps = 0
+        halted = False
+        while max_steps is None or steps < max_steps:
+            if word.length < 2 or runs[0][0][0] == halting_symbol:
+                halted = True
+                break
+
+            block, count = runs[0]
+            if len(block) % 2:
+                if count > 1:
+                    word.split_odd_run()
+                    continue
+                # the last symbol of a single odd block is read together with the first symbol of the next run
+                block = block[:-1]
+            if block:
+                if block not in block_products:
+                    read_symbols = block[::2]
+                    block_products[block] = None if halting_symbol in read_symbols else \
+                        tuple(chain.from_iterable(production_rules[symbol] for symbol in read_symbols))
+                product = block_products[block]
+                block_steps = len(block) // 2
+                if max_steps is not None:
+                    count = min(count, (max_steps - steps) // block_steps)
+                if product is not None and count:
+                    word.remove(count * len(block))
+                    word.append(product, count)
+                    steps += count * block_steps
+                    continue
+
+            # single step, e.g. in front of the halting symbol or at the step limit
+            first_symbol = runs[0][0][0]
+            word.remove(2)
+            word.append(tuple(production_rules[first_symbol]))
+            steps += 1
+
+        self.current_word = word if compact else deque(word)
+        self.steps += steps
+        return halted
+
+    @staticmethod
+    def _run_passes(generation, halting_symbol, produce, get_production_length, max_steps):
+        """Run a two tag system a generation at a time (see run_generations()).
+        Arguments:
+            generation:             The initial word (list or array)
+            halting_symbol:         The halting symbol, as it is stored in the word
+            produce:                Function that returns the concatenated productions of a sequence of read
+                                        symbols, as the same kind of sequence as the word
+            get_production_length:  Function that returns the length of a symbol's production
+            max_steps:              Stop after this many steps, even if the system has not halted yet
+        Returns a tuple (generation, start, steps, halted), where the word is generation[start:]"""
+        start = 0  # the position of the word's first symbol in the generation
+        steps = 0
+        halted = False
+        while max_steps is None or steps < max_steps:
+            if len(generation) - start < 2 or generation[start] == halting_symbol:
+                halted = True
+                break
+
+            read_symbols = generation[start::2]
+            if max_steps is not None and steps + len(read_symbols) > max_steps:
+                read_symbols = read_symbols[:max_steps - steps]
+            if halting_symbol in read_symbols:
+                read_symbols = read_symbols[:read_symbols.index(halting_symbol)]
+                halted = True
+            products = produce(read_symbols)
+            end = start + 2 * len(read_symbols)
+            if end > len(generation) and len(products) == get_production_length(read_symbols[-1]):
+                # the last symbol is read while nothing has been produced: the word is too short to take the step
+                read_symbols.pop()
+                products = products[:0]
+                end -= 2
+                halted = True
+            steps += len(read_symbols)
+
+            if end < len(generation) or halted:
+                # the pass has been cut short by the step limit or the halting symbol
+                return generation[end:] + products, 0, steps, halted
+            start = end - len(generation)
+            generation = products
+        return generation, start, steps, halted
+
+    def run_generations(self, max_steps=None):
+        """Run the two tag system a generation at a time, without any output.
+        A pass over the word reads every other symbol of it, so the next generation is the concatenation of the
+        productions of the symbols word[0::2]. A whole pass is applied at once by slicing and a single chained
+        concatenation. If the word has an odd length, its last read symbol deletes the first produced symbol, so
+        the next pass starts at its second symbol. The step counter still advances by the exact number of steps,
+        and the resulting word is identical to calling step() until the system halts.
+        Arguments:
+            max_steps:  Stop after this many steps, even if the system has not halted yet
+        Returns True if the two tag system has halted"""
+        production_rules = self.production_rules
+        get_production = production_rules.__getitem__
+
+        def produce(read_symbols):
+            return list(chain.from_iterable(map(get_production, read_symbols)))
+
+        def get_production_length(symbol):
+            return len(production_rules[symbol])
+
+        generation, start, steps, halted = self._run_passes(list(self.current_word), self.halting_symbol, produce,
+                                                            get_production_length, max_steps)
+        self.current_word = deque(islice(generation, start, None))
+        self.steps += steps
+        return halted
+
+    def compile(self):
+        """Return the integer-compiled production rules of the two tag system (see CompiledProductionRules).
+        The compiled rules are cached and rebuilt whenever the production rules or the halting symbol change, or
+        the word contains symbols the compiled rules cannot encode."""
+        compiled = self._compiled_rules
+        if (compiled is None or self._compiled_key != (self.halting_symbol, self.production_rules)
+                or not compiled.can_encode(self.get_word_symbols())):
+            compiled = CompiledProductionRules(self.production_rules, self.halting_symbol,
+                                               extra_symbols=self.get_word_symbols())
+            self.set_compiled_rules(compiled)
+        return compiled
+
+    def set_compiled_rules(self, compiled):
+        """Use precompiled production rules for the current definition, e.g. ones that are shared by many two tag
+        systems with the same production rules. They are replaced by compile() like its own ones would be."""
+        self._compiled_rules = compiled
+        # a copy of the rules, so that changes to the productions are detected as well
+        self._compiled_key = (self.halting_symbol, {symbol: list(production)
+                                                    for symbol, production in self.production_rules.items()})
+
+    def run_compiled(self, max_steps=None):
+        """Run the two tag system a generation at a time on its integer-compiled production rules, without any
+        output (see run_generations()). The word is an array of symbol ids, and the productions of a whole pass
+        are joined from their prepacked bytes in a single operation. Symbols are only decoded back to their names
+        at the end. The resulting word and step count are identical to calling step() until the system halts.
+        Arguments:
+            max_steps:  Stop after this many steps, even if the system has not halted yet
+        Returns True if the two tag system has halted"""
+        compiled = self.compile()
+        typecode = compiled.typecode
+        packed_productions = [None if production is UNDEFINED_PRODUCTION else production.tobytes()
+                              for production in compiled.productions]
+        get_packed_production = packed_productions.__getitem__
+
+        def produce(read_ids):
+            products = array.array(typecode)
+            try:
+                products.frombytes(b"".join(map(get_packed_production, read_ids)))
+            except TypeError:
+                # report the first read symbol without a production rule, like step() would
+                undefined_id = next(symbol_id for symbol_id in read_ids if packed_productions[symbol_id] is None)
+                raise KeyError(compiled.symbols[undefined_id])
+            return products
+
+        generation, start, steps, halted = self._run_passes(compiled.encode_word(self.current_word),
+                                                            compiled.halting_id, produce,
+                                                            compiled.production_lengths.__getitem__, max_steps)
+        self.current_word = deque(compiled.decode_word(generation[start:]))
+        self.steps += steps
+        return halted
+
+    def get_cycle(self, state, m, n):
+        """Compute a whole cycle of a two tag system that has been converted from a Turing machine in closed form.
+        A cycle simulates a single step of the binary TM (see convert_tm_to_two_tag_system()). It starts with the
+        word 'A_s x (a_s x)^m B_s x (b_s x)^n' of the adapted TM state s and the tape numbers m and n, and takes
+        three passes over the word for a right move, and four for a left move. Each pass reads every other symbol
+        of the previous pass' productions, so the step count of a cycle only depends on m, n and the written
+        symbol, and the new tape numbers are given by doubling, halving and taking the parity of m and n.
+        Arguments:
+            state:  The adapted TM state s at the beginning of the cycle (e.g. 'q_init_0')
+            m:      The tape number left of the head
+            n:      The tape number right of the head (without the symbol under the head, which has been read)
+        Returns a tuple (symbols, m, n, steps) of the new word's symbols ('A_s', 'a_s', 'B_s', 'b_s') for the new
+        state, where 'A_s' is the halting symbol if the TM has stopped, the new tape numbers and the exact number
+        of steps the cycle takes"""
+        production_rules = self.production_rules
+        first_symbol = production_rules["A_" + state][0]
+        right = first_symbol == "C_" + state
+        # the production of the 'A' symbol (right move) or the 'B' symbol (left move) has an additional 'c x' pair
+        # if a 1 is written
+        if right:
+            write = len(production_rules["A_" + state]) // 2 - 1
+            written, kept = 2 * m + write, n  # the written symbol is appended to the left number
+        else:
+            write = len(production_rules["B_" + state]) // 2 - 1
+            written, kept = 2 * n + write, m  # the written symbol is appended to the right number
+        kept, read = divmod(kept, 2)
+
+        # the passes read the new state's symbols from the productions that end a cycle, depending on the read symbol
+        suffix = "_{state}_{read}".format(state=state, read=read)
+        names = ("D", "d", "T", "t") if right else ("T", "t", "Y", "y")
+        # optimized production rules (see optimize()) rename and drop the symbols in between
+        assert (right or first_symbol == "Z_" + state) and all(name + suffix in production_rules for name in names), \
+            "cycles can only be computed with the production rules of the conversion, not optimized ones"
+        symbols = tuple([symbol for symbol in production_rules[name + suffix] if symbol != "x"][0] for name in names)
+
+        if right:
+            # passes: A x (a x)^m B x (b x)^n -> C x (c x)^written S s^n -> D_r ... (d_r)^written T_r ... (t_r)^kept
+            steps = m + n + 2 * written + 2 * kept + 6
+            return symbols, written, kept, steps
+        # passes: A x (a x)^m B x (b x)^n -> Z x (z x)^m C x (c x)^written -> S s^m D_1 D_0 (d_1 d_0)^written
+        #   -> T_r ... (t_r)^kept Y_r ... (y_r)^written
+        steps = 2 * m + n + 3 * written + 2 * kept + 8
+        return symbols, kept, written, steps
+
+    def run_cycles(self, max_cycles=None):
+        """Run a two tag system that has been converted from a Turing machine cycle by cycle, without any output.
+        If the word is in the middle of a cycle, the system is stepped to the beginning of the next cycle first.
+        Each cycle is then computed in closed form on the tape numbers m and n (see get_cycle()), so the run time
+        only depends on the number of simulated TM steps and the size of m and n, not on the length of the word.
+        The step counter advances by the exact number of steps, and the resulting word is identical to calling
+        step() until the system halts. A compact word stays compact.
+        Arguments:
+            max_cycles: Stop after this many cycles, even if the system has not halted yet
+        Returns True if the two tag system has halted"""
+        assert self.from_turing_machine
+        halting_symbol = self.halting_symbol
+        while self.current_word[0] != halting_symbol and not self.current_word[0].startswith("A"):
+            self.step()
+
+        first_symbol = self.current_word[0]
+        m, n = self.get_tape_numbers()
+        symbols = None
+        cycles = 0
+        while first_symbol != halting_symbol and (max_cycles is None or cycles < max_cycles):
+            symbols, m, n, steps = self.get_cycle(first_symbol[2:], m, n)
+            first_symbol = symbols[0]
+            self.steps += steps
+            cycles += 1
+
+        if symbols is not None:
+            word = RunLengthWord.from_runs((((symbols[0], "x"), 1), ((symbols[1], "x"), m), ((symbols[2], "x"), 1),
+                                            ((symbols[3], "x"), n)))
+            self.current_word = word if isinstance(self.current_word, RunLengthWord) else deque(word)
+        return first_symbol == halting_symbol
+
+    @staticmethod
+    def _pack_word_later(word, symbols):
+        """Return a function that packs a word for a checkpoint (see CheckpointWriter.submit())"""
+        return lambda: {"word": encode_symbols(word, symbols)[1]}
+
     def print_definition(self):
         """Print a summary of the current two tag system definition"""
         alphabet = set()
@@ -234,7 +758,7 @@ class TwoTagSystem:
         print("Number of production rules:", len(self.production_rules))
         print("Alphabet: {}".format(sorted(alphabet)))
         print("Alphabet size: {}".format(len(alphabet)))
-        print("Initial word:", self.current_word)
+        print("Initial word:", list(self.current_word))
         print("Initial word length:", len(self.current_word))
         print()
 
@@ -244,24 +768,35 @@ class TwoTagSystem:
         print("--------------")
         self.print_definition()
 
-    def print(self):
-        """Print the current state of the two tag system"""
+    def print(self, summary=None):
+        """Print the current state of the two tag system
+        Arguments:
+            summary:    An up to date WordSummary of the current word (see get_brief_word())"""
         first_symbol = self.current_word[0]
         if first_symbol == self.halting_symbol:
-            print("\rstep:", self.steps, "- word:", self.get_brief_word())
+            print("\rstep:", self.steps, "- word:", self.get_brief_word(summary))
             print("Halting Symbol reached.")
         else:
             print("\rstep:", self.steps,
                   "- rule:", first_symbol, "->", self.production_rules[first_symbol],
-                  "- word:", self.get_brief_word())
+                  "- word:", self.get_brief_word(summary))
 
-    def get_word_as_tm_tape(self):
-        """Return the two tag system's current word in the form of the original binary TM's tape"""
+    def get_tape_numbers(self, summary=None):
+        """Return the numbers m and n that encode the tape of the binary TM the two tag system has been converted
+        from, left and right of the head (see convert_tm_to_two_tag_system()).
+        The two tag system has to be at the beginning of a cycle, i.e. the word must start with an 'A' symbol or
+        the halting symbol.
+        Arguments:
+            summary:    An up to date WordSummary of the current word, e.g. the one that run() maintains. Otherwise
+                            the word is summarized first."""
 
         assert self.from_turing_machine
+        if summary is None:
+            summary = WordSummary(self.current_word)
         # make sure the two tag system has finished a cycle that marks the beginning of a TM step
-        assert self.current_word[0] == "#" or self.current_word[0].startswith("A")
-        assert self.current_word[1] == "x"
+        first_symbol = summary.runs[0][0][0]
+        assert first_symbol == "#" or first_symbol.startswith("A")
+        assert not summary.tail
 
         # the word should now look like this:
         # - a single "A x"
@@ -269,27 +804,31 @@ class TwoTagSystem:
         # - a single "B x"
         # - one or more "b x"
         # A x and B x act as separators
+        # The pairs are counted run by run, so that the word itself is not walked.
 
-        word = self.current_word[2:]  # cut off the initial "A x"
         m = 0
         n = 0
-
-        # count all "a x" until "B x" is reached
-        while not word[0].startswith("B"):
-            assert word[0].startswith("a") and word[1] == "x"
-            m += 1
-            assert len(word) % 2 == 0
-            word = word[2:]
-
-        assert word[0].startswith("B") and word[1] == "x"
-        word = word[2:]  # cut off the "B x"
-
-        # count all "b x" until the end
-        while word:
-            assert word[0].startswith("b") and word[1] == "x"
-            n += 1
-            assert len(word) % 2 == 0
-            word = word[2:]
+        separators = 0  # the number of separators read so far
+        for block, count in summary.runs:
+            for symbol, second_symbol in zip(block[::2], block[1::2]):
+                assert second_symbol == "x"
+                if separators == 0 or symbol.startswith("B"):
+                    assert count == 1 and separators < 2
+                    separators += 1
+                elif separators == 1:
+                    assert symbol.startswith("a")
+                    m += count
+                else:
+                    assert symbol.startswith("b")
+                    n += count
+        assert separators == 2, "the word has no 'B x' separator"
+        return m, n
+
+    def get_word_as_tm_tape(self, summary=None):
+        """Return the two tag system's current word in the form of the original binary TM's tape
+        Arguments:
+            summary:    An up to date WordSummary of the current word (see get_tape_numbers())"""
+        m, n = self.get_tape_numbers(summary)
 
         # convert numbers to binary strings, with the right string reversed
         left = bin(m)[2:] if m > 0 else ""
@@ -297,34 +836,16 @@ class TwoTagSystem:
         right = "".join((reversed(right)))
         return left + "^" + right  # mark the head position with a ^
 
-    def get_brief_word(self):
+    def get_brief_word(self, summary=None):
         """The two tag system's word will get very long if the tts was derived from a Turing machine.
         Instead of outputting all 'a x' and 'b x' repetitions, repeated occurrences of symbol pairs will be
-        represented by the pair, followed by its count, e.g. '[a x]^5' for 5 occurrences of the 'a x' pair."""
-        word_copy = self.current_word
-        current_symbol_pair = []
-        count = 0
-
-        brief_word = ""
-        while len(word_copy) >= 2:
-
-            # cut off a symbol pair
-            symbol_pair = word_copy[0:2]
-            word_copy = word_copy[2:]
-
-            if current_symbol_pair == symbol_pair:  # if it fits the currently counted pair, increment
-                count += 1
-            else:  # otherwise switch to the new pair and append the old one to the brief word
-                if current_symbol_pair:
-                    brief_word += "({symbol})^{count}, ".format(count=count, symbol=" ".join(current_symbol_pair))
-                current_symbol_pair = symbol_pair
-                count = 1
-        brief_word += "({symbol})^{count}, ".format(count=count, symbol=" ".join(current_symbol_pair))
-
-        # if a single symbol is left (odd number of symbols in the word), append it
-        if len(word_copy) > 0:
-            brief_word += "({symbol})^1, ".format(symbol=" ".join(word_copy))
-        return brief_word
+        represented by the pair, followed by its count, e.g. '(a x)^5' for 5 occurrences of the 'a x' pair.
+        Arguments:
+            summary:    An up to date WordSummary of the current word, which is printed in O(number of runs).
+                            Otherwise the word is summarized first."""
+        if summary is None:
+            summary = WordSummary(self.current_word)
+        return summary.get_string()
 
     def run(self, brief=False, silent=False):
         """Run the two tag system until it reaches a halting symbol and stops.
@@ -332,27 +853,32 @@ class TwoTagSystem:
             brief:  Print updates in brief format
             silent: Suppress any output except the final result"""
         first_symbol = self.current_word[0]
+        # the summary of the word is updated along with every step, so that printing it does not scan the word
+        summary = None if silent else WordSummary(self.current_word)
         if not silent:
             if brief:
                 print("Number of transitions:", len(self.production_rules))
-                print("Initial state:", self.get_brief_word())
+                print("Initial state:", self.get_brief_word(summary))
             else:
                 self.print_definition()
                 print(first_symbol, "->", self.production_rules[first_symbol])
         # repeat until halting symbol reached or current word becomes shorter than 2 symbols
         while self.current_word[0] != self.halting_symbol and len(self.current_word) >= 2:
             self.step()
+            if not silent:
+                summary.remove_pair()
+                summary.append(tuple(self.production_rules[first_symbol]))
             first_symbol = self.current_word[0]
             if not silent:
                 # in case of a tts based on a tm, only give status updates after one tts cycle ends
                 if brief and self.from_turing_machine:
                     if first_symbol.startswith("A"):
-                        self.print()
+                        self.print(summary)
                 else:  # in all other cases (brief == False or tts not based on tm), always give status updates
-                    self.print()
+                    self.print(summary)
 
         # in case of tts based on a tm, convert the final word back to a tm tape
         if self.from_turing_machine:
             print()
             print("Final Result:")
-            print(self.get_word_as_tm_tape())
+            print(self.get_word_as_tm_tape(summary))
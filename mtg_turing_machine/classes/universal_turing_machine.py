@@ -1,7 +1,95 @@
 import sys
 import os
+import hashlib
 
-from .turing_machine import TuringMachine
+from .checkpoint import read_checkpoint, write_checkpoint
+from .compiled_table import CompiledTransitionTable
+from .run_length_word import RunLengthWord
+from .turing_machine import TuringMachine, TuringDefinition, TransitionFunction
+
+# the UTM(2,18) definition file and its blank symbol
+_DEFINITION_PATH = os.path.join(os.path.dirname(__file__), "rogozhin_utm_2_18.txt")
+_BLANK = "1<"
+
+# format version of the precompiled cache files, to be increased whenever their content changes
+_CACHE_VERSION = 2
+
+# the parsed and compiled UTM(2,18), shared by all UTM instances (see get_utm_definition())
+_utm_definition = None
+
+
+class PrecompiledUtmDefinition:
+    """Parsed and compiled UTM(2,18) definition, shared by all UniversalTuringMachine instances.
+    Each UTM gets its own TuringDefinition (and tape), but they all share the same read-only transition function
+    and compiled transition table. Neither must be modified; a UTM whose transitions are changed anyway compiles
+    its own table (see TuringMachine.compile()), but the change affects all UTMs.
+
+    Attributes:
+        transitions:    The transition function (TransitionFunction, see TuringDefinition)
+        initial_state:  The initial state
+        stop_states:    The stop states (tuple)
+        table:          The compiled transition table (CompiledTransitionTable), which must not be modified
+        """
+
+    def __init__(self, transitions, initial_state, stop_states, table):
+        self.transitions = TransitionFunction(transitions)
+        self.initial_state = initial_state
+        self.stop_states = tuple(stop_states)
+        self.table = table
+
+    def create_definition(self):
+        """Return a new TuringDefinition sharing the transition function, with a blank tape"""
+        return TuringDefinition(self.transitions, self.initial_state, self.stop_states, blank=_BLANK)
+
+
+def get_cache_directory():
+    """Return the directory of precompiled definitions, or None if the cache is disabled. The cache is opt-in: it
+    is only used if the environment variable MTG_TURING_MACHINE_CACHE is set to a directory."""
+    return os.environ.get("MTG_TURING_MACHINE_CACHE") or None
+
+
+def load_utm_definition(definition_path=_DEFINITION_PATH, cache_directory=None):
+    """Parse and compile the UTM(2,18) definition, or load it from a precompiled cache file.
+    Cache files are binary definition files (see TuringMachine.save_binary()), so they only contain data. They are
+    keyed by the hash of the definition file, so a changed definition is never read from a stale cache. A missing,
+    unreadable or unwritable cache only costs the parsing.
+    Arguments:
+        definition_path:    The definition file (see TuringMachine.read_definition_from_path())
+        cache_directory:    The directory of the cache files (defaults to get_cache_directory()). An empty
+                                string disables the cache.
+    Returns a PrecompiledUtmDefinition"""
+    if cache_directory is None:
+        cache_directory = get_cache_directory()
+    cache_path = None
+    if cache_directory:
+        with open(definition_path, "rb") as fid:
+            definition_hash = hashlib.sha256(fid.read()).hexdigest()
+        cache_path = os.path.join(cache_directory, "utm_{}_v{}.mtgdef".format(definition_hash, _CACHE_VERSION))
+        try:
+            definition = TuringMachine.load_binary(cache_path).definition
+            return PrecompiledUtmDefinition(definition.transitions, definition.initial_state,
+                                            definition.stop_states, CompiledTransitionTable(definition))
+        except Exception:
+            pass  # no usable cache, parse the definition file
+
+    definition = TuringMachine.read_definition_from_path(definition_path)
+    definition.blank = _BLANK
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            TuringMachine(definition).save_binary(cache_path)
+        except OSError:
+            pass  # the cache is optional
+    return PrecompiledUtmDefinition(definition.transitions, definition.initial_state, definition.stop_states,
+                                    CompiledTransitionTable(definition))
+
+
+def get_utm_definition():
+    """Return the shared UTM(2,18) definition, loading it on first use (see load_utm_definition())"""
+    global _utm_definition
+    if _utm_definition is None:
+        _utm_definition = load_utm_definition()
+    return _utm_definition
 
 
 class UniversalTuringMachine:
@@ -15,11 +103,11 @@ class UniversalTuringMachine:
         symbol_encodings:           Each symbol of the emulated machine must be encoded to the UTM's symbol set. (dict)
         """
     def __init__(self):
-        """Initialize UTM"""
-        current_dir = os.path.dirname(__file__)
-        definition_path = os.path.join(current_dir, "rogozhin_utm_2_18.txt")
-        self._tm = TuringMachine(definition_path)
-        self._tm.definition.blank = "1<"  # set the UTM(2,18)'s blank symbol
+        """Initialize UTM. The UTM(2,18) definition is parsed and compiled only once and then shared by all
+        instances (see get_utm_definition())."""
+        utm_definition = get_utm_definition()
+        self._tm = TuringMachine(utm_definition.create_definition())
+        self._tm.set_compiled_table(utm_definition.table)
         self.from_two_tag_system = False
         self.from_binary_turing_machine = False
         self.symbol_encodings = {}
@@ -81,7 +169,7 @@ class UniversalTuringMachine:
             alphabet = [a for a in alphabet if a != "x"]
             alphabet = ["x"] + alphabet
 
-        input_symbols = set(two_tag_system.current_word)
+        input_symbols = two_tag_system.get_word_symbols()
 
         # make sure all input symbols are part of the production rules
         assert set(alphabet) == set(alphabet).union(input_symbols)
@@ -153,14 +241,20 @@ class UniversalTuringMachine:
 
         # encode the data section next (right of the head)
 
+        # the word is encoded run by run (see RunLengthWord), so that a compact word is not expanded before its
+        # encoding
+        input_runs = input_word.runs if isinstance(input_word, RunLengthWord) else RunLengthWord(input_word).runs
         tape_data_section = []
-        for i, symbol in enumerate(input_word):
-            # the symbol encodings are represented here as a string of ones
-            # whose length corresponds to the symbol's encoding number
-            string_encoding = "1" * symbol_encodings[symbol]
-            if not silent:
-                print("input word[{i}]: encoding: {enc}".format(i=i, enc=string_encoding))
-            tape_data_section += list(string_encoding + "c")  # add spacer
+        for block, count in input_runs:
+            encoded_block = []
+            for symbol in block:
+                # the symbol encodings are represented here as a string of ones
+                # whose length corresponds to the symbol's encoding number
+                encoded_block += list("1" * symbol_encodings[symbol] + "c")  # add spacer
+            tape_data_section += encoded_block * count
+        if not silent:
+            for i, symbol in enumerate(input_word):
+                print("input word[{i}]: encoding: {enc}".format(i=i, enc="1" * symbol_encodings[symbol]))
 
         if write_to_file_only:
             fid.write(" ".join(tape_data_section) + " ")
@@ -240,7 +334,7 @@ class UniversalTuringMachine:
         return left_str + right_str
 
     def get_tape(self):
-        """Return UTM's tape"""
+        """Return the UTM's tape (Tape)"""
         return self._tm.definition.tape
 
     def get_tape_index(self):
@@ -251,6 +345,61 @@ class UniversalTuringMachine:
         """Return the UTM's transition function"""
         return self._tm.definition.transitions
 
+    def _get_checkpoint_metadata(self):
+        """Return the UTM's own checkpoint metadata, which is stored alongside the one of the underlying machine"""
+        return {"universal_turing_machine": {
+            "from_two_tag_system": self.from_two_tag_system,
+            "from_binary_turing_machine": self.from_binary_turing_machine,
+            "symbol_encodings": self.symbol_encodings,
+        }}
+
+    def get_checkpoint(self):
+        """Return the UTM's tape, configuration and symbol encodings as checkpoint data
+        (see TuringMachine.get_checkpoint()).
+        Returns a tuple (metadata, sections)"""
+        metadata, sections = self._tm.get_checkpoint()
+        metadata.update(self._get_checkpoint_metadata())
+        return metadata, sections
+
+    def save_checkpoint(self, path):
+        """Atomically write the UTM's tape, configuration and symbol encodings to a checkpoint file"""
+        write_checkpoint(path, *self.get_checkpoint())
+
+    @classmethod
+    def from_checkpoint(cls, metadata, sections):
+        """Construct a UTM from checkpoint data (see get_checkpoint())"""
+        utm = cls.__new__(cls)
+        utm._tm = TuringMachine.from_checkpoint(metadata, sections)
+        utm_metadata = metadata["universal_turing_machine"]
+        utm.from_two_tag_system = utm_metadata["from_two_tag_system"]
+        utm.from_binary_turing_machine = utm_metadata["from_binary_turing_machine"]
+        utm.symbol_encodings = utm_metadata["symbol_encodings"]
+        return utm
+
+    @classmethod
+    def resume(cls, path):
+        """Construct a UTM from a checkpoint file, so that a run can be continued where it has been saved"""
+        return cls.from_checkpoint(*read_checkpoint(path))
+
+    def run_silent(self, max_steps=None, deadline=None, progress_every=None, progress=None, generated_kernel=True,
+                   detect_cycles=False, checkpoint_path=None, checkpoint_steps=None, checkpoint_seconds=None,
+                   trace=None):
+        """Run the UTM without any output, within a step and time budget (see TuringMachine.run_silent()).
+        By default, the UTM(2,18) runs on a kernel generated specifically for its transition table.
+        Checkpoints include the symbol encodings and can be resumed with resume().
+        Returns a RunResult"""
+        return self._tm.run_silent(max_steps=max_steps, deadline=deadline, progress_every=progress_every,
+                                   progress=progress, generated_kernel=generated_kernel, detect_cycles=detect_cycles,
+                                   checkpoint_path=checkpoint_path, checkpoint_steps=checkpoint_steps,
+                                   checkpoint_seconds=checkpoint_seconds,
+                                   checkpoint_metadata=self._get_checkpoint_metadata(), trace=trace)
+
+    def run_profiled(self, max_steps=None):
+        """Run the UTM on an instrumented loop that counts how often each of the UTM(2,18)'s transitions is taken
+        (see TuringMachine.run_profiled()).
+        Returns a tuple (RunResult, TransitionProfile)"""
+        return self._tm.run_profiled(max_steps=max_steps)
+
     def run(self, line_break=False, write_to_file=False, brief=False):
         """Run the UTM until it finishes.
         Arguments:
@@ -0,0 +1,116 @@
+from collections import deque
+from itertools import groupby, zip_longest
+
+from .run_length_word import RunLengthWord
+
+# fill value for the missing second symbol of a word with an odd number of symbols
+_NO_SYMBOL = object()
+
+
+def get_primitive_pairs(block):
+    """Split a block with an even number of symbols into its shortest repeating part of whole pairs.
+    Returns a tuple (part, repetitions), e.g. (('a', 'x'), 2) for the block ('a', 'x', 'a', 'x')"""
+    length = len(block)
+    for period in range(2, length // 2 + 1, 2):
+        if length % period == 0 and block[:period] * (length // period) == block:
+            return block[:period], length // period
+    return block, 1
+
+
+class WordSummary:
+    """Run-length summary of a two tag system's word, read as symbol pairs from the front.
+    A step removes the first two symbols of the word, so the pairs stay aligned to the front while the summary is
+    kept up to date step by step: remove_pair() drops the first pair and append() pairs up a production with the
+    unpaired last symbol of the word, merging it into the last run. Reading the summary, e.g. printing it or
+    counting the 'a x' and 'b x' pairs of a word converted from a Turing machine, takes time proportional to the
+    number of runs instead of the length of the word.
+
+    Attributes:
+        runs:   The runs of pairs, first run first (deque of [block, count]). A block is a single pair, or several
+                    pairs for the repeated blocks of a RunLengthWord.
+        tail:   The unpaired last symbol of a word with an odd number of symbols (tuple of 0 or 1 symbols)
+        """
+
+    def __init__(self, symbols=()):
+        """
+        Arguments:
+            symbols:    The word (iterable of symbols, or a RunLengthWord that is summarized run by run)"""
+        self.runs = deque()
+        self.tail = ()
+        if isinstance(symbols, RunLengthWord):
+            for block, count in symbols.runs:
+                self.append(block, count)
+            return
+        symbols = iter(symbols)
+        for pair, repetitions in groupby(zip_longest(symbols, symbols, fillvalue=_NO_SYMBOL)):
+            if pair[1] is _NO_SYMBOL:
+                self.tail = pair[:1]
+            else:
+                self._append_pairs(pair, len(list(repetitions)))
+
+    def append(self, block, count=1):
+        """Append 'count' repetitions of a block (tuple of symbols) at the end of the word"""
+        if not block or not count:
+            return
+        if self.tail:
+            tail = self.tail
+            self.tail = ()
+            if len(block) % 2:
+                # the unpaired symbol and the first repetition add up to whole pairs
+                self._append_pairs(tail + block, 1)
+                count -= 1
+            else:
+                # every repetition is shifted by one symbol
+                self._append_pairs(tail + block[:-1], 1)
+                self._append_pairs(block[-1:] + block[:-1], count - 1)
+                self.tail = block[-1:]
+                return
+        if len(block) % 2:
+            self._append_pairs(block * 2, count // 2)
+            if count % 2:
+                self._append_pairs(block[:-1], 1)
+                self.tail = block[-1:]
+        else:
+            self._append_pairs(block, count)
+
+    def _append_pairs(self, block, count):
+        """Append 'count' repetitions of a block with an even number of symbols"""
+        if not block or not count:
+            return
+        block, repetitions = get_primitive_pairs(block)
+        count *= repetitions
+        if count == 1 and len(block) > 2:
+            for start in range(0, len(block), 2):
+                self._append_pairs(block[start:start + 2], 1)
+            return
+        runs = self.runs
+        if runs and runs[-1][0] == block:
+            runs[-1][1] += count
+        else:
+            runs.append([block, count])
+
+    def remove_pair(self):
+        """Remove the first two symbols of the word, or its only symbol"""
+        runs = self.runs
+        if not runs:
+            assert self.tail
+            self.tail = ()
+            return
+        run = runs[0]
+        block, count = run
+        if count == 1:
+            runs.popleft()
+        else:
+            run[1] = count - 1
+        # the word now starts with the rest of the block
+        for start in range(len(block) - 2, 0, -2):
+            runs.appendleft([block[start:start + 2], 1])
+
+    def get_string(self):
+        """Return the summary in brief form, e.g. '(a x)^5, ' for 5 occurrences of the 'a x' pair"""
+        brief_word = ""
+        for block, count in self.runs:
+            brief_word += "({symbol})^{count}, ".format(count=count, symbol=" ".join(block))
+        if self.tail:
+            brief_word += "({symbol})^1, ".format(symbol=self.tail[0])
+        return brief_word
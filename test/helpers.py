@@ -0,0 +1,26 @@
+import mtg_turing_machine.classes.instances as instances
+
+
+def run_step_by_step(turing_machine, max_steps=None):
+    """Helper function: run a Turing machine by calling step() directly, without any output"""
+    while max_steps is None or turing_machine.steps < max_steps:
+        if turing_machine.step():
+            break
+
+
+def get_configuration(turing_machine):
+    """Helper function: return everything that describes the current configuration of a Turing machine"""
+    return (list(turing_machine.definition.tape), turing_machine.definition.tape_index,
+            turing_machine.current_state, turing_machine.steps)
+
+
+# pairs of instance loaders and input tapes used to compare the fast engines against step()
+ENGINE_TEST_CASES = [
+    (instances.load_tm_add_unary, "111x11"),
+    (instances.load_tm_add_unary_two_symbol, "111011"),
+    (instances.load_tm_write_one, "111^"),
+    (instances.load_tm_write_one_two, "11^"),
+    (instances.load_tm_add_one, "1^11"),
+    (instances.load_tm_make_palindrome, "100"),
+    (instances.load_tm_dec_to_bin, "11"),
+]
@@ -0,0 +1,52 @@
+import unittest
+
+import mtg_turing_machine.classes.instances as instances
+
+from mtg_turing_machine.classes.batch import BatchTuringMachine, np
+
+
+def run_step_by_step(turing_machine, tape, max_steps=None):
+    """Helper function: run a Turing machine on a tape by calling step() and return its configuration"""
+    turing_machine.set_tape_string(tape)
+    while max_steps is None or turing_machine.steps < max_steps:
+        if turing_machine.step():
+            break
+    return (list(turing_machine.definition.tape), turing_machine.definition.tape_index,
+            turing_machine.current_state, turing_machine.steps)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestBatchTuringMachine(unittest.TestCase):
+    def assert_same_as_step(self, load_tm, tapes, max_steps=None):
+        """Run a batch and compare every row with a separate run of step()"""
+        batch = BatchTuringMachine(load_tm().definition, tapes)
+        batch.run(max_steps=max_steps)
+        for row, tape in enumerate(tapes):
+            self.assertEqual(batch.get_configuration(row), run_step_by_step(load_tm(), tape, max_steps))
+
+    def test_same_as_step(self):
+        self.assert_same_as_step(instances.load_tm_add_unary, ["1" * a + "x" + "1" * b for a in range(1, 5)
+                                                               for b in range(1, 5)])
+        self.assert_same_as_step(instances.load_tm_dec_to_bin, [str(number) for number in range(40)])
+        self.assert_same_as_step(instances.load_tm_write_one_two, ["", "111", "11^", "^"])
+        self.assert_same_as_step(instances.load_tm_add_one, ["", "1^11", "1" * 40 + "^"])
+        self.assert_same_as_step(instances.load_tm_make_palindrome, ["10", "1001", "1" * 30])
+
+    def test_max_steps(self):
+        self.assert_same_as_step(instances.load_tm_make_palindrome, ["10", "1001", "1" * 30], max_steps=17)
+
+        batch = BatchTuringMachine(instances.load_tm_dec_to_bin().definition, ["7", "1234"])
+        self.assertEqual(list(batch.run(max_steps=50)), [True, False])
+        self.assertEqual(list(batch.run()), [True, True])
+        self.assertEqual(batch.get_stripped_tapes(), [list("111"), list("01001011001")])
+
+    def test_undefined(self):
+        """Test: a missing transition only stops the affected row"""
+        batch = BatchTuringMachine(instances.load_tm_add_unary().definition, ["11x1", "1y"])
+        self.assertEqual(list(batch.run()), [True, False])
+        self.assertEqual(list(batch.undefined), [False, True])
+        self.assertEqual(batch.get_stripped_tapes()[0], list("111x"))
+
+
+if __name__ == '__main__':
+    unittest.main()
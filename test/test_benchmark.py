@@ -0,0 +1,66 @@
+import copy
+import os
+import tempfile
+import unittest
+
+from mtg_turing_machine.benchmark import STAGES, BenchmarkCase, run_benchmark, run_suite, save_baseline, \
+    load_baseline, compare_results
+from mtg_turing_machine.classes.turing_machine import TuringDefinition, TuringMachine
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_suite(self):
+        """Test: a case runs at its own stage and is converted to all later ones"""
+        results = run_suite(cases=["add_one"], stages=STAGES[:3], scales=(1, 2), max_steps=10000, deadline=None)
+        self.assertEqual([(entry["stage"], entry["scale"]) for entry in results],
+                         [(stage, scale) for stage in STAGES[:3] for scale in (1, 2)])
+        for entry in results:
+            self.assertTrue(entry["halted"], entry)
+            self.assertGreater(entry["peak_memory"], 0)
+            self.assertEqual(entry["memory_steps"], entry["steps"])
+
+        # the MTG takes one cycle per UTM step, except for the step into the stop state, where Alice wins
+        results = run_suite(cases=["dummy_utm"], max_steps=10000, deadline=None, measure_memory=False)
+        self.assertEqual([entry["stage"] for entry in results], ["utm", "mtg"])
+        self.assertTrue(results[1]["halted"])
+        self.assertEqual(results[1]["steps"], results[0]["steps"] - 1)
+
+    def test_unhalted_scales(self):
+        """Test: a scale that does not halt within the budget is not run at the later stages"""
+        results = run_suite(cases=["add_one"], stages=["two_tag", "utm", "mtg"], scales=(1,), max_steps=1000,
+                            deadline=None, measure_memory=False)
+        self.assertEqual([entry["stage"] for entry in results], ["two_tag", "utm"])
+        self.assertEqual(results[1]["reason"], "max_steps")
+
+    def test_skipped(self):
+        """Test: machines that keep the head in place cannot be converted to 2-tag systems"""
+        def load_tm_stay():
+            transitions = {("q0", "1"): ("q1", "0", "-"), ("q1", "0"): ("qend", "1", ">")}
+            return TuringMachine(TuringDefinition(transitions, "q0", ["qend"], "1", blank="0"))
+
+        case = BenchmarkCase("stay", "tm", load_tm_stay)
+        entry = run_benchmark(case, 1, "binary_tm", max_steps=1000, deadline=None, measure_memory=False)
+        self.assertTrue(entry["halted"])
+        entry = run_benchmark(case, 1, "two_tag", max_steps=1000, deadline=None, measure_memory=False)
+        self.assertEqual(sorted(entry), ["case", "scale", "skipped", "stage"])
+
+    def test_baseline(self):
+        results = run_suite(cases=["add_unary"], stages=["tm", "binary_tm"], scales=(1,), max_steps=1000,
+                            deadline=None, measure_memory=False)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            save_baseline(results, path)
+            baseline = load_baseline(path)
+        self.assertEqual(compare_results(results, baseline), [])
+
+        slower = copy.deepcopy(results)
+        slower[0]["steps_per_second"] = baseline[0]["steps_per_second"] / 2
+        slower[1]["steps"] += 1
+        regressions = compare_results(slower, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("steps/s dropped", regressions[0])
+        self.assertIn("steps changed", regressions[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import mtg_turing_machine.classes.instances as instances
+
+from mtg_turing_machine.classes.binary_format import get_bit_width, pack_bits, unpack_bits
+from mtg_turing_machine.classes.turing_machine import TuringMachine
+from mtg_turing_machine.classes.two_tag_system import TwoTagSystem
+
+from test.helpers import get_configuration
+
+
+class TestBinaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "definition.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_pack_bits(self):
+        for count in (1, 2, 3, 5, 17, 300, 70000):
+            bits = get_bit_width(count)
+            ids = [(i * 7) % count for i in range(37)]
+            packed = pack_bits(ids, bits)
+            self.assertEqual(len(packed) * packed.itemsize, (len(ids) * bits + 7) // 8)
+            self.assertEqual(unpack_bits(packed, bits, len(ids)), ids)
+        self.assertEqual(get_bit_width(3), 2)
+
+    def test_turing_machine(self):
+        """Test: a binarized machine is saved and loaded with its tape, and runs to the same result"""
+        tm = instances.load_tm_dec_to_bin()
+        tm.set_tape_string("123")
+        tm.convert_to_two_symbol()
+        tm.run_silent(max_steps=100)
+        tm.save_binary(self.path)
+
+        for use_mmap in (True, False):
+            loaded_tm = TuringMachine.load_binary(self.path, use_mmap=use_mmap)
+            self.assertEqual(loaded_tm.definition.transitions, tm.definition.transitions)
+            self.assertEqual(loaded_tm.definition.stop_states, tm.definition.stop_states)
+            self.assertEqual(get_configuration(loaded_tm), get_configuration(tm))
+            # the compiled table is loaded from the file
+            self.assertIsNotNone(loaded_tm._compiled_table)
+            self.assertIs(loaded_tm.compile(), loaded_tm._compiled_table)
+            self.assertEqual(loaded_tm.compile().table, tm.compile().table)
+            self.assertTrue(loaded_tm.run_silent().halted)
+            self.assertEqual(loaded_tm.get_stripped_tape(decode_binarized=True), list("1101111"))
+
+    def test_write_definition_text(self):
+        """Test: the text export can be read with read_definition_from_path(), which interprets '_' as ' '"""
+        tm = instances.load_tm_add_unary()
+        text_path = os.path.join(self.directory.name, "definition.txt")
+        tm.write_definition_text(text_path)
+        definition = TuringMachine.read_definition_from_path(text_path)
+        self.assertEqual(definition.initial_state, tm.definition.initial_state)
+        expected_transitions = {(source_state, read_symbol.replace("_", " ")):
+                                ("-" if target_state == "qend" else target_state, write_symbol.replace("_", " "),
+                                 direction)
+                                for (source_state, read_symbol), (target_state, write_symbol, direction)
+                                in tm.definition.transitions.items()}
+        self.assertEqual(definition.transitions, expected_transitions)
+
+    def test_two_tag_system(self):
+        two_tag = instances.load_two_tag_collatz()
+        two_tag.set_initial_word("aaaaaaa", "#")
+        two_tag.run_silent(max_steps=5)
+        two_tag.save_binary(self.path)
+
+        loaded = TwoTagSystem.load_binary(self.path)
+        self.assertEqual(loaded.production_rules, two_tag.production_rules)
+        self.assertEqual((loaded.current_word, loaded.halting_symbol, loaded.steps),
+                         (two_tag.current_word, two_tag.halting_symbol, two_tag.steps))
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as fid:
+            fid.write(b"q0\t1\t1\tR\tq0\n")
+        with self.assertRaises(ValueError):
+            TuringMachine.load_binary(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
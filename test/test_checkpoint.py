@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+import mtg_turing_machine.classes.instances as instances
+
+from mtg_turing_machine.classes.checkpoint import CheckpointWriter, read_checkpoint, write_checkpoint, \
+    encode_symbols
+from mtg_turing_machine.classes.mtg_turing_machine import MagicTheGatheringTuringMachine
+from mtg_turing_machine.classes.turing_machine import TuringMachine
+from mtg_turing_machine.classes.two_tag_system import TwoTagSystem
+from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine
+
+from test.helpers import get_configuration
+
+
+def get_game_state(mtg_tm):
+    """Helper function: return the tape tokens, Alice's cards and the phasing of a MTG-TM"""
+    tokens = [(token.creature_type, token.color, token.power_toughness, token.tapped)
+              for token in mtg_tm.get_tape_sorted()]
+    library = [card.name for card in mtg_tm.alice.library]
+    phasing = [card.phased_in for card in mtg_tm.bob.table_control]
+    return tokens, mtg_tm.alice.hand.name, library, phasing, mtg_tm.state, mtg_tm.cycles
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.ckpt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_file_format(self):
+        symbols, ids = encode_symbols(["b1<", "c"] * 200 + [str(i) for i in range(300)], ["1<"])
+        self.assertEqual(ids.typecode, "H")
+        write_checkpoint(self.path, {"symbols": symbols}, {"tape": ids})
+        metadata, sections = read_checkpoint(self.path)
+        self.assertEqual(metadata["symbols"], symbols)
+        self.assertEqual(sections["tape"], ids)
+        self.assertEqual(os.listdir(self.directory.name), ["run.ckpt"])  # no temporary files left behind
+
+    def test_turing_machine(self):
+        """Test: a run that is checkpointed and resumed ends in the same configuration as an uninterrupted run"""
+        expected_tm = instances.load_tm_dec_to_bin()
+        expected_tm.set_tape_string("123")
+        expected_tm.convert_to_two_symbol()
+        expected_tm.run_silent()
+
+        tm = instances.load_tm_dec_to_bin()
+        tm.set_tape_string("123")
+        tm.convert_to_two_symbol()
+        result = tm.run_silent(max_steps=500, checkpoint_path=self.path, checkpoint_steps=100)
+        self.assertFalse(result.halted)
+
+        resumed_tm = TuringMachine.resume(self.path)
+        self.assertEqual(get_configuration(resumed_tm), get_configuration(tm))
+        self.assertTrue(resumed_tm.run_silent().halted)
+        self.assertEqual(get_configuration(resumed_tm), get_configuration(expected_tm))
+        # least significant bit first
+        self.assertEqual(resumed_tm.get_stripped_tape(decode_binarized=True), list("1101111"))
+
+    def test_writer(self):
+        """Test: the background writer decides when checkpoints are due and writes the latest snapshot"""
+        writer = CheckpointWriter(self.path, every_steps=10, steps=100)
+        self.assertFalse(writer.due(105))
+        self.assertTrue(writer.due(110))
+        writer.submit(110, {"steps": 110}, lambda: {"word": encode_symbols("ab")[1]})
+        self.assertFalse(writer.due(115))
+        writer.close()
+        self.assertEqual(writer.written, 1)
+        metadata, sections = read_checkpoint(self.path)
+        self.assertEqual((metadata["steps"], list(sections["word"])), (110, [0, 1]))
+
+    def test_two_tag_system(self):
+        expected = instances.load_two_tag_collatz()
+        expected.set_initial_word("aaaaaaa", "#")
+        expected.run_silent()
+
+        two_tag = instances.load_two_tag_collatz()
+        two_tag.set_initial_word("aaaaaaa", "#")
+        two_tag.run_silent(max_steps=20, progress_every=5, checkpoint_path=self.path, checkpoint_steps=5)
+
+        resumed = TwoTagSystem.resume(self.path)
+        self.assertEqual((resumed.current_word, resumed.steps), (two_tag.current_word, 20))
+        resumed.run_silent()
+        self.assertEqual((resumed.current_word, resumed.steps), (expected.current_word, expected.steps))
+
+    def test_universal_turing_machine(self):
+        two_tag = instances.load_two_tag_cut_in_half()
+        two_tag.set_initial_word("XXXXXXXX#", "#")
+        utm = UniversalTuringMachine()
+        utm.set_tape_string_from_two_tag(two_tag)
+        utm.run_silent(max_steps=100, checkpoint_path=self.path)
+
+        resumed_utm = UniversalTuringMachine.resume(self.path)
+        self.assertEqual(resumed_utm.symbol_encodings, utm.symbol_encodings)
+        self.assertEqual(get_configuration(resumed_utm._tm), get_configuration(utm._tm))
+        self.assertTrue(resumed_utm.run_silent().halted)
+        self.assertEqual(resumed_utm.decode_tape_as_two_tag_word(), ["#", "X", "X", "X", "X"])
+
+    def test_mtg_turing_machine(self):
+        """Test: a game can be saved and continued at any turn"""
+        expected = MagicTheGatheringTuringMachine(instances.load_dummy_utm())
+        expected.run()
+
+        mtg_tm = MagicTheGatheringTuringMachine(instances.load_dummy_utm())
+        for _ in range(7):
+            mtg_tm.step(verbose=False)
+        mtg_tm.save_checkpoint(self.path)
+
+        resumed = MagicTheGatheringTuringMachine.resume(self.path)
+        self.assertEqual(get_game_state(resumed), get_game_state(mtg_tm))
+        resumed.run(checkpoint_path=self.path, checkpoint_steps=1)
+        self.assertEqual(resumed.cycles, expected.cycles)
+        self.assertEqual(resumed.decode_tape(), expected.decode_tape())
+        self.assertEqual(MagicTheGatheringTuringMachine.resume(self.path).decode_tape(), expected.decode_tape())
+
+
+if __name__ == '__main__':
+    unittest.main()
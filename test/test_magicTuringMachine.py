@@ -3,6 +3,7 @@ import unittest
 import mtg_turing_machine.classes.instances as examples
 
 from mtg_turing_machine.classes.mtg_turing_machine import MagicTheGatheringTuringMachine
+from mtg_turing_machine.classes.run_result import MAX_STEPS
 from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine
 
 
@@ -30,6 +31,16 @@ class TestMagicTuringMachine(unittest.TestCase):
         tape = mtg_tm.decode_tape()
         self.assertEqual(tape, ["11<", "1<", "^", "-", "b", "c2", "11>", "c2"])
 
+    def test_budget(self):
+        """Test: a game can be stopped after a number of cycles and continued afterwards"""
+        mtg_tm = MagicTheGatheringTuringMachine(examples.load_dummy_utm())
+        result = mtg_tm.run(max_cycles=3)
+        self.assertFalse(result.halted)
+        self.assertEqual((result.reason, result.steps, mtg_tm.cycles), (MAX_STEPS, 3, 3))
+        result = mtg_tm.run()
+        self.assertTrue(result.halted)
+        self.assertEqual(mtg_tm.decode_tape(), ["11<", "1<", "^", "-", "b", "c2", "11>", "c2"])
+
     def test_divide_by_two(self):
         two_tag = examples.load_two_tag_cut_in_half()
         tape = run_mtg_utm_from_two_tag(two_tag, "XXXXXXXX#", verbose=False)
@@ -0,0 +1,137 @@
+import unittest
+
+import mtg_turing_machine.classes.instances as instances
+
+from mtg_turing_machine.classes.optimizer import fuse_stay_transitions, optimize_production_rules
+from mtg_turing_machine.classes.turing_machine import TuringDefinition, TuringMachine
+from mtg_turing_machine.classes.two_tag_system import TwoTagSystem
+from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine
+
+from test.helpers import ENGINE_TEST_CASES
+
+
+def load_tm_redundant():
+    """Helper function: a unary adder with two equivalent copies of its scanning state, an unreachable state,
+    a symbol that is never written and a detour through a state that does not move the head"""
+    transitions = {
+        ("q0", "1"): ("q0", "1", ">"),
+        ("q0", "x"): ("q1", "1", ">"),
+        ("q1", "1"): ("q1b", "1", ">"),
+        ("q1b", "1"): ("q1", "1", ">"),
+        ("q1", "_"): ("q2", "_", "<"),
+        ("q1b", "_"): ("q2", "_", "<"),
+        ("q2", "1"): ("q3", "y", "-"),
+        ("q3", "y"): ("qend", "_", "<"),
+        ("q0", "z"): ("q4", "z", ">"),
+        ("q4", "1"): ("q4", "z", "<"),
+        ("q9", "1"): ("q0", "1", ">"),
+    }
+    definition = TuringDefinition(transitions, "q0", ["qend"], blank="_")
+    return TuringMachine(definition)
+
+
+class TestOptimizer(unittest.TestCase):
+    def assert_same_result(self, load_tm, tape):
+        tm = load_tm()
+        tm.set_tape_string(tape)
+        tm.run_silent()
+
+        optimized_tm = load_tm()
+        optimized_tm.set_tape_string(tape)
+        report = optimized_tm.optimize()
+        optimized_tm.run_silent()
+        self.assertEqual(optimized_tm.get_stripped_tape(), tm.get_stripped_tape())
+        self.assertEqual(optimized_tm.current_state, report.state_mapping[tm.current_state])
+        self.assertLessEqual(optimized_tm.steps, tm.steps)
+        return report
+
+    def test_engine_test_cases(self):
+        for load_tm, tape in ENGINE_TEST_CASES:
+            self.assert_same_result(load_tm, tape)
+
+    def test_redundant_machine(self):
+        report = self.assert_same_result(load_tm_redundant, "111x11")
+        # q3 and y are only used by the detour, which is fused away
+        self.assertEqual(report.removed_states, ["q3", "q4", "q9"])
+        self.assertEqual(report.removed_symbols, ["y", "z"])
+        self.assertEqual(report.state_mapping["q1b"], "q1")
+        self.assertEqual(report.fused_transitions, 1)
+        self.assertEqual(report.states, (8, 4))
+        self.assertEqual(report.transitions, (11, 5))
+
+        # the optimized machine can still be binarized
+        tm = load_tm_redundant()
+        tm.set_tape_string("11x1")
+        tm.optimize()
+        tm.convert_to_two_symbol()
+        tm.run_silent()
+        self.assertEqual(tm.get_stripped_tape(decode_binarized=True), list("111"))
+
+    def test_fuse_stay_transitions(self):
+        """Test: cycles of '-' transitions are not fused"""
+        transitions = {
+            ("a", "0"): ("b", "1", "-"),
+            ("b", "1"): ("a", "0", "-"),
+            ("c", "0"): ("a", "0", ">"),
+        }
+        self.assertEqual(fuse_stay_transitions(transitions, []), (transitions, 0))
+
+    def test_production_rules(self):
+        """Test: unreachable symbols are removed and symbols with equivalent productions are merged"""
+        production_rules = {"a": ["b", "x"], "c": ["d", "x"], "b": ["#"], "d": ["#"], "e": ["a"], "#": ["e"]}
+        optimized_rules, report = optimize_production_rules(production_rules, "axcx", "#")
+        self.assertEqual(optimized_rules, {"a": ["b", "x"], "b": ["#"]})
+        self.assertEqual(report.symbol_mapping, {"#": "#", "a": "a", "b": "b", "c": "a", "d": "b", "x": "x"})
+        self.assertEqual(report.removed_symbols, ["e"])
+        self.assertEqual((report.symbols, report.production_rules), ((7, 4), (6, 2)))
+
+    def test_two_tag_system(self):
+        """Test: the optimized two tag system takes the same steps to the renamed word"""
+        pairs = []
+        for load_tm, tape in ((instances.load_tm_add_one, "111"), (instances.load_tm_add_unary_two_symbol, "1101"),
+                              (instances.load_tm_make_palindrome, "10")):
+            tm = load_tm()
+            tm.set_tape_string(tape)
+            tm.convert_to_two_symbol()
+            pairs.append((TwoTagSystem(tm.definition), TwoTagSystem(tm.definition)))
+        collatz = []
+        for _ in range(2):
+            collatz.append(instances.load_two_tag_collatz())
+            collatz[-1].set_initial_word("aaaaaaa", "#")
+        pairs.append(tuple(collatz))
+
+        for expected, optimized in pairs:
+            report = optimized.optimize()
+            self.assertLess(report.symbols[1], report.symbols[0])
+            if expected.from_turing_machine:
+                # the cycles rely on the symbol names of the conversion
+                with self.assertRaises(AssertionError):
+                    optimized.run_cycles()
+            self.assertTrue(expected.run_silent().halted)
+            self.assertTrue(optimized.run_silent().halted)
+            self.assertEqual(optimized.steps, expected.steps)
+            self.assertEqual(list(optimized.current_word),
+                             [report.symbol_mapping[symbol] for symbol in expected.current_word])
+            if expected.from_turing_machine:
+                self.assertEqual(optimized.get_word_as_tm_tape(), expected.get_word_as_tm_tape())
+
+    def test_two_tag_system_utm(self):
+        """Test: the optimized two tag system has a shorter UTM encoding, which decodes to the same TM tape"""
+        tm = instances.load_tm_write_one()
+        tm.convert_to_two_symbol()
+        utm = UniversalTuringMachine()
+        utm.set_tape_string_from_two_tag(TwoTagSystem(tm.definition))
+        tape_length = len(list(utm.get_tape()))
+
+        two_tag = TwoTagSystem(tm.definition)
+        two_tag.optimize()
+        utm = UniversalTuringMachine()
+        utm.set_tape_string_from_two_tag(two_tag)
+        self.assertLess(len(list(utm.get_tape())), tape_length // 4)
+        self.assertTrue(utm.run_silent().halted)
+        two_tag.set_initial_word(utm.decode_tape_as_two_tag_word(), "#")
+        self.assertEqual(two_tag.get_word_as_tm_tape(), "1^")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from mtg_turing_machine.classes.tape import Tape, ByteTape, make_tape
+from mtg_turing_machine.classes.turing_machine import TuringDefinition, TuringMachine
+
+
+class TestTape(unittest.TestCase):
+    def check_growth(self, tape_class):
+        tape = tape_class("101", blank="0")
+        tape.grow_left()
+        tape.grow_right()
+        tape.prepend("1")
+        tape.append("1")
+        self.assertEqual(tape.to_list(), list("1010101"))
+        self.assertEqual(len(tape), 7)
+        self.assertEqual(tape[0], "1")
+        self.assertEqual(tape[-2], "0")
+        self.assertEqual(tape[1:4], ["0", "1", "0"])
+        self.assertEqual(list(reversed(tape)), list("1010101"))
+
+        tape[1] = "1"
+        self.assertEqual("".join(tape), "1110101")
+        with self.assertRaises(IndexError):
+            _ = tape[7]
+
+    def test_get_cells(self):
+        for tape_class in (Tape, ByteTape):
+            tape = tape_class("101", blank="0")
+            tape.grow_left()
+            tape.blank = "1"
+            self.assertEqual(tape._decode_all(tape.get_cells(-2, 6)), list("11010111"))
+            self.assertEqual(tape._decode_all(tape.get_cells(3, 3)), [])
+
+    def test_list_tape(self):
+        self.check_growth(Tape)
+
+    def test_byte_tape(self):
+        self.check_growth(ByteTape)
+
+        tape = ByteTape(["b1<", "c"], blank="1<")
+        self.assertEqual(tape.symbols, ["1<", "b1<", "c"])
+        tape.grow_left()
+        self.assertEqual(tape.cells(), bytearray([0, 1, 2]))
+
+    def test_growth_is_linear(self):
+        """Test: growing a tape on the left 100.000 times must not copy the whole tape each time"""
+        tape = ByteTape(blank="0")
+        for _ in range(100000):
+            tape.grow_left()
+        self.assertEqual(len(tape), 100000)
+        self.assertLess(len(tape._cells), 4 * 100000)
+
+    def test_make_tape(self):
+        self.assertIsInstance(make_tape("01", "0"), ByteTape)
+        self.assertIsInstance(make_tape("01", "0", alphabet=[str(i) for i in range(300)]), Tape)
+        self.assertNotIsInstance(make_tape("01", "0", alphabet=[str(i) for i in range(300)]), ByteTape)
+
+    def test_definition_tape(self):
+        """Test: the definition wraps assigned tapes and keeps the tape's blank in sync"""
+        transitions = {("q0", "0"): ("q0", "1", "<")}
+        definition = TuringDefinition(transitions, "q0", ["qend"], "0", blank="0")
+        self.assertIsInstance(definition.tape, ByteTape)
+        definition.blank = "1"
+        definition.tape.grow_left()
+        self.assertEqual(definition.tape, ["1", "0"])
+
+        tm = TuringMachine(TuringDefinition(transitions, "q0", ["qend"], "0", blank="0"))
+        for _ in range(1000):
+            tm.step()
+        self.assertEqual(tm.definition.tape_index, 0)
+        self.assertEqual(tm.definition.tape, ["0"] + ["1"] * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
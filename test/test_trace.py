@@ -0,0 +1,129 @@
+import gzip
+import lzma
+import os
+import tempfile
+import unittest
+
+import mtg_turing_machine.classes.instances as instances
+
+from mtg_turing_machine.classes.mtg_turing_machine import MagicTheGatheringTuringMachine
+from mtg_turing_machine.classes.trace import TraceWriter
+from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine
+
+
+def read_lines(path, opener=open):
+    """Helper function: return the lines of a (compressed) trace file"""
+    with opener(path, "rt") as fid:
+        return fid.read().splitlines()
+
+
+class TestTrace(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_record(self):
+        path = self.get_path("trace.txt")
+        with TraceWriter(path, window=2) as trace:
+            trace.record_tape(0, "q1", list("abcdef"), 3)
+            trace.record_tape(1, "q2", list("abcdef"), 3)
+            trace.record_tape(2, "q2", list("abcdef"), 0)
+        self.assertEqual(read_lines(path), ["0 q1: b c [d] e f", "1 q2: b c [d] e f", "2 q2: [a] b c"])
+
+    def test_sampling(self):
+        """Test: records are due every N steps and on state changes"""
+        trace = TraceWriter(self.get_path("trace.txt"), every=10)
+        self.assertEqual(trace.chunk_size, 10)
+        trace.record(0, "q1", "a", 0)
+        self.assertFalse(trace.due(9, "q2"))
+        self.assertTrue(trace.due(10, "q1"))
+        trace.close()
+
+        trace = TraceWriter(self.get_path("trace.txt"), on_state_change=True)
+        self.assertEqual(trace.chunk_size, 1)
+        trace.record(0, "q1", "a", 0)
+        self.assertFalse(trace.due(100, "q1"))
+        self.assertTrue(trace.due(101, "q2"))
+        trace.close()
+
+    def test_compression(self):
+        """Test: the compression is inferred from the file extension"""
+        for name, opener in (("trace.gz", gzip.open), ("trace.xz", lzma.open)):
+            path = self.get_path(name)
+            with TraceWriter(path, buffer_size=16) as trace:
+                for steps in range(100):
+                    trace.record(steps, "q1", "01", steps % 2)
+            lines = read_lines(path, opener)
+            self.assertEqual(len(lines), 100)
+            self.assertEqual(lines[-1], "99 q1: 0 [1]")
+
+    def test_turing_machine(self):
+        tm = instances.load_tm_dec_to_bin()
+        tm.set_tape_string("123")
+        path = self.get_path("trace.txt")
+        with TraceWriter(path, every=5) as trace:
+            result = tm.run_silent(trace=trace)
+        lines = read_lines(path)
+        self.assertEqual(lines[0], "0 {}: [1] 2 3".format(tm.definition.initial_state))
+        self.assertEqual([int(line.split()[0]) for line in lines[1:-1]], list(range(5, result.steps, 5)))
+        self.assertTrue(lines[-1].startswith("{} {}:".format(result.steps, result.state)))
+
+    def test_two_tag_system(self):
+        two_tag = instances.load_two_tag_collatz()
+        two_tag.set_initial_word("aaa", "#")
+        path = self.get_path("trace.txt")
+        with TraceWriter(path, on_state_change=True, window=3) as trace:
+            two_tag.run_silent(trace=trace)
+        lines = read_lines(path)
+        self.assertEqual(lines[0], "0 a: [a] a a")
+        states = [line.split()[1] for line in lines]
+        self.assertTrue(all(previous != state for previous, state in zip(states, states[1:-1])))
+
+    def test_universal_turing_machine(self):
+        two_tag = instances.load_two_tag_cut_in_half()
+        two_tag.set_initial_word("XXXX#", "#")
+        utm = UniversalTuringMachine()
+        utm.set_tape_string_from_two_tag(two_tag)
+        path = self.get_path("trace.gz")
+        with TraceWriter(path, every=1000) as trace:
+            result = utm.run_silent(trace=trace)
+        self.assertEqual(trace.records, result.steps // 1000 + 2)
+
+    def test_mtg_turing_machine(self):
+        mtg_tm = MagicTheGatheringTuringMachine(instances.load_dummy_utm())
+        path = self.get_path("trace.txt")
+        with TraceWriter(path) as trace:
+            mtg_tm.run(trace=trace)
+        lines = read_lines(path)
+        self.assertEqual(len(lines), mtg_tm.cycles + 2)
+        self.assertIn("[", lines[0])
+
+    def test_mtg_window(self):
+        """Test: the MTG records, which only sort the tokens near the head, show the same window as the full tape"""
+        two_tag = instances.load_two_tag_cut_in_half()
+        two_tag.set_initial_word("XXXX#", "#")
+        utm = UniversalTuringMachine()
+        utm.set_tape_string_from_two_tag(two_tag)
+        mtg_tm = MagicTheGatheringTuringMachine(utm)
+        with TraceWriter(self.get_path("trace.txt"), window=1) as trace, \
+                TraceWriter(self.get_path("expected.txt"), window=1) as expected_trace:
+            while mtg_tm.cycles < 100:
+                mtg_tm.record_trace(trace)
+                sorted_tape = mtg_tm.get_tape_sorted()
+                head = 0
+                for index, token in enumerate(sorted_tape):
+                    if token.power_toughness <= sorted_tape[head].power_toughness:
+                        head = index
+                expected_trace.record_tape(mtg_tm.cycles, "q{}".format(mtg_tm.state + 1),
+                                           [token.creature_type for token in sorted_tape], head)
+                mtg_tm.step(False)
+        self.assertEqual(read_lines(self.get_path("trace.txt")), read_lines(self.get_path("expected.txt")))
+        self.assertLess(len(mtg_tm._trace_tokens), len(sorted_tape) // 2)
+
+if __name__ == '__main__':
+    unittest.main()
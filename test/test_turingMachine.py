@@ -1,7 +1,17 @@
+import json
+import random
 import unittest
 
 import mtg_turing_machine.classes.instances as instances
 
+from mtg_turing_machine.classes.macro_machine import MacroMachine
+from mtg_turing_machine.classes.cycle_detection import TuringCycleDetector
+from mtg_turing_machine.classes.kernel_generator import get_kernel, KERNEL_CACHE_SIZE, _KERNEL_CACHE
+from mtg_turing_machine.classes.run_result import HALTED, MAX_STEPS, DEADLINE, NON_HALTING
+from mtg_turing_machine.classes.turing_machine import TuringDefinition, TuringMachine
+
+from test.helpers import ENGINE_TEST_CASES, run_step_by_step, get_configuration
+
 
 def run_turing_machine(turing_machine, tape=None, convert_to_binary_tm=False):
     """Helper function: run a Turing machine and return its output tape
@@ -17,6 +27,18 @@ def run_turing_machine(turing_machine, tape=None, convert_to_binary_tm=False):
     return turing_machine.get_stripped_tape(decode_binarized=turing_machine.has_been_binarized)
 
 
+def load_tm_run_away():
+    """Helper function: a machine that moves right forever, over its input and then over the infinite blanks"""
+    transitions = {("q0", "1"): ("q0", "1", ">"), ("q0", "0"): ("q0", "0", ">")}
+    return TuringMachine(TuringDefinition(transitions, "q0", ["qend"], "11", blank="0"))
+
+
+def load_tm_stuck():
+    """Helper function: a machine whose second step is undefined"""
+    transitions = {("q0", "_"): ("q1", "_", "-"), ("q0", "a"): ("qend", "a", "<")}
+    return TuringMachine(TuringDefinition(transitions, "q0", ["qend"], "_", blank="_"))
+
+
 class TestTuringMachine(unittest.TestCase):
 
     def test_run_add_unary(self, convert_to_two_symbol=False):
@@ -135,6 +157,312 @@ class TestTuringMachine(unittest.TestCase):
         """Rerun test as binary Turing machine"""
         self.test_run_dec_to_bin(convert_to_two_symbol=True)
 
+    def test_optimized_binarization(self):
+        """Test: the optimized binarization computes the same output with fewer states and steps"""
+        for load_tm, tape in ENGINE_TEST_CASES:
+            tm = load_tm()
+            tm.set_tape_string(tape)
+            report = tm.get_binarization_report()
+            self.assertEqual(report["optimized"]["tape"], report["original"]["tape"])
+            self.assertEqual(report["standard"]["tape"], report["original"]["tape"])
+            self.assertLessEqual(report["optimized"]["states"], report["standard"]["states"])
+            self.assertLessEqual(report["optimized"]["steps"], report["standard"]["steps"])
+
+        tm = instances.load_tm_dec_to_bin()
+        tm.set_tape_string("123")
+        tm.convert_to_two_symbol(optimized=True)
+        run_step_by_step(tm)
+        self.assertEqual(tm.get_stripped_tape(decode_binarized=True), list("1101111"))
+
+    def test_random_binarization(self):
+        """Test: both binarizations compute the same output as random machines with '-' transitions"""
+        rng = random.Random(13)
+        checked = 0
+        while checked < 40:
+            alphabet = ["_"] + list("abcdefg"[:rng.randint(2, 6)])
+            states = ["q{}".format(i) for i in range(rng.randint(1, 4))]
+            transitions = {(state, symbol): (rng.choice(states + ["qend"]), rng.choice(alphabet), rng.choice("<->"))
+                           for state in states for symbol in alphabet}
+            tape = "".join(rng.choice(alphabet[1:]) for _ in range(rng.randint(1, 6)))
+            tm = TuringMachine(TuringDefinition(transitions, "q0", ["qend"], tape, blank="_"))
+            if not tm.run_silent(max_steps=50).halted:
+                continue
+            tm = TuringMachine(TuringDefinition(transitions, "q0", ["qend"], tape, blank="_"))
+            report = tm.get_binarization_report()
+            self.assertEqual(report["standard"]["tape"], report["original"]["tape"], transitions)
+            self.assertEqual(report["optimized"]["tape"], report["original"]["tape"], transitions)
+            checked += 1
+
+    def test_decode_region(self):
+        """Test: windows of a binarized tape decode like the whole tape, aligned with the head"""
+        tm = instances.load_tm_add_unary()
+        tm.set_tape_string("111x11")
+        tm.convert_to_two_symbol()
+        # the bit fields are aligned with the head, not with the beginning of the tape
+        tm.definition.tape.prepend("0")
+        tm.definition.tape_index += 1
+        decoded = tm.decode_binarized_tape()
+        self.assertEqual(decoded, list("_111x11"))
+        self.assertEqual(list(tm.iter_decoded_tape(chunk_size=2)), decoded)
+        self.assertEqual(tm.decode_region(2, 5), decoded[2:5])
+        self.assertEqual(tm.decode_region(-2, 1), ["_", "_", decoded[0]])
+        self.assertEqual(tm.decode_region(6, 9), [decoded[6], "_", "_"])
+        self.assertEqual(tm.get_decoded_tape_index(), 1)
+
+
+def compare_with_step(load_tm, tape, run_engine, convert_to_two_symbol=False, max_steps=None):
+    """Helper function: run a machine with step() and with a fast engine.
+    Arguments:
+        load_tm:                Instance loader of the machine
+        tape:                   The input tape
+        run_engine:             Function that runs the engine, called with the machine and max_steps
+        convert_to_two_symbol:  Flag to control whether the machine should be converted to a binary TM
+        max_steps:              Stop both runs after this many steps
+    Returns the final configurations of both runs"""
+    expected_tm = load_tm()
+    engine_tm = load_tm()
+    for tm in (expected_tm, engine_tm):
+        tm.set_tape_string(tape)
+        if convert_to_two_symbol:
+            tm.convert_to_two_symbol()
+
+    run_step_by_step(expected_tm, max_steps=max_steps)
+    run_engine(engine_tm, max_steps)
+    return get_configuration(expected_tm), get_configuration(engine_tm)
+
+
+class TestCompiledTuringMachine(unittest.TestCase):
+
+    @staticmethod
+    def run_engine(tm, max_steps):
+        return tm.run_compiled(max_steps=max_steps)
+
+    def assert_same_as_step(self, load_tm, tape, convert_to_two_symbol=False, max_steps=None):
+        """Run a machine with step() and with the engine under test and compare the final configurations"""
+        expected, actual = compare_with_step(load_tm, tape, self.run_engine, convert_to_two_symbol, max_steps)
+        self.assertEqual(expected, actual)
+
+    def test_same_as_step(self):
+        """Test: the engine produces the same tape, head position, state and step count as step()"""
+        for load_tm, tape in ENGINE_TEST_CASES:
+            self.assert_same_as_step(load_tm, tape)
+            self.assert_same_as_step(load_tm, tape, convert_to_two_symbol=True)
+
+    def test_max_steps(self):
+        """Test: the engine can be stopped after a fixed number of steps and continued afterwards"""
+        for max_steps in (0, 1, 5, 17):
+            self.assert_same_as_step(instances.load_tm_make_palindrome, "1001", max_steps=max_steps)
+            self.assert_same_as_step(instances.load_tm_dec_to_bin, "11", convert_to_two_symbol=True,
+                                     max_steps=max_steps)
+
+        # the step limit is reached right before an undefined transition
+        self.assert_same_as_step(load_tm_stuck, "_", max_steps=1)
+
+        tm = instances.load_tm_make_palindrome()
+        tm.set_tape_string("1001")
+        self.assertFalse(self.run_engine(tm, 10))
+        self.assertEqual(tm.steps, 10)
+        self.assertTrue(self.run_engine(tm, None))
+        self.assertEqual(tm.get_stripped_tape(), ["1", "0", "0", "1", "1", "0", "0", "1"])
+
+    def test_changed_transition(self):
+        """Test: the compiled table is rebuilt when a transition is replaced in place"""
+        tm = instances.load_tm_add_one()
+        tm.set_tape_string("11")
+        table = tm.compile()
+        self.assertIs(tm.compile(), table)
+        tm.definition.transitions[("q0", "0")] = ("qend", "0", ">")
+        self.assertIsNot(tm.compile(), table)
+        self.run_engine(tm, None)
+        self.assertEqual(tm.get_stripped_tape(), ["1", "1"])
+
+    def test_utm(self):
+        """Test: the engine runs the UTM(2,18) with its multi-character symbols"""
+        expected_utm = instances.load_dummy_utm()
+        engine_utm = instances.load_dummy_utm()
+        run_step_by_step(expected_utm._tm)
+        self.run_engine(engine_utm._tm, None)
+        self.assertEqual(get_configuration(expected_utm._tm), get_configuration(engine_utm._tm))
+
+
+class TestGeneratedKernel(TestCompiledTuringMachine):
+
+    @staticmethod
+    def run_engine(tm, max_steps):
+        return tm.run_silent(max_steps=max_steps, generated_kernel=True).halted
+
+    def test_kernel_cache(self):
+        """Test: machines with the same transition table share a generated kernel"""
+        first_utm = instances.load_dummy_utm()
+        second_utm = instances.load_dummy_utm()
+        self.assertIs(get_kernel(first_utm._tm.compile()), get_kernel(second_utm._tm.compile()))
+        self.assertIsNot(get_kernel(first_utm._tm.compile()), get_kernel(instances.load_tm_add_one().compile()))
+
+    def test_kernel_cache_size(self):
+        """Test: the kernel cache drops the least recently used kernels once it is full"""
+        add_one_kernel = get_kernel(instances.load_tm_add_one().compile())
+        for length in range(1, KERNEL_CACHE_SIZE + 2):
+            # machines that write a different number of ones have different transition tables
+            transitions = {("q{}".format(i), "0"): ("q{}".format(i + 1), "1", ">") for i in range(length)}
+            get_kernel(TuringMachine(TuringDefinition(transitions, "q0", ["q{}".format(length)], "0")).compile())
+            if length == 1:
+                self.assertIs(get_kernel(instances.load_tm_add_one().compile()), add_one_kernel)
+        self.assertLessEqual(len(_KERNEL_CACHE), KERNEL_CACHE_SIZE)
+        self.assertIsNot(get_kernel(instances.load_tm_add_one().compile()), add_one_kernel)
+
+
+class TestSilentRun(unittest.TestCase):
+    def test_budgets(self):
+        """Test: silent runs stop at the step and time budgets and report why"""
+        tm = instances.load_tm_dec_to_bin()
+        tm.set_tape_string("11")
+        tm.convert_to_two_symbol()
+
+        result = tm.run_silent(max_steps=100)
+        self.assertEqual((result.halted, result.reason, result.steps), (False, MAX_STEPS, 100))
+        self.assertEqual(result.state, tm.current_state)
+
+        result = tm.run_silent(deadline=0, progress_every=10)
+        self.assertEqual((result.halted, result.reason, result.steps), (False, DEADLINE, 110))
+
+        progress_steps = []
+        result = tm.run_silent(progress_every=1000, progress=lambda r: progress_steps.append(r.steps))
+        self.assertEqual((result.halted, result.reason), (True, HALTED))
+        self.assertEqual(progress_steps, list(range(1110, result.steps, 1000)))
+        self.assertEqual(tm.get_stripped_tape(decode_binarized=True), ["1", "1", "0", "1"])
+
+
+class TestCycleDetection(TestCompiledTuringMachine):
+
+    @staticmethod
+    def run_engine(tm, max_steps):
+        return tm.run_silent(max_steps=max_steps, progress_every=3, detect_cycles=True).halted
+
+    def assert_non_halting(self, transitions, tape, tape_index, shift):
+        """Run a machine with cycle detection and compare the configuration it stops in with step()"""
+        tm = TuringMachine(TuringDefinition(transitions, "q0", ["qend"], list(tape), tape_index, blank="_"))
+        result = tm.run_silent(max_steps=100000, progress_every=5, detect_cycles=True)
+        self.assertEqual((result.halted, result.reason), (False, NON_HALTING))
+        self.assertGreater(result.period, 0)
+        self.assertEqual(result.shift * result.period > 0, shift > 0)
+        self.assertEqual(result.shift * result.period < 0, shift < 0)
+
+        expected_tm = TuringMachine(TuringDefinition(transitions, "q0", ["qend"], list(tape), tape_index, blank="_"))
+        run_step_by_step(expected_tm, max_steps=result.steps)
+        self.assertEqual(get_configuration(expected_tm), get_configuration(tm))
+
+    def test_non_halting(self):
+        """Test: exact and translated cycles are detected"""
+        bounce = {("q0", "_"): ("q1", "_", ">"), ("q1", "_"): ("q0", "_", "<"),
+                  ("q0", "1"): ("q1", "1", ">"), ("q1", "1"): ("q0", "1", "<")}
+        self.assert_non_halting(bounce, "1", 0, shift=0)
+
+        write_ones = {("q0", "_"): ("q0", "1", ">"), ("q0", "1"): ("q0", "1", ">")}
+        self.assert_non_halting(write_ones, "11_1", 0, shift=1)
+
+        # moves left, leaving a trail of alternating symbols behind
+        alternate = {("q0", "_"): ("q1", "1", "<"), ("q1", "_"): ("q0", "x", "<"),
+                     ("q0", "1"): ("q0", "1", "<")}
+        self.assert_non_halting(alternate, "1111", 3, shift=-1)
+
+    def test_binary_counter(self):
+        """Test: a machine that counts up forever does not repeat its configuration"""
+        transitions = {
+            ("inc", "1"): ("inc", "0", "<"),
+            ("inc", "0"): ("back", "1", ">"),
+            ("inc", "_"): ("back", "1", ">"),
+            ("back", "0"): ("back", "0", ">"),
+            ("back", "1"): ("back", "1", ">"),
+            ("back", "_"): ("inc", "_", "<"),
+        }
+        tm = TuringMachine(TuringDefinition(transitions, "back", ["qend"], ["_"], 0, blank="_"))
+        result = tm.run_silent(max_steps=50000, progress_every=7, detect_cycles=True)
+        self.assertEqual((result.halted, result.reason), (False, MAX_STEPS))
+
+    def test_tape_copies(self):
+        """Test: the tape is only copied at sample points whose window around the head has been seen before"""
+        detector = TuringCycleDetector(window_size=4)
+        cells = bytearray(b"\1\2\1\2\1\2\3\3")
+        for steps, pos in enumerate((0, 1, 6, 2)):
+            self.assertIsNone(detector.check(steps, 0, cells, 0, pos, 0, len(cells), pos, pos + 1))
+        self.assertEqual([snapshot.tape is not None for snapshot in detector._snapshots], [False, False, False, True])
+        self.assertEqual(detector.check(4, 0, cells, 0, 2, 0, len(cells), 2, 3), (1, 0))
+
+
+class TestChainedTuringMachine(TestCompiledTuringMachine):
+
+    @staticmethod
+    def run_engine(tm, max_steps):
+        return tm.run_chained(max_steps=max_steps)
+
+    def test_long_sweep(self):
+        """Test: sweeping over a long run of ones takes a single operation but counts every step"""
+        tm = instances.load_tm_add_unary()
+        tm.set_tape_string("1" * 1000000 + "x1")
+        self.assertTrue(tm.run_chained())
+        self.assertEqual(tm.steps, 1000005)
+        self.assertEqual(tm.get_stripped_tape(), ["1"] * 1000001 + ["x"])
+
+    def test_max_steps(self):
+        """Test: a sweep over the infinite blanks is cut off at max_steps"""
+        super().test_max_steps()
+        for max_steps in (1, 2, 3, 10):
+            for tape in ("11", "1100"):
+                self.assert_same_as_step(load_tm_run_away, tape, max_steps=max_steps)
+
+
+class TestProfiledRun(TestCompiledTuringMachine):
+
+    @staticmethod
+    def run_engine(tm, max_steps):
+        return tm.run_profiled(max_steps=max_steps)[0].halted
+
+    def test_profile(self):
+        """Test: the profile counts every step once, and its JSON form can be read back"""
+        tm = instances.load_tm_add_unary()
+        tm.set_tape_string("111x11")
+        result, profile = tm.run_profiled()
+        self.assertTrue(result.halted)
+        self.assertEqual(profile.steps, result.steps)
+        self.assertEqual(sum(profile.head_positions.values()), result.steps)
+        self.assertEqual(profile.get_top_transitions(2), [(("q0", "1"), 3), (("q0", "x"), 3)])
+        self.assertEqual(min(profile.head_positions), 0)
+        self.assertEqual(profile.sweep_lengths, {1: 3, 2: 2, 4: 1})
+
+        data = json.loads(json.dumps(profile.to_dict()))
+        self.assertEqual(sum(transition["hits"] for transition in data["transitions"]), result.steps)
+        self.assertIn("(q0, '1')", profile.get_report())
+
+
+class TestMacroMachine(TestCompiledTuringMachine):
+
+    @staticmethod
+    def run_engine(tm, max_steps):
+        return MacroMachine(tm).run(max_steps=max_steps)
+
+    def test_block_sizes(self):
+        """Test: the results do not depend on the block size"""
+        for block_size in (1, 2, 3, 5):
+            def run_engine(tm, max_steps):
+                return MacroMachine(tm, block_size=block_size).run(max_steps=max_steps)
+            for load_tm, tape in ENGINE_TEST_CASES:
+                expected, actual = compare_with_step(load_tm, tape, run_engine, convert_to_two_symbol=True)
+                self.assertEqual(expected, actual)
+            expected, actual = compare_with_step(instances.load_tm_make_palindrome, "1001", run_engine,
+                                                 max_steps=23)
+            self.assertEqual(expected, actual)
+
+    def test_cache(self):
+        """Test: repeated block visits of a binarized machine are replayed from the cache"""
+        tm = instances.load_tm_make_palindrome()
+        tm.set_tape_string("10" * 10)
+        tm.convert_to_two_symbol()
+        macro_machine = MacroMachine(tm, cache_size=1000)
+        self.assertEqual(macro_machine.block_size, tm.binarized_bit_depth)
+        self.assertTrue(macro_machine.run())
+        self.assertGreater(macro_machine.cache_hits, 10 * macro_machine.cache_misses)
+        self.assertEqual(tm.get_stripped_tape(decode_binarized=True), list("10" * 10 + "01" * 10))
+
 
 if __name__ == '__main__':
     unittest.main()
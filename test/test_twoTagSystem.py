@@ -1,14 +1,34 @@
 import unittest
+from collections import deque
 
 import mtg_turing_machine.classes.instances as examples
 
+from mtg_turing_machine.classes.run_length_word import RunLengthWord
 from mtg_turing_machine.classes.two_tag_system import TwoTagSystem
+from mtg_turing_machine.classes.word_summary import WordSummary
+from mtg_turing_machine.classes.run_result import HALTED, MAX_STEPS, NON_HALTING
 
 
 def run_two_tag(two_tag, string):
     two_tag.set_initial_word(string, "#")
     two_tag.run()
-    return two_tag.current_word
+    return list(two_tag.current_word)
+
+
+def load_two_tag_from_tm(load_tm, tape):
+    """Helper function: return the two tag system of a Turing machine with the given tape"""
+    tm = load_tm()
+    tm.set_tape_string(tape)
+    tm.convert_to_two_symbol()
+    return TwoTagSystem(tm.definition)
+
+
+def copy_two_tag(two_tag):
+    """Helper function: return a copy of a two tag system that can be run independently"""
+    copy = TwoTagSystem(two_tag.production_rules)
+    copy.set_initial_word(two_tag.current_word, two_tag.halting_symbol)
+    copy.set_compiled_rules(two_tag.compile())
+    return copy
 
 
 def run_two_tag_from_tm(tm, tape):
@@ -69,6 +89,211 @@ class TestTwoTagSystem(unittest.TestCase):
         # result = run_two_tag_from_tm(tm, "9")
         # self.assertEqual(result, ["1", "0", "0", "1"])
 
+    def test_run_silent(self):
+        two_tag = examples.load_two_tag_collatz()
+        two_tag.set_initial_word("aaaaaaa", "#")
+        result = two_tag.run_silent(max_steps=5)
+        self.assertEqual((result.halted, result.reason, result.steps), (False, MAX_STEPS, 5))
+
+        result = two_tag.run_silent(progress_every=3)
+        self.assertEqual((result.halted, result.reason), (True, HALTED))
+        expected = examples.load_two_tag_collatz()
+        run_two_tag(expected, "aaaaaaa")
+        self.assertEqual(two_tag.current_word, expected.current_word)
+        self.assertEqual(result.steps, expected.steps)
+
+    def test_word_storage(self):
+        """Test: the word is a deque, which the readers of the word accept as it is"""
+        two_tag = examples.load_two_tag_cut_in_half()
+        two_tag.set_initial_word("XXXX#", "#")
+        two_tag.step()
+        self.assertIsInstance(two_tag.current_word, deque)
+        self.assertEqual(list(two_tag.current_word), list("XX#X"))
+        self.assertEqual(two_tag.get_brief_word(), "(X X)^1, (# X)^1, ")
+        two_tag.set_initial_word("XX#", "#")
+        self.assertEqual(two_tag.get_brief_word(), "(X X)^1, (#)^1, ")
+
+        tm = examples.load_tm_add_one()
+        tm.set_tape_string("11")
+        two_tag = TwoTagSystem(tm.definition)
+        self.assertIsInstance(two_tag.current_word, deque)
+        self.assertEqual(two_tag.get_brief_word(), "(A_q_init_0 x)^1, (B_q_init_0 x)^1, (b_q_init_0 x)^3, ")
+        self.assertEqual(two_tag.get_word_as_tm_tape(), "^11")
+
+    def test_run_length_word(self):
+        word = RunLengthWord(["a", "x"] * 5 + ["B", "x", "b"])
+        self.assertEqual(list(word.runs), [[("a", "x"), 5], [("B", "x"), 1], [("b",), 1]])
+        word.append(("c", "x", "c", "x"), 3)
+        word.append(("c", "x", "d", "x", "d"))
+        self.assertEqual(list(word.runs)[3:], [[("c", "x"), 7], [("d", "x"), 1], [("d",), 1]])
+        word.remove(3)
+        self.assertEqual(list(word.runs)[:2], [[("x", "a"), 3], [("x",), 1]])
+        self.assertEqual(list(word), ["x", "a"] * 3 + ["x", "B", "x", "b"] + ["c", "x"] * 7 + ["d", "x", "d"])
+        self.assertEqual(len(word), 27)
+
+    def test_word_summary(self):
+        """Test: the summary that is updated step by step matches the summary of the word after every step"""
+        two_tag = load_two_tag_from_tm(examples.load_tm_add_unary_two_symbol, "1101")
+        collatz = examples.load_two_tag_collatz()  # productions with an odd number of symbols
+        collatz.set_initial_word("aaaaaaa", "#")
+        for system in (two_tag, collatz):
+            summary = WordSummary(system.current_word)
+            while system.current_word[0] != system.halting_symbol and len(system.current_word) >= 2:
+                first_symbol = system.current_word[0]
+                system.step()
+                summary.remove_pair()
+                summary.append(tuple(system.production_rules[first_symbol]))
+                self.assertEqual(summary.get_string(), system.get_brief_word())
+        self.assertEqual(two_tag.get_word_as_tm_tape(summary=WordSummary(two_tag.current_word)), "111^")
+
+        # a run-length encoded word is summarized run by run, keeping repeated blocks of several pairs
+        word = RunLengthWord(["a", "x"] * 5 + ["b"])
+        word.append(("c", "x", "d"), 4)
+        word.remove(1)
+        self.assertEqual(WordSummary(word).get_string(), "(x a)^4, (x b)^1, (c x d c x d)^2, ")
+        self.assertEqual(WordSummary(list(word)).get_string(),
+                         "(x a)^4, (x b)^1, (c x)^1, (d c)^1, (x d)^1, (c x)^1, (d c)^1, (x d)^1, ")
+
+    def check_engine(self, run_engine):
+        """Check that an engine ends in the same word after the same number of steps as run_silent(), also if the
+        step limit ends in the middle of a pass
+        Arguments:
+            run_engine: Function that runs a two tag system within a step limit, e.g. TwoTagSystem.run_chained"""
+        initial_systems = [load_two_tag_from_tm(examples.load_tm_add_one, "1111111"),
+                           load_two_tag_from_tm(examples.load_tm_add_unary_two_symbol, "1101"),
+                           load_two_tag_from_tm(examples.load_tm_make_palindrome, "10")]
+        for load_two_tag, word in ((examples.load_two_tag_collatz, "aaaaaaa"),
+                                   (examples.load_two_tag_cut_in_half, "XX::XX::#")):
+            initial_systems.append(load_two_tag())
+            initial_systems[-1].set_initial_word(word, "#")
+        # a word that runs out of symbols
+        initial_systems.append(TwoTagSystem({"a": [], "b": ["a"], "c": ["b", "b", "b"]}))
+        initial_systems[-1].set_initial_word("cbcbcab", "#")
+
+        for initial in initial_systems:
+            expected = copy_two_tag(initial)
+            expected.run_silent()
+            two_tag = copy_two_tag(initial)
+            self.assertTrue(run_engine(two_tag))
+            self.assertEqual((two_tag.current_word, two_tag.steps), (expected.current_word, expected.steps))
+
+            for max_steps in range(0, min(expected.steps + 2, 3000), 37 if expected.steps > 100 else 1):
+                expected = copy_two_tag(initial)
+                expected.run_silent(max_steps=max_steps)
+                two_tag = copy_two_tag(initial)
+                self.assertEqual(run_engine(two_tag, max_steps=max_steps), expected.steps < max_steps)
+                self.assertEqual((two_tag.current_word, two_tag.steps), (expected.current_word, expected.steps))
+
+    def test_run_chained(self):
+        self.check_engine(TwoTagSystem.run_chained)
+
+    def test_run_generations(self):
+        self.check_engine(TwoTagSystem.run_generations)
+
+    def test_run_compiled(self):
+        self.check_engine(TwoTagSystem.run_compiled)
+
+        two_tag = TwoTagSystem({"a": ["b", "c"], "b": ["a"]})
+        two_tag.set_initial_word("aac", "#")
+        with self.assertRaises(KeyError):
+            two_tag.run_compiled()
+
+    def test_compile(self):
+        """Test: the compiled production rules and words decode back to the same symbols"""
+        two_tag = load_two_tag_from_tm(examples.load_tm_add_unary_two_symbol, "1101")
+        compiled = two_tag.compile()
+        self.assertEqual(compiled.decode_productions(), two_tag.production_rules)
+        word = compiled.encode_word(two_tag.current_word)
+        self.assertEqual((word.typecode, word.itemsize), ("H", 2))
+        self.assertEqual(compiled.decode_word(word), list(two_tag.current_word))
+        self.assertEqual(compiled.symbols[compiled.halting_id], "#")
+        self.assertEqual([len(production) if production is not None else 0 for production in compiled.productions],
+                         compiled.production_lengths)
+
+    def test_run_chained_long_word(self):
+        """Test: the engine processes the unary tape of a Turing machine in runs (the word has 2^17 symbols)"""
+        two_tag = load_two_tag_from_tm(examples.load_tm_add_one, "1" * 16)
+        self.assertTrue(two_tag.run_chained())
+        self.assertEqual(two_tag.steps, 917504)
+        self.assertEqual(two_tag.get_word_as_tm_tape(), "1" * 17 + "^")
+
+    def test_compact_word(self):
+        """Test: the start word of a Turing machine with a long tape is kept compact by the engines"""
+        tm = examples.load_tm_add_unary_two_symbol()
+        tm.set_tape_string("1101")
+        tm.convert_to_two_symbol()
+        two_tag = TwoTagSystem(tm.definition, compact_word=True)
+        self.assertIsInstance(two_tag.current_word, RunLengthWord)
+        self.assertEqual(list(two_tag.current_word), list(TwoTagSystem(tm.definition).current_word))
+        expected = TwoTagSystem(tm.definition)
+        expected.run_silent()
+        self.assertTrue(two_tag.run_cycles())
+        self.assertEqual((list(two_tag.current_word), two_tag.steps), (list(expected.current_word), expected.steps))
+
+        # the word has 2^65 + 2 symbols
+        tm = examples.load_tm_add_one()
+        tm.set_tape_string("1" * 64)
+        for run_engine in (TwoTagSystem.run_chained, TwoTagSystem.run_cycles):
+            two_tag = TwoTagSystem(tm.definition, compact_word=True)
+            self.assertEqual(two_tag.current_word.length, 2 ** 65 + 2)
+            self.assertEqual(two_tag.get_word_as_tm_tape(), "^" + "1" * 64)
+            self.assertTrue(run_engine(two_tag))
+            self.assertIsInstance(two_tag.current_word, RunLengthWord)
+            self.assertEqual(two_tag.get_word_as_tm_tape(), "1" * 65 + "^")
+            self.assertEqual(two_tag.steps, 7 * 2 ** 65)
+
+    def test_run_cycles(self):
+        """Test: the cycles computed in closed form end in the same word after the same number of steps"""
+        for load_tm, tape in ((examples.load_tm_add_one, "1111111"), (examples.load_tm_add_unary_two_symbol, "1101"),
+                              (examples.load_tm_make_palindrome, "10"), (examples.load_tm_write_one, "")):
+            initial = load_two_tag_from_tm(load_tm, tape)
+            expected = copy_two_tag(initial)
+            expected.run_silent()
+            two_tag = load_two_tag_from_tm(load_tm, tape)
+            self.assertTrue(two_tag.run_cycles())
+            self.assertEqual((two_tag.current_word, two_tag.steps), (expected.current_word, expected.steps))
+
+        # cycle by cycle, starting in the middle of a cycle
+        expected = load_two_tag_from_tm(examples.load_tm_add_unary_two_symbol, "1101")
+        two_tag = copy_two_tag(expected)
+        two_tag.from_turing_machine = True
+        for _ in range(5):
+            two_tag.step()
+        halted = two_tag.run_cycles(max_cycles=0)
+        while True:
+            expected.step()
+            while expected.current_word[0] != "#" and not expected.current_word[0].startswith("A"):
+                expected.step()
+            self.assertEqual((two_tag.current_word, two_tag.steps), (expected.current_word, expected.steps))
+            if halted:
+                break
+            halted = two_tag.run_cycles(max_cycles=1)
+        self.assertEqual(expected.current_word[0], "#")
+
+    def test_get_cycle(self):
+        """Test: predict the run of a two tag system whose word is far too long to be built"""
+        two_tag = load_two_tag_from_tm(examples.load_tm_add_one, "")
+        symbols = ("A_q_init_0",)
+        m, n = 0, 2 ** 200 - 1
+        steps = 0
+        while symbols[0] != "#":
+            symbols, m, n, cycle_steps = two_tag.get_cycle(symbols[0][2:], m, n)
+            steps += cycle_steps
+        self.assertEqual((symbols[1:], m, n), (("a_#", "B_#", "b_#"), 2 ** 201 - 1, 0))
+        self.assertGreater(steps, 2 ** 200)
+
+    def test_detect_cycles(self):
+        two_tag = TwoTagSystem({"a": ["c", "d"], "c": ["e", "f"], "e": ["a", "b"]})
+        two_tag.set_initial_word("ab", "#")
+        result = two_tag.run_silent(max_steps=10000, progress_every=3, detect_cycles=True)
+        self.assertEqual((result.halted, result.reason, result.shift), (False, NON_HALTING, 0))
+        self.assertEqual(result.period % 3, 0)
+
+        two_tag = examples.load_two_tag_collatz()
+        two_tag.set_initial_word("aaaaaaa", "#")
+        result = two_tag.run_silent(progress_every=1, detect_cycles=True)
+        self.assertEqual((result.halted, result.reason), (True, HALTED))
+
 
 if __name__ == '__main__':
     unittest.main()
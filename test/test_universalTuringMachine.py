@@ -1,8 +1,13 @@
+import copy
+import os
+import pickle
+import tempfile
 import unittest
 
 import mtg_turing_machine.classes.instances as examples
 
-from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine
+from mtg_turing_machine.classes.universal_turing_machine import UniversalTuringMachine, load_utm_definition, \
+    get_cache_directory
 from mtg_turing_machine.classes.two_tag_system import TwoTagSystem
 
 _RUN_LONG_TESTS = False
@@ -77,6 +82,68 @@ class TestUniversalTuringMachine(unittest.TestCase):
 #        result = run_utm_from_tm(tm, "10")
 #        self.assertEqual(result, ["1", "0", "0", "1"])
 
+    def test_run_silent(self):
+        two_tag = examples.load_two_tag_cut_in_half()
+        two_tag.set_initial_word("XX::XX::#", "#")
+        utm = UniversalTuringMachine()
+        utm.set_tape_string_from_two_tag(two_tag)
+        result = utm.run_silent(max_steps=10)
+        self.assertFalse(result.halted)
+        result = utm.run_silent()
+        self.assertTrue(result.halted)
+        self.assertEqual(utm.decode_tape_as_two_tag_word(), ["#", "X", "i", "X", "i"])
+
+    def test_compact_word(self):
+        """Test: a compact two tag word is encoded like the expanded word"""
+        tapes = []
+        for compact_word in (False, True):
+            tm = examples.load_tm_add_one()
+            tm.set_tape_string("111")
+            utm = UniversalTuringMachine()
+            utm.set_tape_string_from_two_tag(TwoTagSystem(tm.definition, compact_word=compact_word))
+            tapes.append(list(utm.get_tape()))
+        self.assertEqual(tapes[0], tapes[1])
+
+    def test_shared_definition(self):
+        """Test: all UTMs share one transition function and compiled table, and can be copied"""
+        first_utm = UniversalTuringMachine()
+        second_utm = UniversalTuringMachine()
+        self.assertIs(first_utm.get_transition(), second_utm.get_transition())
+        self.assertIs(first_utm._tm.compile(), second_utm._tm.compile())
+        self.assertIsNot(first_utm.get_tape(), second_utm.get_tape())
+        copied_utm = copy.deepcopy(first_utm)
+        self.assertEqual(copied_utm.get_transition(), first_utm.get_transition())
+        self.assertEqual(pickle.loads(pickle.dumps(first_utm)).get_transition(), first_utm.get_transition())
+
+    def test_precompiled_cache(self):
+        with tempfile.TemporaryDirectory() as cache_directory:
+            parsed = load_utm_definition(cache_directory=cache_directory)
+            cache_files = os.listdir(cache_directory)
+            self.assertEqual(len(cache_files), 1)
+            cached = load_utm_definition(cache_directory=cache_directory)
+
+            # a corrupt cache file is ignored
+            with open(os.path.join(cache_directory, cache_files[0]), "wb") as fid:
+                fid.write(b"MTGDEF\1\0garbage")
+            reparsed = load_utm_definition(cache_directory=cache_directory)
+        for definition in (cached, reparsed):
+            self.assertEqual(dict(definition.transitions), dict(parsed.transitions))
+            self.assertEqual((definition.table.table, definition.table.symbols),
+                             (parsed.table.table, parsed.table.symbols))
+        self.assertEqual(dict(UniversalTuringMachine().get_transition()), dict(parsed.transitions))
+
+    def test_cache_opt_in(self):
+        """Test: the precompiled cache is only used if a cache directory is configured"""
+        previous = os.environ.pop("MTG_TURING_MACHINE_CACHE", None)
+        try:
+            self.assertIsNone(get_cache_directory())
+            os.environ["MTG_TURING_MACHINE_CACHE"] = ""
+            self.assertIsNone(get_cache_directory())
+        finally:
+            os.environ.pop("MTG_TURING_MACHINE_CACHE", None)
+            if previous is not None:
+                os.environ["MTG_TURING_MACHINE_CACHE"] = previous
+
 
 if __name__ == '__main__':
     unittest.main()